@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List
+
+import requests
+
+from concurrency import RecentIds
+from outbox import Outbox
+
+
+# Fan-out of admin notifications (finish summaries, forwarded team photos).
+# Runs on its own small worker pool so a slow or failing admin chat never holds
+# up a webhook or competes with player-facing sends; each admin gets its own
+# lane (ordered per admin, parallel across admins). Failures are counted per
+# admin instead of being swallowed.
+class AdminNotifier:
+    def __init__(
+        self,
+        call: Callable[..., requests.Response],
+        admin_ids: Iterable[int],
+        workers: int = 4,
+        photo_dedup_secs: float = 60.0,
+    ) -> None:
+        self.call = call
+        self.admin_ids: List[int] = list(admin_ids)
+        self.outbox = Outbox(workers=workers, name="admin")
+        self._recent_photos = RecentIds(max_size=10000, ttl_secs=photo_dedup_secs)
+        self._lock = threading.Lock()
+        self._stats: Dict[int, Dict[str, Any]] = {}
+
+    def send_text(self, text: str) -> None:
+        for admin_id in self.admin_ids:
+            self.outbox.submit(
+                admin_id, self._deliver, admin_id, "sendMessage",
+                {"chat_id": admin_id, "text": text, "parse_mode": "HTML"}, 10,
+            )
+
+    def send_photo(self, file_id: str, caption: str | None = None, dedup_key: Hashable | None = None) -> bool:
+        """Forward a photo to every admin. Returns False if dedup_key was seen within the window."""
+        if not self.admin_ids:
+            return False
+        if dedup_key is not None and self._recent_photos.check_and_add(dedup_key):
+            return False
+        for admin_id in self.admin_ids:
+            payload: Dict[str, Any] = {"chat_id": admin_id, "photo": file_id}
+            if caption:
+                payload["caption"] = caption
+                payload["parse_mode"] = "HTML"
+            self.outbox.submit(admin_id, self._deliver, admin_id, "sendPhoto", payload, 15)
+        return True
+
+    def _deliver(self, admin_id: int, method: str, payload: Dict[str, Any], timeout: int) -> None:
+        error: str | None = None
+        try:
+            resp = self.call(method, json=payload, timeout=timeout)
+            if not resp.ok:
+                error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        with self._lock:
+            st = self._stats.setdefault(admin_id, {"sent": 0, "failed": 0, "last_error": None, "last_failed_at": None})
+            if error is None:
+                st["sent"] += 1
+            else:
+                st["failed"] += 1
+                st["last_error"] = f"{method}: {error}"
+                st["last_failed_at"] = int(time.time())
+        if error is not None:
+            print(f"[admin] {method} to {admin_id} failed: {error}", flush=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_admin = {str(k): dict(v) for k, v in self._stats.items()}
+        return {"admins": per_admin, "pending": self.outbox.pending()}
+
+    def drain(self, timeout: float | None = None) -> bool:
+        return self.outbox.drain(timeout)
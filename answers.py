@@ -0,0 +1,137 @@
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+
+_UNITS = (
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+    "fourteen fifteen sixteen seventeen eighteen nineteen"
+).split()
+_TENS = "twenty thirty forty fifty sixty seventy eighty ninety".split()
+NUMBER_WORDS: Dict[str, int] = {w: i for i, w in enumerate(_UNITS)}
+NUMBER_WORDS.update({w: 20 + 10 * i for i, w in enumerate(_TENS)})
+LEADING_ARTICLES = frozenset(("a", "an", "the"))
+# Unicode categories dropped before matching: punctuation, symbols (emoji
+# included), combining marks (accents after NFKD, emoji variation selectors) and
+# format/control characters (zero-width joiners)
+_DROP = ("P", "S", "M", "C")
+
+
+def _words(text: str) -> List[str]:
+    chars = []
+    for ch in unicodedata.normalize("NFKD", text):
+        cat = unicodedata.category(ch)
+        if cat[0] in _DROP:
+            # Dashes, slashes and full stops separate words ("twenty-one"); apostrophes,
+            # symbols and emoji just vanish ("don't" -> "dont")
+            chars.append(" " if cat in ("Pd", "Po") and ch not in "'’" else "")
+        else:
+            chars.append(ch)
+    return "".join(chars).casefold().split()
+
+
+def normalize(text: str) -> str:
+    """Matching key for a typed or stored answer: NFKD + casefold, accents,
+    punctuation and emoji removed, whitespace collapsed, number words as digits
+    ("Twenty-one" -> "21") and a leading article dropped."""
+    words = _words(text)
+    out: List[str] = []
+    i = 0
+    while i < len(words):
+        n = NUMBER_WORDS.get(words[i])
+        if n is None:
+            out.append(words[i])
+            i += 1
+            continue
+        if n >= 20 and i + 1 < len(words) and 0 < NUMBER_WORDS.get(words[i + 1], 10) < 10:
+            n += NUMBER_WORDS[words[i + 1]]
+            i += 1
+        out.append(str(n))
+        i += 1
+    if len(out) > 1 and out[0] in LEADING_ARTICLES:
+        out = out[1:]
+    return " ".join(out)
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance with adjacent transpositions, or limit + 1 once it
+    must exceed limit (rows are cut off early, so cost is O(len * limit) at best)."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        best = i
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, prev2[j - 2] + 1)
+            cur[j] = d
+            best = min(best, d)
+        if best > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+def edit_budget(key: str, max_edits: int) -> int:
+    """Typos tolerated for an answer key: none for short keys (and numbers), where
+    one edit already means a different answer, then 1, then max_edits."""
+    if len(key) < 5 or key.isdigit():
+        return 0
+    return min(max_edits, 1 if len(key) < 8 else 2)
+
+
+# Typed-answer lookup for one question, built once at catalog compile time.
+# Exact and normalized matches are one dict lookup each; typo tolerance scans
+# the question's few options with a bounded edit distance and only accepts a
+# single closest option. Keys shared by two options are left out (ambiguous).
+@dataclass(frozen=True, slots=True)
+class AnswerIndex:
+    exact: frozenset
+    by_key: Dict[str, str]  # normalized key -> option
+    keys: Tuple[Tuple[str, str, int], ...]  # (key, option, edit budget) for fuzzy matching
+
+    def match(self, text: str) -> Tuple[str | None, str]:
+        """(option, how) for typed text; how is 'exact', 'normalized', 'fuzzy' or 'none'."""
+        if text in self.exact:
+            return text, "exact"
+        key = normalize(text)
+        if not key:
+            return None, "none"
+        option = self.by_key.get(key)
+        if option is not None:
+            return option, "normalized"
+        best: str | None = None
+        best_d = None
+        tie = False
+        for cand, opt, budget in self.keys:
+            if not budget:
+                continue
+            d = bounded_distance(key, cand, budget)
+            if d > budget:
+                continue
+            if best_d is None or d < best_d:
+                best, best_d, tie = opt, d, False
+            elif d == best_d and opt != best:
+                tie = True
+        if best is not None and not tie:
+            return best, "fuzzy"
+        return None, "none"
+
+
+def build_answer_index(options: Sequence[str], max_edits: int = 2) -> AnswerIndex:
+    by_key: Dict[str, str] = {}
+    clashes = set()
+    for opt in options:
+        key = normalize(opt)
+        if not key:
+            continue
+        if key in by_key and by_key[key] != opt:
+            clashes.add(key)
+        by_key.setdefault(key, opt)
+    for key in clashes:
+        del by_key[key]
+    keys = tuple((key, opt, edit_budget(key, max_edits)) for key, opt in by_key.items())
+    return AnswerIndex(exact=frozenset(options), by_key=by_key, keys=keys)
@@ -1,27 +1,73 @@
 import os
 import time
 import json
-from typing import Dict, Any, List
+import hmac
+import hashlib
+import atexit
+import sys
+import threading
+from typing import Dict, Any, List, Tuple
 
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, has_request_context, request, jsonify, send_file
+
+from file_id_cache import FileIdCache, largest_photo_file_id
+from outbox import Outbox
+from admin_notify import AdminNotifier
+from scheduler import Scheduler
+from tg_client import BotAPIClient
+from ratelimit import RateLimiter
+from explanations import DeliveryCall
+from metrics import Registry
+from leaderboard import Leaderboard, Result
+from results_export import ResultsOutbox, make_results_sink
+from session import Session, has_bit, set_bit
+from session_store import SessionStore, SessionSweeper, make_session_store
+from concurrency import KeyedLocks, RecentIds
+from shared_state import (
+    ChatLeases,
+    SharedFileIdCache,
+    SharedQuestionSlots,
+    SharedRecentIds,
+    SharedState,
+    lease_leader,
+)
+from polling import UpdatePoller
+from photo_archive import OUTCOMES as PHOTO_OUTCOMES, PhotoArchive
+from image_variants import ImageVariants, collect_image_refs
+from assets import Asset, AssetIndex
+from dispatch import CALLBACK_PAYLOADS, MESSAGE_PAYLOADS, Router, Update, parse_update
+import server
+from catalog import (
+    Catalog,
+    CatalogWatcher,
+    CompiledQuestion,
+    HINT_BUTTON_DATA,
+    PHOTO_BUTTON_DATA,
+    QuestionSlots,
+    build_inline_keyboard,
+    compile_catalog,
+    is_visible,
+)
 
 
 # Flask app
 app = Flask(__name__, static_folder="static", static_url_path="/static")
 
 
+QUESTIONS_PATH = os.environ.get("QUESTIONS_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "questions.json"
+)
+
+
 # Load questions from local JSON (must be present in this project folder)
-def load_questions() -> List[Dict[str, Any]]:
-    here = os.path.dirname(os.path.abspath(__file__))
-    path = os.path.join(here, "questions.json")
+def load_questions(path: str | None = None) -> List[Dict[str, Any]]:
+    path = path or QUESTIONS_PATH
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
     # Basic validation for visible questions only: exactly 3 options, answer must match an option
     for i, q in enumerate(data):
-        # Visible if is_visible is True, else fallback to legacy display_question, default True
-        is_visible = bool(q.get("is_visible", q.get("display_question", True)))
-        if not is_visible:
+        if not is_visible(q):
             continue
         # Allow photo-task questions to skip MCQ validation
         if q.get("expect_photo"):
@@ -35,57 +81,341 @@ def load_questions() -> List[Dict[str, Any]]:
     return data
 
 
+# Where persistent state lives (sessions DB, slot table, logs)
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+# HTTP serving (server.py): WEB_WORKERS processes x WEB_THREADS threads under gunicorn
+WEB_WORKERS, WEB_THREADS = server.WEB_WORKERS, server.WEB_THREADS
+# Cross-process state (dedup, file_ids, chat leases) in DATA_DIR/shared.db. "auto" turns it
+# on whenever more than one worker process runs; set 1 for several instances on one host.
+_shared_mode = os.environ.get("SHARED_STATE", "auto").strip().lower()
+SHARED_STATE = _shared_mode in ("1", "true", "yes") or (_shared_mode == "auto" and WEB_WORKERS > 1)
+SHARED_STATE_PATH = os.environ.get("SHARED_STATE_PATH") or os.path.join(DATA_DIR, "shared.db")
+shared_state: SharedState | None = SharedState(SHARED_STATE_PATH) if SHARED_STATE else None
+
 QUESTIONS: List[Dict[str, Any]] = load_questions()
+# Bit positions for per-question session flags; append-only so reloads never shift them.
+# Shared mode keeps the table in shared.db so every worker assigns the same slots.
+QUESTION_SLOTS_PATH = os.path.join(DATA_DIR, "question_slots.json")
+question_slots: QuestionSlots = (
+    SharedQuestionSlots(shared_state, seed_path=QUESTION_SLOTS_PATH) if shared_state is not None
+    else QuestionSlots(QUESTION_SLOTS_PATH)
+)
+# Visible questions compiled once: pre-rendered bodies, keyboards, typed-answer indexes
+# and explanation steps. Replaced wholesale (never mutated) on hot reload; readers just
+# use the current global. ANSWER_MAX_EDITS caps typos tolerated in typed answers.
+ANSWER_MAX_EDITS = int(os.environ.get("ANSWER_MAX_EDITS", "2"))
+CATALOG: Catalog = compile_catalog(QUESTIONS, slots=question_slots, max_edits=ANSWER_MAX_EDITS)
+_catalog_lock = threading.Lock()
+
+
+def reload_catalog() -> Catalog:
+    """Re-read questions.json, validate with the load_questions rules and swap atomically.
+    Raises (and keeps the current catalog) if the file is invalid.
+    """
+    global QUESTIONS, CATALOG
+    with _catalog_lock:
+        data = load_questions()
+        new_catalog = compile_catalog(
+            data, version=CATALOG.version + 1, slots=question_slots, max_edits=ANSWER_MAX_EDITS
+        )
+        QUESTIONS, CATALOG = data, new_catalog
+    print(f"[catalog] reloaded v{new_catalog.version}: {new_catalog.total} visible questions", flush=True)
+    # New or edited images get their variants and index entries in the background
+    preflight_assets_async()
+    return new_catalog
+
+
+# Poll questions.json so staff edits apply without a restart (QUESTIONS_WATCH_SECS=0 disables)
+QUESTIONS_WATCH_SECS = float(os.environ.get("QUESTIONS_WATCH_SECS", "5"))
+catalog_watcher = CatalogWatcher(QUESTIONS_PATH, reload_catalog, interval=QUESTIONS_WATCH_SECS)
+
+
+# Session store keyed by Telegram chat_id: "memory" (default, lost on restart),
+# "sqlite" (WAL file under DATA_DIR; touched sessions are written once per webhook) or
+# "journal" (memory plus an append-only change log under DATA_DIR, replayed on startup;
+# a chat's changes are appended when its lock is released).
+SESSION_STORE = os.environ.get("SESSION_STORE", "sqlite" if SHARED_STATE else "memory")
+if SHARED_STATE and SESSION_STORE.strip().lower() in ("memory", "journal"):
+    raise RuntimeError(f"SESSION_STORE={SESSION_STORE} can't be shared between worker processes; use sqlite")
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH") or os.path.join(DATA_DIR, "sessions.db")
+SESSION_JOURNAL_PATH = os.environ.get("SESSION_JOURNAL_PATH") or os.path.join(DATA_DIR, "sessions.journal")
+sessions: SessionStore = make_session_store(
+    SESSION_STORE,
+    SESSION_DB_PATH,
+    question_slots.slot,
+    journal_path=SESSION_JOURNAL_PATH,
+    shared=SHARED_STATE,
+    snapshot_every=int(os.environ.get("SESSION_JOURNAL_SNAPSHOT_RECORDS", "20000")),
+    keep=int(os.environ.get("SESSION_JOURNAL_KEEP", "3")),
+    fsync=os.environ.get("SESSION_JOURNAL_FSYNC", "0") == "1",
+)
+
+# Finished runs, ranked incrementally (best per team) and appended to a JSONL log
+LEADERBOARD_PATH = os.environ.get("LEADERBOARD_PATH") or os.path.join(DATA_DIR, "leaderboard.jsonl")
+LEADERBOARD_SIZE = int(os.environ.get("LEADERBOARD_SIZE", "10"))
+# Which run of a chat is ranked: "first" (default; replays know the answers) or "best"
+LEADERBOARD_RANKS = os.environ.get("LEADERBOARD_RANKS", "first").strip().lower()
+leaderboard = Leaderboard(LEADERBOARD_PATH, follow=SHARED_STATE, ranks=LEADERBOARD_RANKS)
+
+# Results export: finishes are appended to a local log and shipped in batches by a background flusher
+_results_sink = make_results_sink(
+    os.environ.get("RESULTS_WEBHOOK_URL") or os.environ.get("SHEETS_WEBAPP_URL"),
+    os.environ.get("AIRTABLE_API_KEY"),
+    os.environ.get("AIRTABLE_BASE_ID"),
+    os.environ.get("AIRTABLE_TABLE"),
+)
+results_outbox: ResultsOutbox | None = None
+if _results_sink is not None:
+    results_outbox = ResultsOutbox(
+        os.environ.get("RESULTS_LOG_PATH") or os.path.join(DATA_DIR, "results.jsonl"),
+        _results_sink,
+        batch_size=int(os.environ.get("RESULTS_BATCH_SIZE", "20")),
+        interval=float(os.environ.get("RESULTS_FLUSH_SECS", "2")),
+        # With several workers only the lease holder delivers
+        leader=lease_leader(shared_state, "results-export", 60.0) if shared_state is not None else None,
+    )
+
+
+# Updates for one chat are handled one at a time (two quick taps can't double-score);
+# different chats run in parallel. Telegram re-deliveries are dropped by update_id.
+# In shared mode both work across processes: a chat's lease reloads its session on
+# entry and flushes it on exit, so any worker can take any update (no chat affinity).
+DEDUP_MAX_UPDATES = int(os.environ.get("DEDUP_MAX_UPDATES", "10000"))
+DEDUP_TTL_SECS = float(os.environ.get("DEDUP_TTL_SECS", "3600"))
+chat_locks: KeyedLocks | ChatLeases
+recent_updates: RecentIds | SharedRecentIds
+if shared_state is not None:
+    chat_locks = ChatLeases(
+        shared_state,
+        ttl=float(os.environ.get("CHAT_LEASE_SECS", "30")),
+        on_acquire=lambda chat_id: sessions.refresh(chat_id),
+        on_release=lambda chat_id: flush_chat_session(chat_id),
+    )
+    recent_updates = SharedRecentIds(shared_state, max_size=DEDUP_MAX_UPDATES, ttl_secs=DEDUP_TTL_SECS)
+elif sessions.flush_per_chat:
+    # Write each chat (journal / SQLite) as its lock is released, never a session mid-update
+    chat_locks = KeyedLocks(
+        on_acquire=lambda chat_id: sessions.refresh(chat_id),
+        on_release=lambda chat_id: flush_chat_session(chat_id),
+    )
+    recent_updates = RecentIds(max_size=DEDUP_MAX_UPDATES, ttl_secs=DEDUP_TTL_SECS)
+else:
+    chat_locks = KeyedLocks()
+    recent_updates = RecentIds(max_size=DEDUP_MAX_UPDATES, ttl_secs=DEDUP_TTL_SECS)
+
+
+def flush_sessions() -> None:
+    """Persist every session touched since the last flush (one batched write)."""
+    try:
+        sessions.flush()
+    except Exception as e:
+        print(f"[sessions] flush failed: {e}", flush=True)
 
 
-# In-memory session store keyed by Telegram chat_id
-sessions: Dict[int, Dict[str, Any]] = {}
+atexit.register(flush_sessions)
+
+
+def flush_chat_session(chat_id: int) -> None:
+    """Persist one chat's session before its lock or cross-process lease is released."""
+    try:
+        sessions.flush_chat(chat_id)
+    except Exception as e:
+        print(f"[sessions] flush of {chat_id} failed: {e}", flush=True)
+
+
+# Session eviction: idle sessions and the least recently used beyond MAX_SESSIONS
+# are dropped by a background sweeper; unfinished hunts are archived first.
+SESSION_IDLE_TTL_SECS = int(os.environ.get("SESSION_IDLE_TTL_SECS", str(6 * 3600)))
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "5000"))
+SESSION_ARCHIVE_PATH = os.environ.get("SESSION_ARCHIVE_PATH") or os.path.join(DATA_DIR, "abandoned_sessions.jsonl")
+
+
+def hunt_in_progress(sess: Session) -> bool:
+    """Team named and not yet finished (finalize_quiz clears started_at and state)."""
+    return bool(sess.team_name) and bool(sess.started_at or sess.state)
+
+
+def archive_session(chat_id: int, sess: Session, reason: str) -> None:
+    """Append an unfinished hunt's progress to SESSION_ARCHIVE_PATH before it is evicted."""
+    last_seen = sessions.last_seen(chat_id) or time.time()
+    record = {
+        "chat_id": chat_id,
+        "team": sess.team_name,
+        "reason": reason,
+        "state": sess.state,
+        "question": sess.index + 1,
+        "question_id": sess.question_id,
+        "total": CATALOG.total,
+        "score": sess.score,
+        "active_secs": int(timer_elapsed(sess, now=last_seen)),
+        "penalty_secs": sess.penalty_secs,
+        "last_seen": int(last_seen),
+        "archived_at": int(time.time()),
+    }
+    folder = os.path.dirname(SESSION_ARCHIVE_PATH)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(SESSION_ARCHIVE_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def evict_session(chat_id: int, reason: str, cutoff: float) -> bool:
+    """SessionSweeper callback (reason "idle" or "capacity"); runs under the chat's lock."""
+    with chat_locks.hold(chat_id):
+        if reason == "idle":
+            seen = sessions.last_seen(chat_id)
+            if seen is not None and seen >= cutoff:
+                return False  # active again since the sweep started
+        elif sessions.persistent:
+            # Over the memory cap: still on disk, reloaded on the chat's next update
+            sessions.unload(chat_id)
+            return True
+        sess = sessions.peek(chat_id)
+        if sess is None:
+            return False
+        if hunt_in_progress(sess):
+            try:
+                archive_session(chat_id, sess, reason)
+            except OSError as e:
+                print(f"[sessions] could not archive {chat_id}, keeping it: {e}", flush=True)
+                return False
+        sessions.pop(chat_id)
+        flush_sessions()
+        return True
+
+
+session_sweeper = SessionSweeper(
+    sessions,
+    evict_session,
+    idle_ttl=SESSION_IDLE_TTL_SECS,
+    max_sessions=MAX_SESSIONS,
+    interval=float(os.environ.get("SESSION_SWEEP_SECS", "60")),
+)
+
+
+def run_and_flush(fn: Any, chat_id: int, *args: Any) -> None:
+    """Run a session-mutating callback for a chat off the request path (holding the
+    chat's lock, like a webhook would), then persist that chat's changes.
+    """
+    with chat_locks.hold(chat_id):
+        try:
+            sessions.note(chat_id, fn.__name__)
+            fn(chat_id, *args)
+        finally:
+            flush_chat_session(chat_id)
 
 
 # Env
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 RENDER_EXTERNAL_URL = os.environ.get("RENDER_EXTERNAL_URL")
+# Bot API base URL; override to point at a local fake Bot API when testing
+TELEGRAM_API_BASE = (os.environ.get("TELEGRAM_API_BASE") or "https://api.telegram.org").rstrip("/")
+# Protects /admin/* endpoints; they are disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 # Hint penalty currently disabled; keep env for future use if needed
 HINT_PENALTY_SECS = int(os.environ.get("HINT_PENALTY_SECS", "20"))
-HINT_BUTTON_DATA = "__HINT__"
 NEXT_BUTTON_DATA = "__NEXT__"
 NEXT_BUTTON_LABEL = "Next Question ▶️"
-PHOTO_BUTTON_DATA = "__PHOTO__"
-PHOTO_BUTTON_LABEL = "📷 Upload Photo"
+
+# Telegram file_id cache for local images (re-send by id instead of re-uploading)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+FILE_ID_CACHE_PATH = os.environ.get("FILE_ID_CACHE_PATH") or os.path.join(_HERE, ".cache", "file_ids.json")
+file_id_cache: FileIdCache = (
+    SharedFileIdCache(shared_state, seed_path=FILE_ID_CACHE_PATH) if shared_state is not None
+    else FileIdCache(FILE_ID_CACHE_PATH)
+)
+
+# Hard-coded intro images (everything else is referenced from questions.json)
+MADAM_LINDEN_IMAGE = "static/images/madam_linden.png"
+THEMES_INTRO_IMAGE = "static/images/introduction_of_themes.png"
+
+# Size-capped JPEG variants of local images (static/_tg/), sent instead of the originals
+IMAGE_VARIANTS = os.environ.get("IMAGE_VARIANTS", "1") != "0"
+image_variants = ImageVariants(
+    _HERE,
+    max_side=int(os.environ.get("IMAGE_MAX_SIDE", "1280")),
+    quality=int(os.environ.get("IMAGE_JPEG_QUALITY", "85")),
+)
+
+
+def image_refs() -> List[str]:
+    """Every local image the bot may send."""
+    return collect_image_refs(QUESTIONS, extra=(MADAM_LINDEN_IMAGE, THEMES_INTRO_IMAGE))
+
+
+# Preflight index of every referenced image (exists/size/hash) so sends never stat or hash
+asset_index = AssetIndex(
+    _HERE,
+    cache_path=os.path.join(DATA_DIR, "asset_hashes.json"),
+    resolve=image_variants.resolve if IMAGE_VARIANTS else None,
+)
+_preflight_lock = threading.Lock()
+
+
+def preflight_assets() -> Dict[str, int]:
+    """Build image variants (if enabled), then index every referenced image; logs missing files."""
+    with _preflight_lock:
+        refs = image_refs()
+        if IMAGE_VARIANTS:
+            built = image_variants.build(refs)
+            if built["built"]:
+                print(f"[image_variants] {built}", flush=True)
+        t0 = time.perf_counter()
+        stats = asset_index.rebuild(refs)
+    print(
+        f"[assets] {stats['indexed']} images ({stats['bytes'] / 1e6:.1f} MB), {stats['hashed']} hashed, "
+        f"{stats['missing']} missing, in {(time.perf_counter() - t0) * 1000:.0f} ms",
+        flush=True,
+    )
+    for ref in asset_index.missing():
+        print(f"[assets] missing file (will be sent as URL): {ref}", flush=True)
+    return stats
+
+
+def preflight_assets_async() -> threading.Thread:
+    t = threading.Thread(target=preflight_assets, name="asset-preflight", daemon=True)
+    t.start()
+    return t
+
+# Outbound Bot API calls run on a background worker pool (ordered per chat) so the
+# webhook only mutates the session, enqueues, and returns. SEND_WORKERS=0 sends inline.
+SEND_WORKERS = int(os.environ.get("SEND_WORKERS", "8"))
+outbox = Outbox(workers=SEND_WORKERS)
+# Give queued messages a moment to go out on shutdown
+atexit.register(outbox.drain, 5.0)
+
+# Delayed work (e.g. "typing…" then the next question) is timed on one thread, not in the
+# webhook, and run on SCHEDULER_WORKERS threads so a chat whose lock is held delays only itself
+scheduler = Scheduler(workers=int(os.environ.get("SCHEDULER_WORKERS", "4")))
+NEXT_DELAY_SECS = int(os.environ.get("NEXT_DELAY_MS", "1000")) / 1000.0
+# Send multi-step explanations as captions/media groups (1) or one call per step (0)
+EXPLANATION_BATCHING = os.environ.get("EXPLANATION_BATCHING", "1") != "0"
 
 # --- Active time tracking (pause/resume between questions) ---
-def timer_resume(sess: Dict[str, Any]) -> None:
+def timer_resume(sess: Session) -> None:
     """Resume active timer if paused."""
-    if sess.get("time_segment_started") is None:
-        sess["time_segment_started"] = time.time()
+    if sess.time_segment_started is None:
+        sess.time_segment_started = time.time()
 
 
-def timer_pause(sess: Dict[str, Any]) -> None:
+def timer_pause(sess: Session) -> None:
     """Pause active timer and accumulate elapsed into time_accum."""
-    ts = sess.get("time_segment_started")
+    ts = sess.time_segment_started
     if ts is not None:
-        sess["time_accum"] = float(sess.get("time_accum", 0.0)) + (time.time() - float(ts))
-        sess["time_segment_started"] = None
+        sess.time_accum += time.time() - float(ts)
+        sess.time_segment_started = None
 
 
-def timer_elapsed(sess: Dict[str, Any]) -> float:
+def timer_elapsed(sess: Session, now: float | None = None) -> float:
     """Current total active time (seconds), including running segment if any."""
-    acc = float(sess.get("time_accum", 0.0))
-    ts = sess.get("time_segment_started")
+    acc = sess.time_accum
+    ts = sess.time_segment_started
     if ts is not None:
-        acc += (time.time() - float(ts))
+        acc += ((time.time() if now is None else now) - float(ts))
     return max(0.0, acc)
 
 
-# --- Hint availability helper ---
-def has_hint(q: Dict[str, Any]) -> bool:
-    """Return True if question has a non-empty hint or hint_image."""
-    ht = q.get("hint")
-    hi = q.get("hint_image")
-    ht_ok = isinstance(ht, str) and ht.strip() != ""
-    hi_ok = isinstance(hi, str) and hi.strip() != ""
-    return ht_ok or hi_ok
-
 # Admin notifications: set OWNER_CHAT_ID="123456789" or ADMIN_CHAT_IDS="123,456"
 ADMIN_CHAT_IDS: List[int] = []
 _env_admins = (os.environ.get("OWNER_CHAT_ID") or os.environ.get("ADMIN_CHAT_IDS") or "").strip()
@@ -96,57 +426,173 @@ if _env_admins:
         ADMIN_CHAT_IDS = []
 
 
+# url_root of the latest webhook, for URLs built off the request (scheduled callbacks)
+_last_url_root: str | None = None
+
+
 def get_base_url() -> str:
     # Prefer explicit env from Render; fallback to request.url_root when available
+    global _last_url_root
     if RENDER_EXTERNAL_URL:
         return RENDER_EXTERNAL_URL.rstrip("/")
-    try:
-        # Works only inside a request context
-        return request.url_root.rstrip("/")
-    except Exception:
-        return "http://localhost:3000"
+    if has_request_context():
+        _last_url_root = request.url_root.rstrip("/")
+        return _last_url_root
+    return _last_url_root or "http://localhost:3000"
+
+
+# Client-side pacing of sends under Telegram's limits (see ratelimit.py). The global
+# budget is split between the worker processes actually running (one when polling);
+# TG_RATE_LIMIT=0 turns pacing off.
+send_limiter: RateLimiter | None = None
+if os.environ.get("TG_RATE_LIMIT", "1") != "0":
+    send_limiter = RateLimiter(
+        global_rate=float(os.environ.get("TG_RATE_GLOBAL", "25")) / server.worker_processes(),
+        global_burst=float(os.environ.get("TG_RATE_GLOBAL_BURST", "5")) / server.worker_processes(),
+        chat_rate=float(os.environ.get("TG_RATE_CHAT", "1")),
+        chat_burst=float(os.environ.get("TG_RATE_CHAT_BURST", "3")),
+        group_rate=float(os.environ.get("TG_RATE_GROUP_PER_MIN", "20")) / 60,
+        on_wait=lambda lane, secs: TG_SEND_WAIT.observe(secs, lane),
+    )
+    # A chat over its own rate waits in its outbox lane, not on a send worker
+    outbox.delay_of = send_limiter.chat_delay
+
+# Shared keep-alive connection pool for every Bot API call (see tg_client.py)
+tg_client = BotAPIClient(
+    TELEGRAM_API_BASE,
+    TELEGRAM_BOT_TOKEN,
+    pool_size=int(os.environ.get("TG_POOL_SIZE", "16")),
+    connect_timeout=float(os.environ.get("TG_CONNECT_TIMEOUT", "5")),
+    max_retries=int(os.environ.get("TG_MAX_RETRIES", "3")),
+    backoff_secs=float(os.environ.get("TG_BACKOFF_SECS", "0.5")),
+    max_retry_after=float(os.environ.get("TG_MAX_RETRY_AFTER", "30")),
+    limiter=send_limiter,
+)
 
 
 def tg_api(method: str) -> str:
-    if not TELEGRAM_BOT_TOKEN:
-        raise RuntimeError("Missing TELEGRAM_BOT_TOKEN env var")
-    return f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/{method}"
+    return tg_client.url(method)
+
+
+def tg_call(method: str, timeout: float = 10, lane: str = "user", **kwargs: Any) -> requests.Response:
+    """POST a Bot API method over the pooled session (paced, retries 429/5xx with backoff).
+    lane="admin" yields to player sends when the global send rate is saturated."""
+    if not metrics.enabled:
+        return tg_client.call(method, timeout=timeout, lane=lane, **kwargs)
+    t0 = time.perf_counter()
+    try:
+        resp = tg_client.call(method, timeout=timeout, lane=lane, **kwargs)
+    except Exception as e:
+        TG_ERRORS.inc(method, type(e).__name__)
+        raise
+    finally:
+        TG_LATENCY.observe(time.perf_counter() - t0, method)
+    if not resp.ok:
+        TG_ERRORS.inc(method, str(resp.status_code))
+    return resp
+
+
+# Admin fan-out runs on its own bounded pool (one lane per admin), off the player send path
+admin_notifier = AdminNotifier(
+    lambda method, **kwargs: tg_call(method, lane="admin", **kwargs),
+    ADMIN_CHAT_IDS,
+    workers=int(os.environ.get("ADMIN_NOTIFY_WORKERS", "4")),
+    photo_dedup_secs=float(os.environ.get("ADMIN_PHOTO_DEDUP_SECS", "60")),
+)
+atexit.register(admin_notifier.drain, 5.0)
+
+# Photo submissions archived locally (PHOTO_ARCHIVE=1): downloaded in the background,
+# stored once per content hash and indexed by team and question (see photo_archive.py)
+photo_archive: PhotoArchive | None = None
+if os.environ.get("PHOTO_ARCHIVE", "0") == "1":
+    photo_archive = PhotoArchive(
+        os.environ.get("PHOTO_ARCHIVE_DIR") or os.path.join(DATA_DIR, "photos"),
+        tg_call,
+        tg_client.download,
+        workers=int(os.environ.get("PHOTO_ARCHIVE_WORKERS", "2")),
+        max_pending=int(os.environ.get("PHOTO_ARCHIVE_MAX_PENDING", "200")),
+        max_file_bytes=int(os.environ.get("PHOTO_ARCHIVE_MAX_FILE_MB", "20")) * 1024 * 1024,
+        max_total_bytes=int(os.environ.get("PHOTO_ARCHIVE_MAX_MB", "2048")) * 1024 * 1024,
+    )
+    atexit.register(photo_archive.drain, 10.0)
+# Lifetime of the signed file links in /admin/photos (they open in a browser without the header)
+PHOTO_ARCHIVE_URL_SECS = int(os.environ.get("PHOTO_ARCHIVE_URL_SECS", "3600"))
+
+
+# Metrics (GET /metrics). METRICS=0 turns every hook into a single flag check.
+metrics = Registry(enabled=os.environ.get("METRICS", "1") != "0")
+UPDATE_LATENCY = metrics.histogram(
+    "quiz_update_seconds", "Time to handle one Telegram update (inside the chat lock)", ("kind", "branch")
+)
+UPDATES_DUPLICATE = metrics.counter("quiz_updates_duplicate_total", "Re-delivered updates dropped by update_id")
+TG_LATENCY = metrics.histogram("quiz_tg_api_seconds", "Bot API call latency including retries", ("method",))
+TG_SEND_WAIT = metrics.histogram("quiz_tg_send_wait_seconds", "Time a send waited for rate-limit tokens", ("lane",))
+TG_ERRORS = metrics.counter(
+    "quiz_tg_api_errors_total", "Bot API calls that failed (HTTP status or exception name)", ("method", "error")
+)
+TYPED_ANSWERS = metrics.counter(
+    "quiz_typed_answers_total", "Typed text while a question is open, by how it matched an option", ("match",)
+)
+PHOTO_UPLOADS = metrics.counter("quiz_photo_uploads_total", "Local images uploaded (file_id cache misses)")
+PHOTO_UPLOAD_BYTES = metrics.counter("quiz_photo_upload_bytes_total", "Bytes of local images uploaded")
+EXPLANATION_CALLS_SAVED = metrics.counter(
+    "quiz_explanation_calls_saved_total", "Bot API calls saved by batching explanation steps", ("question",)
+)
+# One log line per answered question with batched explanations (calls made and saved)
+LOG_EXPLANATIONS = os.environ.get("LOG_EXPLANATIONS", "0") == "1"
+metrics.gauge("quiz_sessions", "Sessions held by the session store", lambda: len(sessions))
+metrics.gauge("quiz_sessions_resident", "Sessions held in memory", lambda: sessions.resident())
+metrics.gauge(
+    "quiz_sessions_evicted",
+    "Sessions evicted since start, by reason",
+    lambda: {(k,): v for k, v in session_sweeper.evicted.items()},
+    ("reason",),
+)
+metrics.gauge(
+    "quiz_queue_depth",
+    "Jobs waiting per background queue",
+    lambda: {
+        ("outbox",): outbox.pending(),
+        ("admin",): admin_notifier.outbox.pending(),
+        ("scheduler",): scheduler.pending(),
+        ("results",): results_outbox.pending() if results_outbox is not None else 0,
+        ("photos",): photo_archive.outbox.pending() if photo_archive is not None else 0,
+    },
+    ("queue",),
+)
+metrics.gauge(
+    "quiz_photo_archive",
+    "Archived photo submissions since start, by outcome",
+    lambda: {(k,): photo_archive.counts[k] for k in PHOTO_OUTCOMES} if photo_archive is not None else {},
+    ("outcome",),
+)
+metrics.gauge(
+    "quiz_tg_send_waiting",
+    "Sends waiting for rate-limit tokens, per lane",
+    lambda: {(lane,): n for lane, n in send_limiter.depth().items()} if send_limiter is not None else {},
+    ("lane",),
+)
 
 
 def send_chat_action(chat_id: int, action: str = "typing") -> None:
     """Show a chat action (e.g., typing) to make short pauses feel intentional."""
+    outbox.submit(chat_id, send_chat_action_now, chat_id, action)
+
+
+def send_chat_action_now(chat_id: int, action: str = "typing") -> None:
     try:
-        requests.post(tg_api("sendChatAction"), json={"chat_id": chat_id, "action": action}, timeout=5)
+        tg_call("sendChatAction", json={"chat_id": chat_id, "action": action}, timeout=5)
     except Exception:
         # Non-fatal if this fails
         pass
 
 
-def to_list(value: Any) -> List[str]:
-    """Normalize a value into a list of non-empty strings.
-    Accepts list[str] or str; returns [] for None/empty.
-    """
-    if value is None:
-        return []
-    if isinstance(value, list):
-        return [str(v) for v in value if str(v).strip()]
-    if isinstance(value, str):
-        v = value.strip()
-        return [v] if v else []
-    return []
-
-
-def get_active_questions() -> List[Dict[str, Any]]:
-    """Return only questions marked visible (default True). Supports legacy key as fallback."""
-    active: List[Dict[str, Any]] = []
-    for q in QUESTIONS:
-        visible = bool(q.get("is_visible", q.get("display_question", True)))
-        if visible:
-            active.append(q)
-    return active
+def send_message(chat_id: int, text: str, reply_markup: Dict[str, Any] | None = None) -> None:
+    """Queue a message; delivered in order with the chat's other outbound calls."""
+    outbox.submit(chat_id, send_message_now, chat_id, text, reply_markup)
 
 
-def send_message(chat_id: int, text: str, reply_markup: Dict[str, Any] | None = None) -> None:
+def send_message_now(chat_id: int, text: str, reply_markup: Dict[str, Any] | None = None) -> None:
     payload: Dict[str, Any] = {
         "chat_id": chat_id,
         "text": text,
@@ -156,7 +602,7 @@ def send_message(chat_id: int, text: str, reply_markup: Dict[str, Any] | None =
     }
     if reply_markup:
         payload["reply_markup"] = reply_markup
-    resp = requests.post(tg_api("sendMessage"), json=payload, timeout=10)
+    resp = tg_call("sendMessage", json=payload, timeout=10)
     resp.raise_for_status()
 
 
@@ -164,19 +610,22 @@ def send_message(chat_id: int, text: str, reply_markup: Dict[str, Any] | None =
 
 
 def notify_admins(text: str) -> None:
-    """Send a notification message to configured admin chat IDs, if any."""
-    if not ADMIN_CHAT_IDS:
+    """Send a notification message to configured admin chat IDs, if any (queued, concurrent)."""
+    admin_notifier.send_text(text)
+
+
+def answer_callback_query(callback_query_id: str | None) -> None:
+    """Acknowledge a button tap (removes the loading state); not ordered with chat messages."""
+    if not callback_query_id:
         return
-    for admin_id in ADMIN_CHAT_IDS:
-        try:
-            requests.post(
-                tg_api("sendMessage"),
-                json={"chat_id": admin_id, "text": text, "parse_mode": "HTML"},
-                timeout=10,
-            )
-        except Exception:
-            # Ignore failures to avoid impacting user flow
-            pass
+    outbox.submit(None, answer_callback_query_now, callback_query_id)
+
+
+def answer_callback_query_now(callback_query_id: str) -> None:
+    try:
+        tg_call("answerCallbackQuery", json={"callback_query_id": callback_query_id}, timeout=10)
+    except Exception:
+        pass
 
 
 def send_photo_with_buttons(chat_id: int, photo_url: str, caption: str, reply_markup: Dict[str, Any]) -> None:
@@ -187,11 +636,11 @@ def send_photo_with_buttons(chat_id: int, photo_url: str, caption: str, reply_ma
         "parse_mode": "HTML",
         "reply_markup": reply_markup,
     }
-    resp = requests.post(tg_api("sendPhoto"), json=payload, timeout=10)
+    resp = tg_call("sendPhoto", json=payload, timeout=10)
     resp.raise_for_status()
 
 
-def send_photo(chat_id: int, photo_url: str, caption: str | None = None) -> None:
+def send_photo_now(chat_id: int, photo_url: str, caption: str | None = None) -> None:
     payload: Dict[str, Any] = {
         "chat_id": chat_id,
         "photo": photo_url,
@@ -199,91 +648,227 @@ def send_photo(chat_id: int, photo_url: str, caption: str | None = None) -> None
     }
     if caption is not None:
         payload["caption"] = caption
-    resp = requests.post(tg_api("sendPhoto"), json=payload, timeout=10)
+    resp = tg_call("sendPhoto", json=payload, timeout=10)
     resp.raise_for_status()
 
 
 def send_photo_auto(chat_id: int, image_path_or_url: str, caption: str | None = None) -> None:
+    """Queue a photo (see send_photo_auto_now); failures are logged by the outbox."""
+    # The URL fallback is resolved here: outbox workers have no request context
+    outbox.submit(chat_id, send_photo_auto_now, chat_id, image_path_or_url, caption, get_base_url())
+
+
+def _local_photo(image_path_or_url: str) -> Asset:
+    """Index entry for an image reference (asset.path is None if there is no local file).
+    Points at the Telegram-sized variant when IMAGE_VARIANTS is on.
+    """
+    return asset_index.get(image_path_or_url)
+
+
+def _count_upload(*uploaded: Asset) -> None:
+    if metrics.enabled:
+        for asset in uploaded:
+            PHOTO_UPLOADS.inc()
+            PHOTO_UPLOAD_BYTES.inc(amount=asset.size)
+
+
+def send_photo_auto_now(
+    chat_id: int, image_path_or_url: str, caption: str | None = None, base_url: str | None = None
+) -> None:
     """Send a photo by uploading a local file if it exists; otherwise send as URL.
     This avoids Telegram needing to fetch from a public URL during local dev.
+    Local uploads are cached by file_id, so each image is uploaded at most once per content version.
+    base_url (resolved when the send was queued) is used for the URL fallback.
     """
     # If already a full URL, just send it
     if image_path_or_url.startswith(("http://", "https://")):
-        send_photo(chat_id, image_path_or_url, caption=caption)
+        send_photo_now(chat_id, image_path_or_url, caption=caption)
         return
 
-    # Resolve local path relative to project root
-    here = os.path.dirname(os.path.abspath(__file__))
-    local_path = os.path.join(here, image_path_or_url.lstrip("/"))
+    asset = _local_photo(image_path_or_url)
+    if asset.path is not None:
+        cache_key = asset.cache_key
+        cached_id = file_id_cache.get(cache_key)
+        if cached_id:
+            try:
+                send_photo_now(chat_id, cached_id, caption=caption)
+                return
+            except requests.HTTPError as e:
+                # Telegram rejected the stored id (e.g. bot token changed); upload again
+                if e.response is None or e.response.status_code != 400:
+                    raise
+                print(f"[send_photo_auto] stale file_id for {asset.rel_path}, re-uploading", flush=True)
+                file_id_cache.invalidate(cache_key)
 
-    if os.path.exists(local_path) and os.path.isfile(local_path):
-        url = tg_api("sendPhoto")
         data: Dict[str, Any] = {"chat_id": chat_id}
         if caption is not None:
             data["caption"] = caption
             data["parse_mode"] = "HTML"
-        with open(local_path, "rb") as f:
-            files = {"photo": f}
-            resp = requests.post(url, data=data, files=files, timeout=30)
-            resp.raise_for_status()
-        return
+        try:
+            f = open(asset.path, "rb")
+        except OSError:
+            # Removed since the preflight; re-index on next use and send by URL now
+            asset_index.invalidate(asset.ref)
+            print(f"[send_photo_auto] {asset.rel_path} disappeared, sending by URL", flush=True)
+        else:
+            with f:
+                resp = tg_call("sendPhoto", data=data, files={"photo": f}, timeout=30)
+                resp.raise_for_status()
+            _count_upload(asset)
+            try:
+                new_id = largest_photo_file_id(resp.json())
+            except ValueError:
+                new_id = None
+            if new_id:
+                file_id_cache.put(cache_key, new_id)
+            return
 
     # Fallback: build absolute URL and send
-    abs_url = make_absolute_image_url(image_path_or_url)
-    send_photo(chat_id, abs_url, caption=caption)
+    abs_url = make_absolute_image_url(asset.rel_path, base_url)
+    send_photo_now(chat_id, abs_url, caption=caption)
+
+
+def send_media_group_now(
+    chat_id: int, photos: List[Tuple[str, str | None]], base_url: str | None = None
+) -> None:
+    """Send 2-10 (image, caption) pairs as one album via sendMediaGroup.
+    Local files reuse cached file_ids or are attached as multipart uploads (then cached);
+    if Telegram rejects a cached id, the group is retried once with fresh uploads.
+    """
+    for attempt in (0, 1):
+        media: List[Dict[str, Any]] = []
+        uploads: Dict[str, Asset] = {}  # attach name -> local file
+        cache_keys: List[str | None] = []
+        used_cached = False
+        for i, (image, caption) in enumerate(photos):
+            item: Dict[str, Any] = {"type": "photo"}
+            key = None
+            if image.startswith(("http://", "https://")):
+                item["media"] = image
+            else:
+                asset = _local_photo(image)
+                if asset.path is None:
+                    item["media"] = make_absolute_image_url(asset.rel_path, base_url)
+                else:
+                    key = asset.cache_key
+                    cached_id = file_id_cache.get(key) if attempt == 0 else None
+                    if cached_id:
+                        item["media"] = cached_id
+                        used_cached = True
+                    else:
+                        uploads[f"photo{i}"] = asset
+                        item["media"] = f"attach://photo{i}"
+            if caption is not None:
+                item["caption"] = caption
+                item["parse_mode"] = "HTML"
+            media.append(item)
+            cache_keys.append(key)
+
+        data = {"chat_id": chat_id, "media": json.dumps(media)}
+        handles: Dict[str, Any] = {}
+        try:
+            for name, asset in uploads.items():
+                handles[name] = open(asset.path, "rb")
+        except OSError:
+            # A file vanished since the preflight; the caller falls back to single photos
+            for asset in uploads.values():
+                asset_index.invalidate(asset.ref)
+            for f in handles.values():
+                f.close()
+            raise
+        try:
+            resp = tg_call("sendMediaGroup", data=data, files=handles or None, timeout=60)
+        finally:
+            for f in handles.values():
+                f.close()
+        if resp.status_code == 400 and used_cached:
+            # Some cached id was rejected; drop them and upload everything local
+            print(f"[send_media_group] rejected cached file_id for chat {chat_id}, re-uploading", flush=True)
+            for key in cache_keys:
+                if key:
+                    file_id_cache.invalidate(key)
+            continue
+        resp.raise_for_status()
+        _count_upload(*uploads.values())
+        try:
+            messages = resp.json().get("result") or []
+        except ValueError:
+            messages = []
+        for key, msg in zip(cache_keys, messages):
+            if key and not file_id_cache.get(key):
+                new_id = largest_photo_file_id({"result": msg})
+                if new_id:
+                    file_id_cache.put(key, new_id)
+        return
+
+
+def _send_explanation_call_now(chat_id: int, call: DeliveryCall, base_url: str | None = None) -> None:
+    """Execute one planned explanation call; an album that fails is sent photo by photo."""
+    if call.kind == "text":
+        send_message_now(chat_id, call.text)
+        return
+    if call.kind == "album":
+        try:
+            send_media_group_now(chat_id, list(call.photos), base_url)
+            return
+        except Exception as e:
+            print(f"[send_media_group] falling back to single photos for chat {chat_id}: {e}", flush=True)
+    for image, caption in call.photos:
+        send_photo_auto_now(chat_id, image, caption=caption, base_url=base_url)
 
 
-def ensure_session(chat_id: int) -> Dict[str, Any]:
+def ensure_session(chat_id: int) -> Session:
     sess = sessions.get(chat_id)
-    if not sess:
-        sess = {
-            "index": 0,
-            "score": 0,
-            "team_name": None,
-            "state": None,  # 'awaiting_team_name' | 'awaiting_ready' | None
-            "started_at": None,  # UNIX timestamp when quiz starts (on READY)
-            "penalty_secs": 0,
-            "hint_used_indices": [],  # indices where hint already used (penalized once)
-            "awaiting_next": False,  # require Next before moving on
-            "awaiting_photo_for": None,  # when user tapped Upload Photo, expect photo for this index
-            "photo_awarded_for": set(),  # indices that have been awarded for photo
-            "exp_sent_for": set(),  # indices where explanations already sent
-            # Active timer bookkeeping
-            "time_accum": 0.0,
-            "time_segment_started": None,
-        }
+    if sess is None:
+        sess = Session()
         sessions[chat_id] = sess
-    else:
-        # Backfill new fields for existing sessions
-        sess.setdefault("penalty_secs", 0)
-        sess.setdefault("hint_used_indices", [])
-        sess.setdefault("awaiting_next", False)
-        sess.setdefault("awaiting_photo_for", None)
-        sess.setdefault("photo_awarded_for", set())
-        sess.setdefault("exp_sent_for", set())
-        sess.setdefault("time_accum", 0.0)
-        sess.setdefault("time_segment_started", None)
+    # Callers mutate the session in place; flush_sessions() writes it at the end of the webhook
+    sessions.mark_dirty(chat_id)
     return sess
 
 
-def build_inline_keyboard(options: List[str], include_hint: bool = False) -> Dict[str, Any]:
-    # One button per row for readability
-    keyboard = [[{"text": opt, "callback_data": opt}] for opt in options]
-    if include_hint:
-        # Add a dedicated hint button on its own row
-        keyboard.append([[{"text": "💡 Hint", "callback_data": HINT_BUTTON_DATA}]][0])
-    return {"inline_keyboard": keyboard}
+# Static keyboards are built once and shared (never mutate them)
+NEXT_KEYBOARD: Dict[str, Any] = {"inline_keyboard": [[{"text": NEXT_BUTTON_LABEL, "callback_data": NEXT_BUTTON_DATA}]]}
+READY_KEYBOARD: Dict[str, Any] = build_inline_keyboard(["READY"])
+START_TIMER_KEYBOARD: Dict[str, Any] = build_inline_keyboard(["Start Timer"])
 
 
 def build_next_keyboard() -> Dict[str, Any]:
-    return {"inline_keyboard": [[{"text": NEXT_BUTTON_LABEL, "callback_data": NEXT_BUTTON_DATA}]]}
+    return NEXT_KEYBOARD
 
 
-def build_photo_keyboard(include_hint: bool = False) -> Dict[str, Any]:
-    keyboard = [[{"text": PHOTO_BUTTON_LABEL, "callback_data": PHOTO_BUTTON_DATA}]]
-    if include_hint:
-        keyboard.append([{"text": "💡 Hint", "callback_data": HINT_BUTTON_DATA}])
-    return {"inline_keyboard": keyboard}
+def current_question(sess: Session) -> CompiledQuestion | None:
+    """The session's current compiled question, or None once past the last one.
+    Sessions are pinned by question `id`, so a catalog reload that hides/reorders
+    questions keeps each team on the same question (or the next visible one).
+    """
+    catalog = CATALOG
+    qid = sess.question_id
+    if qid is None:
+        return catalog.get(sess.index)
+    q = catalog.resolve(qid)
+    if q is None:
+        sess.index = catalog.total
+        sess.question_id = None
+    elif q.position != sess.index or q.qid != qid:
+        sess.index = q.position
+        sess.question_id = q.qid
+    return q
+
+
+def set_question(sess: Session, position: int) -> CompiledQuestion | None:
+    """Move the session to the question at `position` and pin its id."""
+    q = CATALOG.get(position)
+    sess.index = position
+    sess.question_id = q.qid if q is not None else None
+    return q
+
+
+def advance_question(sess: Session) -> CompiledQuestion | None:
+    """Move to the question after the current one; returns it, or None when the hunt is over."""
+    cur = current_question(sess)
+    nxt_pos = cur.position + 1 if cur is not None else CATALOG.total
+    return set_question(sess, nxt_pos)
 
 
 def send_next_prompt(chat_id: int) -> None:
@@ -294,184 +879,192 @@ def send_next_prompt(chat_id: int) -> None:
     )
 
 
-def make_absolute_image_url(image_url: str) -> str:
+def make_absolute_image_url(image_url: str, base_url: str | None = None) -> str:
     if image_url.startswith("http://") or image_url.startswith("https://"):
         return image_url
-    base = get_base_url()
+    base = base_url or get_base_url()
     # Normalize leading slash
     if image_url.startswith("/"):
         return f"{base}{image_url}"
     return f"{base}/{image_url}"
 
 
-def present_question(chat_id: int) -> None:
-    sess = ensure_session(chat_id)
-    sess["awaiting_next"] = False
-    sess["awaiting_photo_for"] = None
+def present_question(chat_id: int, sess: Session | None = None) -> None:
+    if sess is None:
+        sess = ensure_session(chat_id)
+    sess.awaiting_next = False
+    sess.advancing = False
+    sess.awaiting_photo_for = None
     # Resume timer for the active question
     timer_resume(sess)
-    idx = sess["index"]
-    active = get_active_questions()
-    if idx >= len(active):
-        finalize_quiz(chat_id)
+    q = current_question(sess)
+    if q is None:
+        finalize_quiz(chat_id, sess)
         return
-    q = active[idx]
 
     # 1) Show optional question image first (no buttons)
-    q_img = q.get("question_image") or q.get("image_url")
-    if q_img:
-        try:
-            send_photo_auto(chat_id, q_img)
-        except Exception as e:
-            # Continue even if image fails
-            print(f"[present_question] image send failed: {e}", flush=True)
-
-    # 2) Send header + intro + question with answer buttons
-    question_text: str = q["question"]
-    bold_q = f"<b>{question_text}</b>"
-    total = len(active)
-    header = f"<b>Question {idx + 1}/{total}</b>"
-    intro = q.get("intro")
-    if intro:
-        lines = str(intro).splitlines()
-        if q.get("intro_blue"):
-            lines = [f"🔷 {ln}" if ln.strip() else "" for ln in lines]
-        intro_block = "<i>" + "\n".join(lines) + "</i>"
-        body = f"{header}\n\n{intro_block}\n\n{bold_q}"
-    else:
-        body = f"{header}\n\n{bold_q}"
-    if q.get("expect_photo"):
-        reply_markup = build_photo_keyboard(include_hint=has_hint(q))
-        send_message(chat_id, body, reply_markup=reply_markup)
+    if q.image:
+        # Queued; a failed image is logged and the question text still follows
+        send_photo_auto(chat_id, q.image)
+
+    # 2) Send pre-rendered header + intro + question with answer buttons
+    send_message(chat_id, q.body, reply_markup=q.reply_markup)
+    if q.expect_photo:
         # Clear instruction: accepted anytime; re-uploads allowed
         send_message(
             chat_id,
             "Use the 📎 icon to attach your photo. You can send it anytime in this chat, and you may re-upload more photos before pressing <b>Next</b>."
         )
-    else:
-        options: List[str] = q["options"]
-        reply_markup = build_inline_keyboard(options, include_hint=has_hint(q))
-        send_message(chat_id, body, reply_markup=reply_markup)
 
 
-def _use_hint_and_reprompt(chat_id: int) -> None:
-    """Show hint image and/or text with +penalty once per question; do not re-present the question."""
+def present_question_after_typing(chat_id: int, delay: float | None = None) -> None:
+    """Show a typing indicator, then present the current question after `delay` seconds.
+    Scheduled on the timer thread so no request thread sleeps; taps in between are ignored.
+    """
     sess = ensure_session(chat_id)
-    idx = sess.get("index", 0)
-    active = get_active_questions()
-    if idx >= len(active):
+    sess.advancing = True
+    send_chat_action(chat_id, "typing")
+    scheduler.call_later(
+        NEXT_DELAY_SECS if delay is None else delay,
+        run_and_flush,
+        present_scheduled_question,
+        chat_id,
+        sess.question_id if sess.question_id is not None else sess.index,
+        sess.started_at,
+    )
+
+
+def present_scheduled_question(chat_id: int, question: Any, started_at: float | None) -> None:
+    """Scheduled by present_question_after_typing: show the question (its id, or position
+    if it has none), unless the team has moved on since (START, a restarted hunt)."""
+    sess = sessions.get(chat_id)
+    if sess is None or sess.started_at != started_at:
+        return
+    if (sess.question_id if sess.question_id is not None else sess.index) != question:
+        return
+    sessions.mark_dirty(chat_id)
+    present_question(chat_id, sess)
+
+
+def _use_hint_and_reprompt(chat_id: int, sess: Session | None = None) -> None:
+    """Show hint image and/or text with +penalty once per question; do not re-present the question."""
+    if sess is None:
+        sess = ensure_session(chat_id)
+    q = current_question(sess)
+    if q is None:
         send_message(chat_id, "You're not in an active quiz. Type START to play.")
         return
-    q = active[idx]
-    hint_text = (q.get("hint") or "").strip()
-    hint_image = (q.get("hint_image") or "").strip()
+    hint_text = q.hint_text
+    hint_image = q.hint_image
     if not hint_text and not hint_image:
         send_message(chat_id, "No hint available for this question.")
         return
 
     # Apply penalty once per question
-    used_list = sess.get("hint_used_indices", [])
-    first_time = idx not in used_list
+    first_time = not has_bit(sess.hints_used, q.slot)
     if first_time:
-        sess["penalty_secs"] = int(sess.get("penalty_secs", 0)) + HINT_PENALTY_SECS
-        used_list.append(idx)
-        sess["hint_used_indices"] = used_list
+        sess.penalty_secs += HINT_PENALTY_SECS
+        sess.hints_used = set_bit(sess.hints_used, q.slot)
 
     # Send image (with caption) if provided; otherwise send text
     if hint_image:
         caption_base = f"💡 Hint (+{HINT_PENALTY_SECS} secs)" if first_time else "💡 Hint"
         caption = caption_base + (f": {hint_text}" if hint_text else "")
-        try:
-            send_photo_auto(chat_id, hint_image, caption=caption)
-        except Exception as e:
-            print(f"[_use_hint_and_reprompt] hint image send failed: {e}", flush=True)
-            if hint_text:
-                msg_prefix = f"💡 Hint (+{HINT_PENALTY_SECS} secs): " if first_time else "💡 Hint: "
-                send_message(chat_id, msg_prefix + hint_text)
+        fallback = None
+        if hint_text:
+            msg_prefix = f"💡 Hint (+{HINT_PENALTY_SECS} secs): " if first_time else "💡 Hint: "
+            fallback = msg_prefix + hint_text
+        outbox.submit(chat_id, _send_hint_image_now, chat_id, hint_image, caption, fallback, get_base_url())
     elif hint_text:
         msg_prefix = f"💡 Hint (+{HINT_PENALTY_SECS} secs): " if first_time else "💡 Hint: "
         send_message(chat_id, msg_prefix + hint_text)
     # Do not re-present the question; users can answer from the existing prompt
 
 
-def handle_answer(chat_id: int, selected: str) -> None:
-    sess = ensure_session(chat_id)
-    idx = sess["index"]
-    active = get_active_questions()
-    if idx >= len(active):
-        finalize_quiz(chat_id)
+def _send_hint_image_now(
+    chat_id: int, hint_image: str, caption: str, fallback_text: str | None, base_url: str | None = None
+) -> None:
+    try:
+        send_photo_auto_now(chat_id, hint_image, caption=caption, base_url=base_url)
+    except Exception as e:
+        print(f"[_use_hint_and_reprompt] hint image send failed: {e}", flush=True)
+        if fallback_text:
+            send_message_now(chat_id, fallback_text)
+
+
+def handle_answer(chat_id: int, selected: str, sess: Session | None = None) -> None:
+    if sess is None:
+        sess = ensure_session(chat_id)
+    q = current_question(sess)
+    if q is None:
+        finalize_quiz(chat_id, sess)
         return
-    q = active[idx]
     # For photo questions, buttons shouldn't route here
-    if q.get("expect_photo"):
+    if q.expect_photo:
         send_message(chat_id, "Please upload a photo for this question using the button.")
         return
-    correct = q["answer"]
-    is_correct = selected == correct
-    if is_correct:
-        sess["score"] += 1
-        send_message(chat_id, "✅ Correct!")
+    if q.is_correct(selected):
+        sess.score += 1
+        send_message(chat_id, q.correct_text)
     else:
-        send_message(chat_id, f"❌ Not quite. The correct answer is: <b>{correct}</b>")
-
-    # 3) Support multi-step explanations: images/text arrays with fallback to single values
-    img_list = to_list(q.get("explanation_images") or q.get("explanation_image"))
-    txt_list = to_list(q.get("explanations") or q.get("explanation"))
-    steps = max(len(img_list), len(txt_list))
-    for i in range(steps):
-        if i < len(img_list):
-            try:
-                send_photo_auto(chat_id, img_list[i])
-            except Exception as e:
-                print(f"[handle_answer] explanation image failed: {e}", flush=True)
-        if i < len(txt_list):
-            send_message(chat_id, f"ℹ️ {txt_list[i]}")
+        send_message(chat_id, q.wrong_text)
+
+    # 3) Multi-step explanations (pre-normalized at load): image[i] then text[i]
+    if EXPLANATION_BATCHING:
+        # Captions and media groups cut the number of Bot API round-trips (planned at load)
+        base_url = get_base_url()
+        for call in q.explanation_plan:
+            outbox.submit(chat_id, _send_explanation_call_now, chat_id, call, base_url)
+        if q.explanation_calls_saved:
+            EXPLANATION_CALLS_SAVED.inc(str(q.key), amount=q.explanation_calls_saved)
+            if LOG_EXPLANATIONS:
+                print(f"[explanations] chat {chat_id} Q{q.position + 1}: {len(q.explanation_plan)} calls "
+                      f"(saved {q.explanation_calls_saved})", flush=True)
+    else:
+        for img, txt in q.explanation_steps:
+            if img:
+                send_photo_auto(chat_id, img)
+            if txt:
+                send_message(chat_id, txt)
 
     # Advance behavior: if this is the last question, finish; otherwise require Next button
-    if idx + 1 >= len(active):
-        sess["awaiting_next"] = False
-        finalize_quiz(chat_id)
+    if q.position + 1 >= CATALOG.total:
+        sess.awaiting_next = False
+        finalize_quiz(chat_id, sess)
     else:
-        sess["awaiting_next"] = True
+        sess.awaiting_next = True
         # Pause timer while waiting for Next
         timer_pause(sess)
-        send_message(chat_id, "When you’re ready, press <b>Next Question</b>.", reply_markup=build_next_keyboard())
+        send_message(chat_id, "When you’re ready, press <b>Next Question</b>.", reply_markup=NEXT_KEYBOARD)
 
 
-def notify_admins_photo(file_id: str, caption: str | None = None) -> None:
-    if not ADMIN_CHAT_IDS:
-        return
-    for admin_id in ADMIN_CHAT_IDS:
-        try:
-            payload: Dict[str, Any] = {"chat_id": admin_id, "photo": file_id}
-            if caption:
-                payload["caption"] = caption
-                payload["parse_mode"] = "HTML"
-            requests.post(tg_api("sendPhoto"), json=payload, timeout=15)
-        except Exception:
-            pass
+def notify_admins_photo(file_id: str, caption: str | None = None, dedup_key: Any = None) -> bool:
+    """Forward a photo to admins; repeats of dedup_key within ADMIN_PHOTO_DEDUP_SECS are dropped."""
+    return admin_notifier.send_photo(file_id, caption=caption, dedup_key=dedup_key)
 
 
-def finalize_quiz(chat_id: int) -> None:
-    sess = ensure_session(chat_id)
-    total = len(get_active_questions())
-    score = sess.get("score", 0)
-    # Compute elapsed time if available and format as mins/secs
-    def _fmt_dur(sec: Any) -> str:
-        try:
-            s = int(max(0, int(float(sec))))
-        except Exception:
-            return "0 secs"
-        m, s = divmod(s, 60)
-        parts: List[str] = []
-        if m > 0:
-            parts.append(f"{m} min{'s' if m != 1 else ''}")
-        parts.append(f"{s} sec{'s' if s != 1 else ''}")
-        return " ".join(parts)
-
+def _fmt_dur(sec: Any) -> str:
+    """Format seconds as "N mins M secs"."""
+    try:
+        s = int(max(0, int(float(sec))))
+    except Exception:
+        return "0 secs"
+    m, s = divmod(s, 60)
+    parts: List[str] = []
+    if m > 0:
+        parts.append(f"{m} min{'s' if m != 1 else ''}")
+    parts.append(f"{s} sec{'s' if s != 1 else ''}")
+    return " ".join(parts)
+
+
+def finalize_quiz(chat_id: int, sess: Session | None = None) -> None:
+    if sess is None:
+        sess = ensure_session(chat_id)
+    total = CATALOG.total
+    score = sess.score
     # Penalties
-    penalties_total = int(sess.get("penalty_secs", 0))
-    hint_count = len(sess.get("hint_used_indices", []))
+    penalties_total = sess.penalty_secs
+    hint_count = sess.hint_count
 
     # Compute active elapsed time (paused while waiting on Next)
     duration_line = ""
@@ -484,14 +1077,28 @@ def finalize_quiz(chat_id: int) -> None:
             f"\n⏱️ Total Time: <b>{_fmt_dur(elapsed_total)}</b>"
         )
 
-    team = sess.get("team_name") or "Adventurers"
+    team = sess.team_name or "Adventurers"
+    result = leaderboard.record(chat_id, team, score, total, base_elapsed, penalties_total, hints=hint_count)
+    if results_outbox is not None:
+        try:
+            results_outbox.append({
+                "id": f"{result.chat_id}-{int(result.finished_at * 1000)}",
+                **result.to_dict(),
+                "finished_at_iso": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(result.finished_at)),
+            })
+        except OSError as e:
+            print(f"[results] could not queue result for {chat_id}: {e}", flush=True)
+    placed = leaderboard.rank(chat_id)
+    # A replay that isn't ranked still shows the place its ranked run holds
+    replay_note = " (first run; replays are not ranked)" if placed and placed[1] != result else ""
     finish = (
         f"🏁 <b>{team}</b> — <b>Hunt complete!</b>\n\n"
         f"Score: <b>{score}</b> / <b>{total}</b>"
         f"{duration_line}"
         + (f"\n🧠 Hints used: <b>{hint_count}</b>  |  Penalty: <b>+{_fmt_dur(penalties_total)}</b>" if hint_count > 0 else "")
+        + (f"\n🏆 Leaderboard place: <b>#{placed[0]}</b> of {len(leaderboard)}{replay_note}" if placed else "")
         + "\n\n"
-        "Type <b>START</b> to play again."
+        "Type <b>START</b> to play again or <b>LEADERBOARD</b> to see the rankings."
     )
     send_message(chat_id, finish)
 
@@ -506,19 +1113,92 @@ def finalize_quiz(chat_id: int) -> None:
         notify_admins(admin_finish)
     except Exception:
         pass
-    # Reset state but keep session dict
-    sess["index"] = 0
-    sess["score"] = 0
-    sess["started_at"] = None
-    sess["awaiting_next"] = False
-    sess["awaiting_photo_for"] = None
-    sess["photo_awarded_for"] = set()
-    sess["exp_sent_for"] = set()
-    sess["penalty_secs"] = 0
-    sess["hint_used_indices"] = []
-    # Reset active timer
-    sess["time_accum"] = 0.0
-    sess["time_segment_started"] = None
+    # Reset progress but keep the team (and the session object)
+    sess.reset_progress()
+
+
+def _leaderboard_row(rank: int, r: Result) -> Dict[str, Any]:
+    return {
+        "rank": rank,
+        "team": r.team,
+        "score": r.score,
+        "total": r.total,
+        "active_secs": r.active_secs,
+        "penalty_secs": r.penalty_secs,
+        "total_secs": r.total_secs,
+        "hints": r.hints,
+        "finished_at": int(r.finished_at),
+    }
+
+
+def send_leaderboard(chat_id: int) -> None:
+    """Top LEADERBOARD_SIZE teams plus this chat's own place if it is further down."""
+    top = leaderboard.top(LEADERBOARD_SIZE)
+    if not top:
+        send_message(chat_id, "🏆 No team has finished yet — be the first!")
+        return
+    lines = [f"🏆 <b>Leaderboard</b> ({len(leaderboard)} teams)\n"]
+    for rank, r in top:
+        lines.append(f"{rank}. <b>{r.team}</b> — {r.score}/{r.total} in {_fmt_dur(r.total_secs)}")
+    mine = leaderboard.rank(chat_id)
+    if mine and mine[0] > len(top):
+        rank, r = mine
+        lines.append(f"…\n{rank}. <b>{r.team}</b> (you) — {r.score}/{r.total} in {_fmt_dur(r.total_secs)}")
+    send_message(chat_id, "\n".join(lines))
+
+
+_background_started = False
+_background_lock = threading.Lock()
+
+
+def start_background_tasks() -> None:
+    """One-time startup work, kept off import so forked server workers each run their own."""
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    catalog_watcher.start()
+    session_sweeper.start()
+    if results_outbox is not None:
+        results_outbox.start()
+    preflight_assets_async()
+
+
+@app.before_request
+def _start_background_tasks() -> None:
+    start_background_tasks()
+    get_base_url()  # remember url_root for sends queued off the request thread
+
+
+@app.teardown_request
+def _flush_sessions_after_request(exc: BaseException | None) -> None:
+    flush_sessions()
+
+
+def _is_admin_request() -> bool:
+    # Header only: a token in the query string ends up in access logs, history and Referer
+    token = request.headers.get("X-Admin-Token")
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def _photo_signature(name: str, expires: int) -> str:
+    return hmac.new(ADMIN_TOKEN.encode(), f"{name}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def _signed_photo_url(name: str) -> str:
+    """Short-lived link to one archived photo, usable without the admin header."""
+    expires = int(time.time()) + PHOTO_ARCHIVE_URL_SECS
+    return f"/admin/photos/{name}?expires={expires}&sig={_photo_signature(name, expires)}"
+
+
+def _has_photo_signature(name: str) -> bool:
+    try:
+        expires = int(request.args.get("expires", ""))
+    except ValueError:
+        return False
+    sig = request.args.get("sig") or ""
+    return bool(ADMIN_TOKEN) and expires >= time.time() and hmac.compare_digest(sig, _photo_signature(name, expires))
 
 
 @app.get("/")
@@ -526,285 +1206,472 @@ def health() -> Any:
     return {"ok": True, "service": "telegram-quiz"}
 
 
+@app.get("/metrics")
+def metrics_endpoint() -> Any:
+    """Prometheus scrape target; requires the admin token when ADMIN_TOKEN is set."""
+    if not metrics.enabled:
+        return jsonify({"ok": False, "error": "metrics disabled"}), 404
+    if ADMIN_TOKEN and not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.post("/admin/reload-questions")
+def admin_reload_questions() -> Any:
+    """Validate and swap in questions.json now (the watcher also does this on file change)."""
+    if not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    try:
+        catalog = reload_catalog()
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, "version": catalog.version, "visible_questions": catalog.total})
+
+
+@app.get("/admin/notify-status")
+def admin_notify_status() -> Any:
+    """Per-admin delivery counts and the last failure, for checking admin notifications."""
+    if not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    return jsonify({"ok": True, **admin_notifier.stats()})
+
+
+@app.get("/admin/send-rate")
+def admin_send_rate() -> Any:
+    """Rate limiter counters per lane: sends, how many waited, total/max wait, queued now."""
+    if not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    if send_limiter is None:
+        return jsonify({"ok": True, "enabled": False})
+    return jsonify({"ok": True, "enabled": True, **send_limiter.stats(), "lane_deferrals": outbox.deferrals})
+
+
+@app.get("/admin/photos")
+def admin_photos() -> Any:
+    """Archived photo submissions, oldest first: ?offset=&limit= (max 200), optional
+    ?chat_id= and ?qid= filters. Each item has a signed link to its stored file."""
+    if not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    if photo_archive is None:
+        return jsonify({"ok": True, "enabled": False})
+    try:
+        offset = max(0, int(request.args.get("offset", "0")))
+        limit = min(200, max(1, int(request.args.get("limit", "50"))))
+        chat_id = int(request.args["chat_id"]) if request.args.get("chat_id") else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "offset, limit and chat_id must be integers"}), 400
+    items, total = photo_archive.page(offset, limit, chat_id=chat_id, qid=request.args.get("qid") or None)
+    next_offset = offset + len(items)
+    return jsonify({
+        "ok": True,
+        "enabled": True,
+        "total": total,
+        "items": [{**s.to_dict(), "url": _signed_photo_url(s.name)} for s in items],
+        "next_offset": next_offset if next_offset < total else None,
+        "stats": photo_archive.stats(),
+    })
+
+
+@app.get("/admin/photos/<name>")
+def admin_photo_file(name: str) -> Any:
+    """One archived photo by its content hash (<sha256>.jpg): admin header or a signed link."""
+    if not (_is_admin_request() or _has_photo_signature(name)):
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    sha, _, ext = name.partition(".")
+    if photo_archive is None or ext != "jpg" or len(sha) != 64 or any(c not in "0123456789abcdef" for c in sha):
+        return jsonify({"ok": False, "error": "not found"}), 404
+    path = photo_archive.path_for(sha)
+    if not os.path.exists(path):
+        return jsonify({"ok": False, "error": "not found"}), 404
+    return send_file(path, mimetype="image/jpeg", max_age=86400)
+
+
+@app.get("/admin/sessions")
+def admin_sessions() -> Any:
+    """Session counts, approximate memory footprint and eviction settings/counters."""
+    if not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    return jsonify({
+        "ok": True,
+        **sessions.stats(),
+        "idle_ttl_secs": SESSION_IDLE_TTL_SECS,
+        "max_sessions": MAX_SESSIONS,
+        "evicted": dict(session_sweeper.evicted),
+        "worker_pid": os.getpid(),
+        "shared": {**shared_state.stats(), "lease_waits": chat_locks.contended}
+        if isinstance(chat_locks, ChatLeases) else None,
+    })
+
+
+@app.get("/admin/assets")
+def admin_assets() -> Any:
+    """Preflight image index: files found, total bytes, Telegram-sized variants and missing refs."""
+    if not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    return jsonify({"ok": True, **asset_index.stats()})
+
+
+@app.get("/admin/results-status")
+def admin_results_status() -> Any:
+    """Results export backlog and last delivery error."""
+    if not _is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    if results_outbox is None:
+        return jsonify({"ok": True, "sink": None})
+    return jsonify({"ok": True, **results_outbox.stats()})
+
+
+@app.get("/leaderboard")
+def leaderboard_json() -> Any:
+    """Top-N teams (?limit=, default LEADERBOARD_SIZE) and optionally one chat's place (?chat_id=)."""
+    try:
+        limit = max(0, min(int(request.args.get("limit", LEADERBOARD_SIZE)), 500))
+    except ValueError:
+        return jsonify({"ok": False, "error": "limit must be an integer"}), 400
+    body: Dict[str, Any] = {
+        "ok": True,
+        "teams": len(leaderboard),
+        "top": [_leaderboard_row(rank, r) for rank, r in leaderboard.top(limit)],
+    }
+    if request.args.get("chat_id"):
+        try:
+            mine = leaderboard.rank(int(request.args["chat_id"]))
+        except ValueError:
+            return jsonify({"ok": False, "error": "chat_id must be an integer"}), 400
+        body["rank"] = _leaderboard_row(*mine) if mine else None
+    return jsonify(body)
+
+
 @app.post("/telegram")
 def telegram_webhook() -> Any:
     update = request.get_json(force=True, silent=True) or {}
+    process_update(update)
+    return jsonify({"ok": True})
 
-    # Handle callback_query (button taps)
+
+def update_chat_id(update: Dict[str, Any]) -> int | None:
+    """Chat an update belongs to (message or callback_query), if any."""
     if "callback_query" in update:
-        cq = update["callback_query"]
-        data = cq.get("data")
-        message = cq.get("message", {})
-        chat = message.get("chat", {})
-        chat_id = chat.get("id")
-        if chat_id is not None and data:
-            # Intercept special non-answer actions first
-            if str(data).upper() == "READY":
-                sess = ensure_session(int(chat_id))
-                sess["state"] = None  # entering quiz
-                sess["index"] = 0
-                # Do NOT start timer yet; show intro + Start Timer button
-                try:
-                    send_photo_auto(int(chat_id), "static/images/introduction_of_themes.png")
-                except Exception:
-                    pass
-                themes_msg = (
-                    "<i>“Seek what others overlook. The answers lie where art and memory intertwine.”</i>\n\n"
-                    "You will travel through different <b>Art Zones</b>, each representing the four NYGH themes:\n\n"
-                    "• <b>Belonging</b>\n"
-                    "• <b>Discovering</b>\n"
-                    "• <b>Serving</b>\n"
-                    "• <b>Leading</b>\n\n"
-                    "Each location contains a hidden clue, symbol, or artwork waiting to be discovered."
-                )
-                send_message(int(chat_id), themes_msg)
-                # Show Start Timer button and wait
-                sess["state"] = "awaiting_timer"
-                timer_kb = build_inline_keyboard(["Start Timer"])
-                send_message(int(chat_id), "🕒 <b>When you’re ready, press Start Timer.</b>", reply_markup=timer_kb)
-                # Do not present the question yet
-            elif str(data).upper() in ("START TIMER", "START_TIMER"):
-                sess = ensure_session(int(chat_id))
-                # (Re)start timers
-                sess["started_at"] = time.time()
-                sess["time_accum"] = 0.0
-                sess["time_segment_started"] = None
-                sess["state"] = None
-                present_question(int(chat_id))
-            elif str(data).upper() in ("START TIMER", "START_TIMER"):
-                sess = ensure_session(int(chat_id))
-                # (Re)start timers
-                sess["started_at"] = time.time()
-                sess["time_accum"] = 0.0
-                sess["time_segment_started"] = None
-                sess["state"] = None
-                present_question(int(chat_id))
-            elif str(data) == PHOTO_BUTTON_DATA:
-                sess = ensure_session(int(chat_id))
-                idx = sess.get("index", 0)
-                active = get_active_questions()
-                if idx < len(active) and active[idx].get("expect_photo"):
-                    sess["awaiting_photo_for"] = idx
-                    send_message(
-                        int(chat_id),
-                        "Please attach a photo now using the 📎 icon (camera or gallery). You can re-upload photos before pressing <b>Next</b>. We’ll forward them to the admins."
-                    )
-                else:
-                    send_message(int(chat_id), "This question expects an option. Please pick one below.")
-            elif str(data) == NEXT_BUTTON_DATA:
-                sess = ensure_session(int(chat_id))
-                active = get_active_questions()
-                if not sess.get("awaiting_next"):
-                    # Ignore stray NEXT presses
-                    try:
-                        requests.post(tg_api("answerCallbackQuery"), json={"callback_query_id": cq.get("id")}, timeout=10)
-                    except Exception:
-                        pass
-                    return jsonify({"ok": True})
-                sess["awaiting_next"] = False
-                sess["index"] += 1
-                if sess["index"] < len(active):
-                    send_chat_action(int(chat_id), "typing")
-                    time.sleep(1)
-                    present_question(int(chat_id))
-                else:
-                    finalize_quiz(int(chat_id))
-            elif str(data) == HINT_BUTTON_DATA:
-                _use_hint_and_reprompt(int(chat_id))
-            else:
-                # If awaiting Next, block more answers and nudge
-                sess = ensure_session(int(chat_id))
-                if sess.get("awaiting_next"):
-                    send_message(int(chat_id), "You’ve already answered. Press <b>Next Question</b> to continue.")
-                else:
-                    handle_answer(int(chat_id), str(data))
-        # Always answer callback to remove loading state
+        chat_id = ((update["callback_query"].get("message") or {}).get("chat") or {}).get("id")
+    else:
+        chat_id = ((update.get("message") or {}).get("chat") or {}).get("id")
+    try:
+        return int(chat_id) if chat_id is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Exact callback data of the bot's own buttons -> payload token (labels like READY
+# are matched case-insensitively by dispatch.parse_update)
+CALLBACK_BUTTONS: Dict[str, str] = {
+    NEXT_BUTTON_DATA: "next",
+    HINT_BUTTON_DATA: "hint",
+    PHOTO_BUTTON_DATA: "photo_button",
+}
+
+# Handlers for each (session state, update kind, payload), registered in priority
+# order below; see dispatch.Router. Handlers take (update, session) and run inside
+# the chat's lock.
+router = Router(
+    states=(None, "awaiting_team_name", "awaiting_ready", "awaiting_timer"),
+    payloads={"message": MESSAGE_PAYLOADS, "callback_query": CALLBACK_PAYLOADS},
+)
+
+
+def process_update(update: Dict[str, Any]) -> None:
+    """Dedupe by update_id, then handle the update holding its chat's lock."""
+    update_id = update.get("update_id")
+    if update_id is not None and recent_updates.check_and_add(update_id):
+        # Telegram retry of an update we already handled
+        UPDATES_DUPLICATE.inc()
+        return
+    upd = parse_update(update, CALLBACK_BUTTONS)
+    if upd.chat_id is None:
+        dispatch_update(upd)
+        return
+    with chat_locks.hold(upd.chat_id):
+        if not metrics.enabled:
+            dispatch_update(upd)
+            return
+        t0 = time.perf_counter()
         try:
-            requests.post(tg_api("answerCallbackQuery"), json={"callback_query_id": cq.get("id")}, timeout=10)
-        except Exception:
-            pass
-        return jsonify({"ok": True})
-
-    # Handle regular messages
-    if "message" in update:
-        msg = update["message"]
-        chat = msg.get("chat", {})
-        chat_id = chat.get("id")
-        text = (msg.get("text") or "").strip()
-        if chat_id is None:
-            return jsonify({"ok": True})
-
-        # Handle incoming photo uploads (for photo questions)
-        if msg.get("photo"):
-            sess = ensure_session(int(chat_id))
-            idx = sess.get("index", 0)
-            active = get_active_questions()
-            photos = msg.get("photo") or []
-            # Choose the largest size
-            file_id = photos[-1].get("file_id") if photos else None
-            team = sess.get("team_name") or "Adventurers"
-            if idx < len(active) and active[idx].get("expect_photo") and file_id:
-                # Forward to admins
-                try:
-                    notify_admins_photo(file_id, caption=f"[{team}] — Q{idx+1} photo upload")
-                except Exception:
-                    pass
-                # Award once per question
-                if idx not in sess["photo_awarded_for"]:
-                    sess["photo_awarded_for"].add(idx)
-                    sess["score"] += 1
-                    send_message(int(chat_id), "✅ Nice capture! Point awarded.")
-                else:
-                    send_message(int(chat_id), "📸 Got it — photo received and forwarded.")
-
-                # Send explanations once per question then show Next
-                if idx not in sess["exp_sent_for"]:
-                    sess["exp_sent_for"].add(idx)
-                    q = active[idx]
-                    txt_list = to_list(q.get("explanations") or q.get("explanation"))
-                    for t in txt_list:
-                        send_message(int(chat_id), f"ℹ️ {t}")
-                # Next gating or finalize — always prompt Next on every photo upload (unless last)
-                if idx + 1 >= len(active):
-                    sess["awaiting_next"] = False
-                    finalize_quiz(int(chat_id))
+            dispatch_update(upd)
+        finally:
+            UPDATE_LATENCY.observe(time.perf_counter() - t0, upd.kind, upd.payload)
+
+
+def dispatch_update(upd: Update) -> None:
+    """Route a parsed update to its handler: one session lookup, one table lookup."""
+    chat_id = upd.chat_id
+    if chat_id is not None:
+        sess = sessions.get(chat_id)
+        route = router.resolve(sess.state if sess is not None else None, upd.kind, upd.payload)
+        if route is not None:
+            sessions.note(chat_id, upd.payload)
+            if route.session:
+                if sess is None:
+                    sess = ensure_session(chat_id)
                 else:
-                    sess["awaiting_next"] = True
-                    # Pause timer while waiting for Next (idempotent if already paused)
-                    timer_pause(sess)
-                    send_next_prompt(int(chat_id))
-                return jsonify({"ok": True})
-            else:
-                # Photo sent but not expected; gently nudge
-                send_message(int(chat_id), "Thanks! For this question, please select an answer from the options.")
-                return jsonify({"ok": True})
-
-        # Normalize commands
-        upper = text.upper()
-        if upper in ("/START", "START"):
-            # Reset and begin pre-start flow
-            sessions[int(chat_id)] = {"index": 0, "score": 0, "team_name": None, "state": "awaiting_team_name", "started_at": None}
-            send_message(
-                int(chat_id),
-                (
-                    "<b>Welcome to the NYGH Art Scavenger Hunt!</b>\n\n"
-                    "Get ready to <b>explore</b>, discover hidden gems, and uncover the beauty of art around you.\n\n"
-                    "<b>Before we start, quick tips:</b>\n\n"
-                    "• If you run into any issues, message us on Telegram.\n"
-                    "• Please don’t share any sensitive information here as this chat may be saved for quality and improvement purposes.\n\n"
-                    "<b>What’s your team’s name?</b>\n\n"
-                    "<i>Type it below to begin!</i>"
-                )
-            )
-            return jsonify({"ok": True})
-
-        # Team name capture & READY gate take precedence over other text handling
-        sess = ensure_session(int(chat_id))
-        if sess.get("state") == "awaiting_team_name" and text:
-            team_name = text.strip()
-            sess["team_name"] = team_name
-            sess["state"] = "awaiting_ready"
-            # Show Madam Linden image first (upload local if available)
-            try:
-                send_photo_auto(int(chat_id), "static/images/madam_linden.png")
-            except Exception:
-                # If the image fails to send, continue gracefully
-                pass
-            intro = (
-                f"<b>Greetings \"{team_name}\", young art adventurers!</b>\n\n"
-                "I am Madam Linden, once an artist in these very halls. I’ve collected artworks that captured the heart of NYGH — but only the keenest eyes can uncover the legacies I’ve hidden across time.\n\n"
-                "Today, you’ll follow in my footsteps, solving puzzles and revealing the artistic footprints left behind by generations of students and teachers.\n\n"
-                "<b>But beware! ⏱️ Your journey will be timed</b> — speed and accuracy will determine your place on the leaderboard.\n\n"
-                "<i>Be cautious with your answers — mistakes or requests for help will cost you precious seconds, and even my spirit cannot save you from the penalty of a typo or a wayward auto-correct.</i>\n\n"
-                "Now, gather your courage and creativity…\n\n"
-                "<b>Your hunt begins when you press READY.</b>"
-            )
-            # Send intro and show READY button
-            send_message(int(chat_id), intro)
-            ready_kb = build_inline_keyboard(["READY"])  # single ready button
-            send_message(int(chat_id), "▶️ <b>Press READY to begin.</b>", reply_markup=ready_kb)
-            return jsonify({"ok": True})
-
-        if sess.get("state") == "awaiting_ready":
-            if upper == "READY":
-                sess["state"] = None
-                sess["index"] = 0
-                # Show intro image + themes message and then wait for Start Timer
-                try:
-                    send_photo_auto(int(chat_id), "static/images/introduction_of_themes.png")
-                except Exception:
-                    pass
-                themes_msg = (
-                    "<i>“Seek what others overlook. The answers lie where art and memory intertwine.”</i>\n\n"
-                    "You will travel through different <b>Art Zones</b>, each representing the four NYGH themes:\n\n"
-                    "• <b>Belonging</b>\n"
-                    "• <b>Discovering</b>\n"
-                    "• <b>Serving</b>\n"
-                    "• <b>Leading</b>\n\n"
-                    "Each location contains a hidden clue, symbol, or artwork waiting to be discovered."
-                )
-                send_message(int(chat_id), themes_msg)
-                sess["state"] = "awaiting_timer"
-                timer_kb = build_inline_keyboard(["Start Timer"])
-                send_message(int(chat_id), "🕒 <b>When you’re ready, press Start Timer.</b>", reply_markup=timer_kb)
-                return jsonify({"ok": True})
-            # Nudge to press READY
-            ready_kb = build_inline_keyboard(["READY"])  # re-show button
-            send_message(int(chat_id), "▶️ Please press <b>READY</b> to start the hunt.", reply_markup=ready_kb)
-            return jsonify({"ok": True})
-
-        if upper == "HINT":
-            _use_hint_and_reprompt(int(chat_id))
-            return jsonify({"ok": True})
-
-        # Typed fallback to NEXT when awaiting next
-        if sess.get("awaiting_next") and upper in ("NEXT", "NEXT QUESTION", "NEXT_QUESTION"):
-            active = get_active_questions()
-            sess["awaiting_next"] = False
-            sess["index"] += 1
-            if sess["index"] < len(active):
-                send_chat_action(int(chat_id), "typing")
-                time.sleep(1)
-                present_question(int(chat_id))
-            else:
-                finalize_quiz(int(chat_id))
-            return jsonify({"ok": True})
-
-        # If waiting for Start Timer and user types it, begin
-        if sess.get("state") == "awaiting_timer" and upper in ("START TIMER", "START_TIMER"):
-            sess["started_at"] = time.time()
-            sess["state"] = None
-            present_question(int(chat_id))
-            return jsonify({"ok": True})
-
-        # Fallback: if user types an option exactly, accept it (visible questions only)
-        if text:
-            idx = sess["index"]
-            active = get_active_questions()
-            if idx < len(active):
-                # If already answered and awaiting next, do not accept more answers; nudge
-                if sess.get("awaiting_next"):
-                    send_message(int(chat_id), "You’ve already answered. Press <b>Next Question</b> to continue.")
-                    return jsonify({"ok": True})
-                q = active[idx]
-                # For photo questions, guide user to upload
-                if q.get("expect_photo"):
-                    send_message(int(chat_id), "This question needs a photo. Tap <b>Upload Photo</b> or attach one directly.")
-                    return jsonify({"ok": True})
-                options = q["options"]
-                if text in options:
-                    handle_answer(int(chat_id), text)
-                    return jsonify({"ok": True})
-                else:
-                    # Reprompt with buttons
-                    send_message(int(chat_id), "Please tap one of the options below.")
-                    present_question(int(chat_id))
-                    return jsonify({"ok": True})
-            else:
-                send_message(int(chat_id), "Type START to begin the quiz.")
-                return jsonify({"ok": True})
+                    # Handlers mutate the session in place; flushed at the end of the update
+                    sessions.mark_dirty(chat_id)
+            route.handler(upd, sess)
+    if upd.kind == "callback_query":
+        # Always answer callback to remove loading state
+        answer_callback_query(upd.callback_id)
 
-    return jsonify({"ok": True})
+
+def _advance(chat_id: int, sess: Session) -> None:
+    """Leave the answered question: show the next one after a typing pause, or finish."""
+    sess.awaiting_next = False
+    if advance_question(sess) is not None:
+        present_question_after_typing(chat_id)
+    else:
+        finalize_quiz(chat_id, sess)
+
+
+@router.on("message", "photo")
+def _on_photo(upd: Update, sess: Session) -> None:
+    """Photo upload (for photo questions): forward to admins, award once, then Next."""
+    chat_id = upd.chat_id
+    q = current_question(sess)
+    if q is None or not q.expect_photo or not upd.file_id:
+        # Photo sent but not expected; gently nudge
+        send_message(chat_id, "Thanks! For this question, please select an answer from the options.")
+        return
+    team = sess.team_name or "Adventurers"
+    # Forward to admins (a re-send of the same file within the dedup window is skipped)
+    try:
+        notify_admins_photo(
+            upd.file_id,
+            caption=f"[{team}] — Q{q.position + 1} photo upload",
+            # Only true re-sends (same file) are dropped; a different photo is always forwarded
+            dedup_key=(chat_id, q.key, upd.file_unique_id or upd.file_id),
+        )
+    except Exception:
+        pass
+    if photo_archive is not None:
+        photo_archive.submit(chat_id, team, q.key, q.position + 1, upd.file_id, upd.file_unique_id)
+    # Award once per question
+    if not has_bit(sess.photos_awarded, q.slot):
+        sess.photos_awarded = set_bit(sess.photos_awarded, q.slot)
+        sess.score += 1
+        send_message(chat_id, "✅ Nice capture! Point awarded.")
+    else:
+        send_message(chat_id, "📸 Got it — photo received and forwarded.")
+
+    # Send explanations once per question then show Next
+    if not has_bit(sess.explanations_sent, q.slot):
+        sess.explanations_sent = set_bit(sess.explanations_sent, q.slot)
+        for t in q.explanation_messages:
+            send_message(chat_id, t)
+    # Next gating or finalize — always prompt Next on every photo upload (unless last)
+    if q.position + 1 >= CATALOG.total:
+        sess.awaiting_next = False
+        finalize_quiz(chat_id, sess)
+    else:
+        sess.awaiting_next = True
+        # Pause timer while waiting for Next (idempotent if already paused)
+        timer_pause(sess)
+        send_next_prompt(chat_id)
+
+
+@router.on("message", "start", session=False)
+def _on_start(upd: Update, sess: Session | None) -> None:
+    # Reset and begin pre-start flow
+    sessions[upd.chat_id] = Session(state="awaiting_team_name")
+    send_message(
+        upd.chat_id,
+        (
+            "<b>Welcome to the NYGH Art Scavenger Hunt!</b>\n\n"
+            "Get ready to <b>explore</b>, discover hidden gems, and uncover the beauty of art around you.\n\n"
+            "<b>Before we start, quick tips:</b>\n\n"
+            "• If you run into any issues, message us on Telegram.\n"
+            "• Please don’t share any sensitive information here as this chat may be saved for quality and improvement purposes.\n\n"
+            "<b>What’s your team’s name?</b>\n\n"
+            "<i>Type it below to begin!</i>"
+        )
+    )
+
+
+@router.on("message", "leaderboard", session=False)
+def _on_leaderboard(upd: Update, sess: Session | None) -> None:
+    send_leaderboard(upd.chat_id)
+
+
+# Team name capture & READY gate take precedence over other text handling
+@router.on("message", ("text", "ready", "hint", "next", "start_timer"), states="awaiting_team_name")
+def _on_team_name(upd: Update, sess: Session) -> None:
+    chat_id = upd.chat_id
+    team_name = upd.text
+    sess.team_name = team_name
+    sess.state = "awaiting_ready"
+    # Show Madam Linden image first (upload local if available)
+    # If the image fails to send, the outbox logs it and the intro continues
+    send_photo_auto(chat_id, MADAM_LINDEN_IMAGE)
+    intro = (
+        f"<b>Greetings \"{team_name}\", young art adventurers!</b>\n\n"
+        "I am Madam Linden, once an artist in these very halls. I’ve collected artworks that captured the heart of NYGH — but only the keenest eyes can uncover the legacies I’ve hidden across time.\n\n"
+        "Today, you’ll follow in my footsteps, solving puzzles and revealing the artistic footprints left behind by generations of students and teachers.\n\n"
+        "<b>But beware! ⏱️ Your journey will be timed</b> — speed and accuracy will determine your place on the leaderboard.\n\n"
+        "<i>Be cautious with your answers — mistakes or requests for help will cost you precious seconds, and even my spirit cannot save you from the penalty of a typo or a wayward auto-correct.</i>\n\n"
+        "Now, gather your courage and creativity…\n\n"
+        "<b>Your hunt begins when you press READY.</b>"
+    )
+    # Send intro and show READY button
+    send_message(chat_id, intro)
+    send_message(chat_id, "▶️ <b>Press READY to begin.</b>", reply_markup=READY_KEYBOARD)
+
+
+# READY is a button tap at any point, or typed while waiting for it
+@router.on("callback_query", "ready")
+@router.on("message", "ready", states="awaiting_ready")
+def _on_ready(upd: Update, sess: Session) -> None:
+    chat_id = upd.chat_id
+    sess.state = None  # entering quiz
+    set_question(sess, 0)
+    # Do NOT start timer yet; show intro + Start Timer button
+    send_photo_auto(chat_id, THEMES_INTRO_IMAGE)
+    themes_msg = (
+        "<i>“Seek what others overlook. The answers lie where art and memory intertwine.”</i>\n\n"
+        "You will travel through different <b>Art Zones</b>, each representing the four NYGH themes:\n\n"
+        "• <b>Belonging</b>\n"
+        "• <b>Discovering</b>\n"
+        "• <b>Serving</b>\n"
+        "• <b>Leading</b>\n\n"
+        "Each location contains a hidden clue, symbol, or artwork waiting to be discovered."
+    )
+    send_message(chat_id, themes_msg)
+    # Show Start Timer button and wait; the question is presented on Start Timer
+    sess.state = "awaiting_timer"
+    send_message(chat_id, "🕒 <b>When you’re ready, press Start Timer.</b>", reply_markup=START_TIMER_KEYBOARD)
+
+
+@router.on("message", states="awaiting_ready")
+def _on_ready_nudge(upd: Update, sess: Session) -> None:
+    # Re-show the READY button
+    send_message(upd.chat_id, "▶️ Please press <b>READY</b> to start the hunt.", reply_markup=READY_KEYBOARD)
+
+
+@router.on("callback_query", "hint")
+@router.on("message", "hint")
+def _on_hint(upd: Update, sess: Session) -> None:
+    _use_hint_and_reprompt(upd.chat_id, sess)
+
+
+# Start Timer is a button tap at any point, or typed while waiting for it
+@router.on("callback_query", "start_timer")
+@router.on("message", "start_timer", states="awaiting_timer")
+def _on_start_timer(upd: Update, sess: Session) -> None:
+    # (Re)start timers
+    sess.started_at = time.time()
+    sess.time_accum = 0.0
+    sess.time_segment_started = None
+    sess.state = None
+    present_question(upd.chat_id, sess)
+
+
+@router.on("callback_query", "photo_button")
+def _on_photo_button(upd: Update, sess: Session) -> None:
+    q = current_question(sess)
+    if q is not None and q.expect_photo:
+        sess.awaiting_photo_for = q.key
+        send_message(
+            upd.chat_id,
+            "Please attach a photo now using the 📎 icon (camera or gallery). You can re-upload photos before pressing <b>Next</b>. We’ll forward them to the admins."
+        )
+    else:
+        send_message(upd.chat_id, "This question expects an option. Please pick one below.")
+
+
+@router.on("callback_query", "next")
+def _on_next_button(upd: Update, sess: Session) -> None:
+    # Ignore stray NEXT presses
+    if sess.awaiting_next:
+        _advance(upd.chat_id, sess)
+
+
+@router.on("callback_query", "answer")
+def _on_answer_button(upd: Update, sess: Session) -> None:
+    if sess.advancing:
+        # Stale tap while the next question is on its way
+        return
+    if sess.awaiting_next:
+        # Block more answers and nudge
+        send_message(upd.chat_id, "You’ve already answered. Press <b>Next Question</b> to continue.")
+        return
+    handle_answer(upd.chat_id, upd.text, sess)
+
+
+@router.on("message", "next")
+def _on_next_text(upd: Update, sess: Session) -> None:
+    # Typed fallback to NEXT when awaiting next; otherwise it's just text
+    if sess.awaiting_next:
+        _advance(upd.chat_id, sess)
+    else:
+        _on_text(upd, sess)
+
+
+@router.on("message")
+def _on_text(upd: Update, sess: Session) -> None:
+    """Anything else typed: accept text matching an option of the current question
+    (see answers.py), else re-send the answer buttons."""
+    chat_id = upd.chat_id
+    text = upd.text
+    # Next question is on its way; ignore typed input until it is shown
+    if sess.advancing or not text:
+        return
+    q = current_question(sess)
+    if q is None:
+        send_message(chat_id, "Type START to begin the quiz.")
+        return
+    # If already answered and awaiting next, do not accept more answers; nudge
+    if sess.awaiting_next:
+        send_message(chat_id, "You’ve already answered. Press <b>Next Question</b> to continue.")
+        return
+    # For photo questions, guide user to upload
+    if q.expect_photo:
+        send_message(chat_id, "This question needs a photo. Tap <b>Upload Photo</b> or attach one directly.")
+        return
+    option, how = q.answer_index.match(text)
+    TYPED_ANSWERS.inc(how)
+    if option is not None:
+        handle_answer(chat_id, option, sess)
+        return
+    # Reprompt with just the buttons; the question and its image are already in the chat
+    send_message(chat_id, "Please tap one of the options below.", reply_markup=q.reply_markup)
+
+
+def handle_polled_update(update: Dict[str, Any]) -> None:
+    """Polling-mode equivalent of one /telegram request (process + flush sessions)."""
+    try:
+        process_update(update)
+    finally:
+        flush_sessions()
+
+
+def make_poller() -> UpdatePoller:
+    return UpdatePoller(
+        tg_client,
+        handle_polled_update,
+        chat_of=update_chat_id,
+        offset_path=os.environ.get("POLL_OFFSET_PATH") or os.path.join(DATA_DIR, "poll_offset.json"),
+        batch_size=int(os.environ.get("POLL_BATCH_SIZE", "100")),
+        poll_timeout=int(os.environ.get("POLL_TIMEOUT_SECS", "30")),
+        workers=int(os.environ.get("POLL_WORKERS", "8")),
+    )
+
+
+def start_polling() -> UpdatePoller:
+    """Switch ingress to getUpdates: drop any webhook (Telegram refuses both) and poll in the background."""
+    if not TELEGRAM_BOT_TOKEN:
+        raise RuntimeError("Missing TELEGRAM_BOT_TOKEN env var")
+    resp = tg_call("deleteWebhook", timeout=10)
+    resp.raise_for_status()
+    start_background_tasks()
+    poller = make_poller()
+    poller.start()
+    print(f"[polling] started (offset={poller.offset})", flush=True)
+    return poller
 
 
 @app.post("/set-webhook")
@@ -812,8 +1679,8 @@ def set_webhook() -> Any:
     if not TELEGRAM_BOT_TOKEN:
         return jsonify({"ok": False, "error": "Missing TELEGRAM_BOT_TOKEN"}), 400
     url = f"{get_base_url()}/telegram"
-    resp = requests.post(
-        tg_api("setWebhook"),
+    resp = tg_call(
+        "setWebhook",
         json={
             "url": url,
             "allowed_updates": ["message", "callback_query"],
@@ -831,7 +1698,7 @@ def set_webhook() -> Any:
 def delete_webhook() -> Any:
     if not TELEGRAM_BOT_TOKEN:
         return jsonify({"ok": False, "error": "Missing TELEGRAM_BOT_TOKEN"}), 400
-    resp = requests.post(tg_api("deleteWebhook"), timeout=10)
+    resp = tg_call("deleteWebhook", timeout=10)
     try:
         data = resp.json()
     except Exception:
@@ -840,5 +1707,5 @@ def delete_webhook() -> Any:
 
 
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 3000))
-    app.run(host="0.0.0.0", port=port)
+    # Prefer `python server.py`: it doesn't build this copy of the app in the gunicorn master
+    sys.exit(server.main(quiz=sys.modules[__name__]))
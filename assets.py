@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List
+
+
+@dataclass(frozen=True, slots=True)
+class Asset:
+    ref: str  # as referenced in questions.json (no leading slash)
+    rel_path: str  # what is sent: the Telegram-sized variant if current, else the original
+    path: str | None  # absolute path of rel_path; None if the file is missing
+    size: int = 0
+    sha256: str = ""
+    mtime_ns: int = 0
+
+    @property
+    def cache_key(self) -> str:
+        """FileIdCache key: path plus content hash, so an edited image gets a new file_id."""
+        return f"{self.rel_path}#{self.sha256}"
+
+
+# Preflight index of every local image the bot may send: existence, size and
+# content hash, computed once (off the request path) instead of stat/exists/hash
+# calls on every send. Hashes are persisted with each file's (mtime_ns, size)
+# signature, so a restart only re-hashes files that changed. Refs missing from
+# the index (e.g. added by a hot reload before the next preflight) are indexed
+# on first use. The send path trusts the index; rebuild() after content edits,
+# and invalidate() a ref whose file turns out to be gone at send time.
+class AssetIndex:
+    def __init__(self, root: str, cache_path: str | None = None, resolve: Callable[[str], str] | None = None) -> None:
+        self.root = root
+        self.cache_path = cache_path
+        self.resolve = resolve  # ref -> rel path to send (image_variants.resolve)
+        self._lock = threading.Lock()
+        self._assets: Dict[str, Asset] = {}
+        # rel_path -> [mtime_ns, size, sha256] from the last preflight (and earlier runs)
+        self._hashes: Dict[str, List[Any]] = self._load_hashes()
+
+    def _load_hashes(self) -> Dict[str, List[Any]]:
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[assets] ignoring unreadable hash cache {self.cache_path}: {e}", flush=True)
+            return {}
+
+    def _save_hashes(self) -> None:
+        if not self.cache_path:
+            return
+        folder = os.path.dirname(self.cache_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = f"{self.cache_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._hashes, f, indent=0, sort_keys=True)
+        os.replace(tmp, self.cache_path)
+
+    def _index(self, ref: str) -> Asset:
+        rel = self.resolve(ref) if self.resolve else ref
+        path = os.path.join(self.root, rel)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return Asset(ref=ref, rel_path=rel, path=None)
+        if not os.path.isfile(path):
+            return Asset(ref=ref, rel_path=rel, path=None)
+        with self._lock:
+            known = self._hashes.get(rel)
+        if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            digest = known[2]
+        else:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            with self._lock:
+                self._hashes[rel] = [st.st_mtime_ns, st.st_size, digest]
+        return Asset(ref=ref, rel_path=rel, path=path, size=st.st_size, sha256=digest, mtime_ns=st.st_mtime_ns)
+
+    def rebuild(self, refs: Iterable[str]) -> Dict[str, int]:
+        """Index refs (replacing the previous index). Returns counts and total bytes."""
+        refs = sorted({r.strip().lstrip("/") for r in refs if r and r.strip()})
+        with self._lock:
+            before = dict(self._hashes)
+        assets = {ref: self._index(ref) for ref in refs}
+        with self._lock:
+            self._assets = assets
+            # Forget files no longer referenced (e.g. superseded variants)
+            live = {a.rel_path for a in assets.values() if a.path}
+            self._hashes = {rel: sig for rel, sig in self._hashes.items() if rel in live}
+            changed = self._hashes != before
+        if changed:
+            try:
+                with self._lock:
+                    self._save_hashes()
+            except OSError as e:
+                print(f"[assets] could not save hash cache: {e}", flush=True)
+        found = [a for a in assets.values() if a.path]
+        return {
+            "indexed": len(found),
+            "missing": len(assets) - len(found),
+            "bytes": sum(a.size for a in found),
+            "hashed": sum(1 for a in found if before.get(a.rel_path, [None, None, None])[2] != a.sha256),
+        }
+
+    def get(self, ref: str) -> Asset:
+        ref = ref.lstrip("/")
+        asset = self._assets.get(ref)
+        if asset is None:
+            asset = self._index(ref)
+            with self._lock:
+                self._assets[ref] = asset
+        return asset
+
+    def invalidate(self, ref: str) -> None:
+        with self._lock:
+            self._assets.pop(ref.lstrip("/"), None)
+
+    def missing(self) -> List[str]:
+        return sorted(ref for ref, a in self._assets.items() if a.path is None)
+
+    def stats(self) -> Dict[str, Any]:
+        assets = list(self._assets.values())
+        found = [a for a in assets if a.path]
+        return {
+            "indexed": len(found),
+            "missing": self.missing(),
+            "bytes": sum(a.size for a in found),
+            "variants": sum(1 for a in found if a.rel_path != a.ref),
+        }
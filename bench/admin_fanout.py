@@ -0,0 +1,121 @@
+"""Admin fan-out: parallel delivery, photo dedup and per-admin failure stats.
+
+    python bench/admin_fanout.py --latency-ms 500 --photos 2
+
+Fan-out: --photos team photos are forwarded to three admins through
+AdminNotifier against a fake Bot API that takes --latency-ms per call, with
+ADMIN_NOTIFY_WORKERS=1 (one send at a time, like the old inline loop) and 4.
+Reported: time for send_photo() to return (what the webhook waits) and until
+every admin has every photo.
+
+App: with one admin chat blocking the bot, a team at a photo question sends
+photo A, re-sends A, then sends a different photo B through process_update().
+A and B must reach each working admin once; the blocked admin's failures must
+show up in GET /admin/notify-status.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from admin_notify import AdminNotifier  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from tg_client import BotAPIClient  # noqa: E402
+
+ADMINS = (900001, 900002, 900003)
+
+
+def fanout(args: argparse.Namespace, workers: int) -> str:
+    fake = FakeBotAPI(latency=args.latency_ms / 1000).start()
+    client = BotAPIClient(fake.base_url, "admin")
+    notifier = AdminNotifier(client.call, ADMINS, workers=workers)
+    t0 = time.perf_counter()
+    for n in range(args.photos):
+        notifier.send_photo(f"photo-{n}", caption=f"Team {n}", dedup_key=("team", n))
+    queued = time.perf_counter() - t0
+    notifier.drain(120)
+    done = time.perf_counter() - t0
+    delivered = len(fake.sent("sendPhoto"))
+    fake.stop()
+    return (f"  ADMIN_NOTIFY_WORKERS={workers}: send_photo() returned in {queued * 1000:.1f} ms, "
+            f"{delivered} photos delivered in {done:.2f}s")
+
+
+def app_run(args: argparse.Namespace) -> str:
+    blocked = ADMINS[-1]
+    fake = FakeBotAPI(blocked_chats=[blocked]).start()
+    tmp = tempfile.mkdtemp(prefix="quiz-admin-")
+    os.environ.update(
+        TELEGRAM_BOT_TOKEN="admin",
+        TELEGRAM_API_BASE=fake.base_url,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        DATA_DIR=tmp,
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        TG_RATE_LIMIT="0",
+        IMAGE_VARIANTS="0",
+        ADMIN_CHAT_IDS=",".join(map(str, ADMINS)),
+        ADMIN_TOKEN="bench",
+    )
+    os.environ.pop("OWNER_CHAT_ID", None)
+    import app
+
+    photo_q = next(q for q in app.CATALOG.questions if q.expect_photo)
+    ids = iter(range(1, 10**9))
+    chat = 8_000_001
+
+    def send(update: Dict[str, Any]) -> None:
+        update["update_id"] = next(ids)
+        app.process_update(update)
+        app.scheduler.drain(30)
+        app.outbox.drain(30)
+        app.admin_notifier.drain(30)
+
+    def photo(file_id: str, unique_id: str) -> None:
+        sizes = [{"file_id": f"{file_id}-s", "file_unique_id": f"{unique_id}-s"},
+                 {"file_id": file_id, "file_unique_id": unique_id}]
+        send({"message": {"chat": {"id": chat}, "message_id": 1, "photo": sizes}})
+
+    send({"message": {"chat": {"id": chat}, "message_id": 1, "text": "START"}})
+    send({"message": {"chat": {"id": chat}, "message_id": 1, "text": "Team Fanout"}})
+    send({"callback_query": {"id": "cb", "data": "READY", "message": {"chat": {"id": chat}}}})
+    send({"callback_query": {"id": "cb", "data": "Start Timer", "message": {"chat": {"id": chat}}}})
+    sess = app.sessions.get(chat)
+    sess.index, sess.question_id = photo_q.position, photo_q.qid  # jump straight to the photo question
+    fake.reset()
+    photo("photo-a", "uniq-a")
+    photo("photo-a", "uniq-a")  # the same photo again
+    photo("photo-b", "uniq-b")
+    forwarded = Counter((p["chat_id"], p["photo"]) for p in fake.sent("sendPhoto") if p["chat_id"] in ADMINS)
+    status = app.app.test_client().get("/admin/notify-status", headers={"X-Admin-Token": "bench"}).get_json()
+    per_admin = ", ".join(
+        f"{cid} sent {st['sent']} failed {st['failed']}" for cid, st in sorted(status["admins"].items())
+    )
+    ok = all(forwarded[(a, f)] == 1 for a in ADMINS[:-1] for f in ("photo-a", "photo-b"))
+    last_error = status["admins"][str(blocked)]["last_error"]
+    return (f"app: A, A again, B -> each working admin got A and B once: {ok} "
+            f"({sum(forwarded.values())} photos forwarded)\n  notify-status: {per_admin}\n"
+            f"  blocked admin last_error: {last_error}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--latency-ms", type=float, default=500.0)
+    ap.add_argument("--photos", type=int, default=2)
+    args = ap.parse_args()
+    print(f"{args.photos} photos x {len(ADMINS)} admins, fake Bot API {args.latency_ms:.0f} ms per call")
+    for workers in (1, 4):
+        print(fanout(args, workers))
+    print(app_run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
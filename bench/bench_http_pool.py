@@ -0,0 +1,65 @@
+"""Micro-benchmark: per-call Bot API latency with module-level requests.post vs the pooled client.
+
+    python bench/bench_http_pool.py --calls 500 --threads 4
+
+Runs against the local fake Bot API (plain HTTP), so the gap shown here is only the
+TCP connect + requests setup cost; against api.telegram.org every unpooled call also
+pays a TLS handshake, which widens it considerably.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from tg_client import BotAPIClient  # noqa: E402
+
+
+def run(label: str, fn, calls: int, threads: int) -> None:
+    lat: list[float] = []
+
+    def one(i: int) -> None:
+        t0 = time.perf_counter()
+        resp = fn(i)
+        resp.raise_for_status()
+        lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    p50 = statistics.median(lat) * 1000
+    p99 = lat[int(len(lat) * 0.99) - 1] * 1000
+    print(f"{label:<22} calls={calls} wall={wall:.2f}s  {calls / wall:7.0f} calls/s  p50={p50:.2f}ms  p99={p99:.2f}ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=4)
+    args = ap.parse_args()
+
+    fake = FakeBotAPI().start()
+    token = "bench"
+    url = f"{fake.base_url}/bot{token}/sendMessage"
+    client = BotAPIClient(fake.base_url, token, pool_size=args.threads)
+    payload = {"chat_id": 1, "text": "hello", "parse_mode": "HTML"}
+
+    # Warm up both paths once
+    requests.post(url, json=payload, timeout=10)
+    client.call("sendMessage", json=payload)
+
+    run("requests.post (before)", lambda i: requests.post(url, json=payload, timeout=10), args.calls, args.threads)
+    run("BotAPIClient (after)", lambda i: client.call("sendMessage", json=payload), args.calls, args.threads)
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
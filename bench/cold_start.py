@@ -0,0 +1,129 @@
+"""Cold start: how long a fresh process takes to import the app, listen, and answer its first update.
+
+    python bench/cold_start.py --runs 5
+
+Render spins idle free instances down; the first webhook after that waits for the
+whole startup. Each run starts `python server.py` (or --entry app.py; WEB_SERVER as
+given, default the production gunicorn path) against bench/fake_bot_api.py and records:
+  import   — `import app` in a fresh interpreter
+  listen   — process start until the port accepts connections
+  webhook  — process start until the first /telegram (START) returns
+  reply    — process start until that update's first Bot API call arrives
+
+By default the repo's __pycache__ directories are removed before each run, like a
+deploy whose build step didn't precompile the app (installed packages keep their
+.pyc either way); --warm-pyc keeps them.
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def drop_pycache() -> None:
+    for top in (ROOT, HERE):
+        shutil.rmtree(os.path.join(top, "__pycache__"), ignore_errors=True)
+
+
+def base_env(fake: FakeBotAPI, args: argparse.Namespace) -> Dict[str, str]:
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="cold",
+        TELEGRAM_API_BASE=fake.base_url,
+        DATA_DIR=tempfile.mkdtemp(prefix="quiz-cold-"),
+        WEB_SERVER=args.server,
+        WEB_WORKERS="1",
+    )
+    if not args.warm_pyc:
+        drop_pycache()
+    env.pop("OWNER_CHAT_ID", None)
+    env.pop("ADMIN_CHAT_IDS", None)
+    return env
+
+
+def time_import(env: Dict[str, str]) -> float:
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_server(env: Dict[str, str], fake: FakeBotAPI, entry: str) -> Dict[str, float]:
+    port = free_port()
+    env = dict(env, PORT=str(port))
+    calls_before = len(fake.calls)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, entry)], env=env, cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.05).close()
+                break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - t0 > 30:
+                    raise SystemExit("server did not start")
+                time.sleep(0.002)
+        listen = time.perf_counter() - t0
+        update = {"update_id": 1, "message": {"chat": {"id": 4242}, "message_id": 1, "text": "START"}}
+        requests.post(f"http://127.0.0.1:{port}/telegram", json=update, timeout=30).raise_for_status()
+        webhook = time.perf_counter() - t0
+        while len(fake.calls) == calls_before and time.perf_counter() - t0 < 30:
+            time.sleep(0.001)
+        reply = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {"listen": listen, "webhook": webhook, "reply": reply}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--server", default="gunicorn", choices=("gunicorn", "dev"))
+    ap.add_argument("--entry", default="server.py", choices=("server.py", "app.py"))
+    ap.add_argument("--warm-pyc", action="store_true", help="reuse __pycache__ instead of compiling each run")
+    args = ap.parse_args()
+
+    fake = FakeBotAPI().start()
+    samples: Dict[str, List[float]] = {"import": [], "listen": [], "webhook": [], "reply": []}
+    for _ in range(args.runs):
+        env = base_env(fake, args)
+        samples["import"].append(time_import(env))
+        env = base_env(fake, args)
+        for k, v in time_server(env, fake, args.entry).items():
+            samples[k].append(v)
+    fake.stop()
+
+    print(f"{args.runs} runs, {args.entry}, server={args.server}, {'warm' if args.warm_pyc else 'cold'} bytecode cache")
+    for k, vals in samples.items():
+        print(f"  {k:<8} median {statistics.median(vals) * 1000:7.1f} ms   min {min(vals) * 1000:7.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
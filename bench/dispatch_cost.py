@@ -0,0 +1,116 @@
+"""Per-update dispatch cost across the full hunt flow, with Bot API I/O switched off.
+
+    python bench/dispatch_cost.py --hunts 300
+
+Plays complete hunts in-process (START, team name, READY, Start Timer, every
+question answered by button or photo, some hints and wrong typed answers, Next)
+and times app.process_update() per update. Sends are dropped and the delayed
+"present next question" runs inline, so what is measured is parsing, dedup,
+the chat lock, routing, the session lookup and the handler itself. With
+--route-only it times just parse_update() + Router.resolve() for the same updates.
+Output is the mean cost per update by step, in microseconds.
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+os.environ.update(
+    TELEGRAM_BOT_TOKEN="bench",
+    TELEGRAM_API_BASE="http://127.0.0.1:9",
+    DATA_DIR=tempfile.mkdtemp(prefix="quiz-dispatch-"),
+    METRICS=os.environ.get("METRICS", "0"),
+    IMAGE_VARIANTS="0",
+    QUESTIONS_WATCH_SECS="0",
+    SEND_WORKERS="0",
+)
+os.environ.pop("OWNER_CHAT_ID", None)
+os.environ.pop("ADMIN_CHAT_IDS", None)
+
+import app  # noqa: E402
+from catalog import HINT_BUTTON_DATA  # noqa: E402
+
+Step = Tuple[str, Dict[str, Any]]
+
+
+def hunt(chat: int) -> List[Step]:
+    """(step label, update) for one full hunt; update_ids are filled in later."""
+
+    def text(t: str) -> Dict[str, Any]:
+        return {"message": {"chat": {"id": chat}, "message_id": 1, "text": t}}
+
+    def tap(data: str) -> Dict[str, Any]:
+        return {"callback_query": {"id": "cb", "data": data, "message": {"chat": {"id": chat}}}}
+
+    steps: List[Step] = [("start", text("START")), ("team name", text(f"Team {chat}")),
+                         ("ready", tap("READY")), ("start timer", tap("Start Timer"))]
+    catalog = app.CATALOG
+    for pos in range(catalog.total):
+        q = catalog.get(pos)
+        if q.has_hint and pos % 3 == 0:
+            steps.append(("hint", tap(HINT_BUTTON_DATA)))
+        if q.expect_photo:
+            steps.append(("photo", {"message": {"chat": {"id": chat}, "message_id": 1,
+                                                "photo": [{"file_id": f"ph{chat}"}]}}))
+        else:
+            if pos % 4 == 1:
+                steps.append(("typed other", text("not an option")))
+            steps.append(("answer tap", tap(q.options[pos % len(q.options)])))
+        if pos + 1 < catalog.total:
+            steps.append(("next", tap(app.NEXT_BUTTON_DATA)))
+    return steps
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--hunts", type=int, default=300)
+    ap.add_argument("--route-only", action="store_true", help="time parse_update + Router.resolve only")
+    args = ap.parse_args()
+
+    # Measure the bot's own work: drop Bot API calls and run delayed steps inline
+    app.outbox.submit = lambda key, fn, *a, **kw: None
+    app.scheduler.call_later = lambda delay, fn, *a, **kw: fn(*a, **kw)
+
+    samples: Dict[str, List[float]] = {}
+    update_id = 0
+    perf = time.perf_counter
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w"))  # handlers log progress lines
+    quiet.__enter__()
+    for n in range(args.hunts):
+        for label, update in hunt(1_000_000 + n):
+            update_id += 1
+            update["update_id"] = update_id
+            if args.route_only:
+                t0 = perf()
+                upd = app.parse_update(update, app.CALLBACK_BUTTONS)
+                sess = app.sessions.peek(upd.chat_id)
+                app.router.resolve(sess.state if sess is not None else None, upd.kind, upd.payload)
+                dt = perf() - t0
+                app.process_update(update)  # advance the hunt for the next step
+            else:
+                t0 = perf()
+                app.process_update(update)
+                dt = perf() - t0
+            samples.setdefault(label, []).append(dt)
+        app.flush_sessions()
+    quiet.__exit__(None, None, None)
+
+    total = [v for vals in samples.values() for v in vals]
+    what = "parse + route" if args.route_only else "process_update"
+    print(f"{args.hunts} hunts, {len(total)} updates, {what}, mean µs per update")
+    for label, vals in samples.items():
+        print(f"  {label:<12} {statistics.mean(vals) * 1e6:8.2f}   (n={len(vals)})")
+    print(f"  {'all':<12} {statistics.mean(total) * 1e6:8.2f}   p99 {sorted(total)[int(len(total) * 0.99)] * 1e6:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
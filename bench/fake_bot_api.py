@@ -0,0 +1,342 @@
+"""Local fake Telegram Bot API for tests and benchmarks.
+
+Run standalone:  python bench/fake_bot_api.py --port 8081
+Then start the bot with TELEGRAM_API_BASE=http://127.0.0.1:8081 TELEGRAM_BOT_TOKEN=test.
+
+Every call is recorded as (method, params) so tests can assert on what the bot sent.
+Updates queued with push_update() are served by getUpdates (offset/limit/long-poll timeout)
+for exercising polling mode. As on Telegram, getUpdates answers 409 Conflict while a
+webhook is set (setWebhook / deleteWebhook update `webhook_url`).
+
+Load testing: `latency` (+ uniform `jitter`) delays every send, and `rate_429` answers
+that fraction of sends with 429 Too Many Requests (parameters.retry_after = `retry_after`).
+Throttled calls are counted in `throttled` and not recorded in `calls`.
+`limit_global` / `limit_chat` enforce Telegram-like flood limits instead: a send
+beyond that many per rolling second (overall / to one chat) gets a 429 with
+retry_after 1. `call_times` holds the time.monotonic() of each recorded call.
+Sends to a chat in `blocked_chats` get 403 "bot was blocked by the user" (not recorded).
+
+Files: getFile resolves any file_id to a file_path, and GET /file/bot<token>/<path>
+streams its bytes in FILE_CHUNK pieces (`file_latency` per chunk). Contents are
+generated from the file_id, or registered with add_file(file_id, size, content)
+where file_ids sharing `content` get identical bytes (a re-upload).
+`downloads` / `download_bytes` count what was served.
+"""
+import hashlib
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import parse_qs
+
+FILE_CHUNK = 16 * 1024
+DEFAULT_FILE_SIZE = 150 * 1024
+
+
+def _parse_multipart(body: bytes, content_type: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """Tiny multipart/form-data parser: returns (fields, {file_field: byte_size})."""
+    boundary = content_type.split("boundary=", 1)[1].strip().strip('"').encode()
+    fields: Dict[str, Any] = {}
+    files: Dict[str, int] = {}
+    for part in body.split(b"--" + boundary):
+        part = part.strip(b"\r\n")
+        if not part or part == b"--":
+            continue
+        head, _, value = part.partition(b"\r\n\r\n")
+        headers = head.decode("utf-8", "replace")
+        name = headers.split('name="', 1)[1].split('"', 1)[0] if 'name="' in headers else ""
+        if "filename=" in headers:
+            files[name] = len(value)
+        else:
+            fields[name] = value.decode("utf-8", "replace")
+    return fields, files
+
+
+def _file_chunks(size: int, content: str) -> Iterator[bytes]:
+    """Deterministic bytes for a fake file, FILE_CHUNK at a time."""
+    block = hashlib.sha256(content.encode()).digest() * (FILE_CHUNK // 32)
+    sent = 0
+    n = 0
+    while sent < size:
+        # Chunk index first, so a file is not one block repeated
+        chunk = (n.to_bytes(4, "big") + block)[: min(FILE_CHUNK, size - sent)]
+        yield chunk
+        sent += len(chunk)
+        n += 1
+
+
+class FakeBotAPI:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: float = 1,
+        seed: int | None = None,
+        limit_global: int = 0,
+        limit_chat: int = 0,
+        file_latency: float = 0.0,
+        blocked_chats: Iterable[Any] = (),
+    ) -> None:
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.call_times: List[float] = []
+        self.upload_bytes = 0
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.throttled = 0
+        self.limit_global = limit_global
+        self.limit_chat = limit_chat
+        self.file_latency = file_latency
+        self.blocked_chats = {str(c) for c in blocked_chats}
+        self.downloads = 0
+        self.download_bytes = 0
+        self.webhook_url: str | None = None
+        self._files: Dict[str, Tuple[int, str]] = {}  # file_id -> (size, content key)
+        self._sent_all: Deque[float] = deque()
+        self._sent_chat: Dict[str, Deque[float]] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._updates: List[Dict[str, Any]] = []
+        self._update_ids = itertools.count(1)
+        self._updates_cond = threading.Condition(self._lock)
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; avoid Nagle + delayed-ACK stalls on keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.startswith("/file/"):
+                    self._file()
+                else:
+                    self._handle()
+
+            def _file(self) -> None:
+                file_id = self.path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+                size, content = api.file_info(file_id)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                for chunk in _file_chunks(size, content):
+                    if api.file_latency:
+                        time.sleep(api.file_latency)
+                    self.wfile.write(chunk)
+                with api._lock:
+                    api.downloads += 1
+                    api.download_bytes += size
+
+            def do_POST(self) -> None:
+                self._handle()
+
+            def _handle(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                ctype = self.headers.get("Content-Type") or ""
+                method = self.path.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0]
+                params: Dict[str, Any] = {}
+                files: Dict[str, int] = {}
+                if "?" in self.path:
+                    params.update({k: v[-1] for k, v in parse_qs(self.path.split("?", 1)[1]).items()})
+                if ctype.startswith("application/json") and body:
+                    params.update(json.loads(body))
+                elif ctype.startswith("multipart/form-data"):
+                    fields, files = _parse_multipart(body, ctype)
+                    params.update(fields)
+                elif body:
+                    params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+                status, payload = api.respond(method, params, files)
+                out = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                try:
+                    self.wfile.write(out)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client went away (e.g. a stopped poller's long poll)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBotAPI":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """Queue an incoming update for getUpdates; assigns update_id if missing."""
+        with self._lock:
+            update = dict(update)
+            update.setdefault("update_id", next(self._update_ids))
+            self._updates.append(update)
+            self._updates_cond.notify_all()
+            return int(update["update_id"])
+
+    def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        with self._lock:
+            # Like Telegram, requesting an offset confirms (drops) everything before it
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates and timeout > 0:
+                self._updates_cond.wait(timeout)
+            return self._updates[:limit]
+
+    def add_file(self, file_id: str, size: int, content: str | None = None) -> None:
+        """Register a file for getFile/downloads; equal `content` keys give equal bytes."""
+        with self._lock:
+            self._files[file_id] = (size, content or file_id)
+
+    def file_info(self, file_id: str) -> Tuple[int, str]:
+        with self._lock:
+            return self._files.get(file_id) or (DEFAULT_FILE_SIZE, file_id)
+
+    def respond(self, method: str, params: Dict[str, Any], files: Dict[str, int]) -> Tuple[int, Dict[str, Any]]:
+        if method == "getUpdates":
+            if self.webhook_url:
+                return 409, {
+                    "ok": False,
+                    "error_code": 409,
+                    "description": "Conflict: can't use getUpdates method while webhook is active; "
+                    "use deleteWebhook to delete the webhook first",
+                }
+            return 200, {"ok": True, "result": self._get_updates(params)}
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._rng.uniform(0, self.jitter))
+        if self.rate_429 and self._rng.random() < self.rate_429:
+            with self._lock:
+                self.throttled += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        if self.blocked_chats and str(params.get("chat_id")) in self.blocked_chats:
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        if (self.limit_global or self.limit_chat) and self._over_limit(method, params):
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            }
+        with self._lock:
+            self.calls.append((method, params))
+            self.call_times.append(time.monotonic())
+            self.upload_bytes += sum(files.values())
+            msg_id = next(self._ids)
+            if method == "setWebhook":
+                self.webhook_url = str(params.get("url") or "") or None
+            elif method == "deleteWebhook":
+                self.webhook_url = None
+        result: Any = True
+        if method == "getFile":
+            file_id = str(params.get("file_id") or "")
+            size, content = self.file_info(file_id)
+            result = {
+                "file_id": file_id,
+                "file_unique_id": hashlib.sha1(file_id.encode()).hexdigest()[:16],
+                "file_size": size,
+                "file_path": f"photos/{file_id}.jpg",
+            }
+        elif method in ("sendMessage", "sendPhoto"):
+            result = {"message_id": msg_id, "chat": {"id": params.get("chat_id")}}
+            if method == "sendPhoto":
+                photo = params.get("photo")
+                file_id = photo if isinstance(photo, str) and photo else f"fake-file-{msg_id}"
+                result["photo"] = [{"file_id": f"{file_id}-s"}, {"file_id": file_id}]
+        elif method == "sendMediaGroup":
+            media = params.get("media")
+            if isinstance(media, str):
+                media = json.loads(media)
+            result = []
+            for i, item in enumerate(media or []):
+                ref = str(item.get("media") or "")
+                file_id = f"fake-file-{msg_id}-{i}" if ref.startswith("attach://") else ref
+                result.append({
+                    "message_id": msg_id * 100 + i,
+                    "chat": {"id": params.get("chat_id")},
+                    "photo": [{"file_id": f"{file_id}-s"}, {"file_id": file_id}],
+                })
+        return 200, {"ok": True, "result": result}
+
+    def _over_limit(self, method: str, params: Dict[str, Any]) -> bool:
+        if not method.startswith(("send", "edit", "forward", "copy")) or method == "sendChatAction":
+            return False
+        now = time.monotonic()
+        with self._lock:
+            chat = self._sent_chat.setdefault(str(params.get("chat_id")), deque())
+            for window in (self._sent_all, chat):
+                while window and window[0] <= now - 1.0:
+                    window.popleft()
+            if (self.limit_global and len(self._sent_all) >= self.limit_global) or (
+                self.limit_chat and len(chat) >= self.limit_chat
+            ):
+                self.throttled += 1
+                return True
+            self._sent_all.append(now)
+            chat.append(now)
+            return False
+
+    def sent(self, method: str | None = None, chat_id: Any = None) -> List[Dict[str, Any]]:
+        """Recorded params, optionally filtered by method and chat_id."""
+        with self._lock:
+            calls = list(self.calls)
+        return [
+            p for m, p in calls
+            if (method is None or m == method) and (chat_id is None or str(p.get("chat_id")) == str(chat_id))
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.call_times.clear()
+            self.upload_bytes = 0
+            self.throttled = 0
+            self.downloads = 0
+            self.download_bytes = 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="added delay per send")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random delay per send")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="fraction of sends answered with 429")
+    args = ap.parse_args()
+    fake = FakeBotAPI(
+        args.host, args.port, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, rate_429=args.rate_429
+    )
+    print(f"Fake Bot API listening on {fake.base_url}", flush=True)
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,134 @@
+"""Session journal: crash equivalence, write overhead and recovery time.
+
+    python bench/journal_recovery.py --hunts 300
+    python bench/journal_recovery.py --hunts 300 --store memory   # baseline cost
+    python bench/journal_recovery.py --recovery 2000 --tails 0,1000,10000,100000
+
+Hunts mode plays complete hunts in-process like dispatch_cost.py (Bot API calls
+dropped, delayed steps inline) with the given SESSION_STORE and reports the mean
+process_update() cost. With the journal it also reports records and bytes per
+hunt, then rebuilds every session from the files on disk (as a restart after a
+crash would) and checks each one equals the live session, and replays one chat
+through the CLI. Recovery mode writes a snapshot of N sessions plus each tail
+length of records and times SessionJournal.load().
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+
+def run_hunts(args: argparse.Namespace) -> int:
+    os.environ.update(
+        METRICS="0",
+        SESSION_STORE=args.store,
+        SESSION_JOURNAL_SNAPSHOT_RECORDS=str(args.snapshot_every),
+    )
+    from dispatch_cost import hunt  # imports app with the env above
+
+    import app
+    import session_journal
+
+    app.outbox.submit = lambda key, fn, *a, **kw: None
+    app.scheduler.call_later = lambda delay, fn, *a, **kw: fn(*a, **kw)
+
+    samples: List[float] = []
+    update_id = 0
+    perf = time.perf_counter
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for n in range(args.hunts):
+            for _, update in hunt(1_000_000 + n):
+                update_id += 1
+                update["update_id"] = update_id
+                t0 = perf()
+                app.process_update(update)
+                samples.append(perf() - t0)
+            app.flush_sessions()
+    mean = statistics.mean(samples) * 1e6
+    p99 = sorted(samples)[int(len(samples) * 0.99)] * 1e6
+    print(f"{args.store}: {args.hunts} hunts, {len(samples)} updates, process_update mean {mean:.2f} µs, p99 {p99:.2f} µs")
+    if args.store != "journal":
+        return 0
+
+    journal = app.sessions.journal
+    with journal._snapshot_lock:  # let a background snapshot finish
+        pass
+    files = [journal.path, journal.snapshot_path, *journal.archives()]
+    total_bytes = sum(os.path.getsize(p) for p in files if os.path.exists(p))
+    print(f"  journal: {journal.seq} records ({journal.seq / args.hunts:.1f} per hunt), "
+          f"{total_bytes / 1024:.0f} KiB on disk incl. snapshot, {journal.snapshots} snapshots")
+
+    # Crash equivalence: a fresh process would see exactly the live sessions
+    t0 = perf()
+    rebuilt = session_journal.SessionJournal(journal.path, app.question_slots.slot).load()
+    load_ms = (perf() - t0) * 1000
+    live = dict(app.sessions.items())
+    mismatched = [cid for cid in live if cid not in rebuilt or rebuilt[cid].encode() != live[cid].encode()]
+    extra = set(rebuilt) - set(live)
+    print(f"  reload: {len(rebuilt)} sessions in {load_ms:.1f} ms; "
+          f"{len(mismatched)} differ from live, {len(extra)} unexpected")
+
+    # Offline replay of the last chat
+    out = io.StringIO()
+    sys.argv = ["session_journal.py", journal.path, "--chat", str(1_000_000 + args.hunts - 1)]
+    t0 = perf()
+    with contextlib.redirect_stdout(out):
+        session_journal.main()
+    lines = out.getvalue().strip().splitlines()
+    print(f"  replay --chat: {len(lines) - 2} records in {(perf() - t0) * 1000:.1f} ms; {lines[-1]}")
+    return 1 if mismatched or extra else 0
+
+
+def run_recovery(args: argparse.Namespace) -> int:
+    from session import Session
+    from session_journal import SessionJournal
+
+    print(f"SessionJournal.load() with a snapshot of {args.recovery} sessions")
+    for tail in (int(t) for t in args.tails.split(",")):
+        path = os.path.join(tempfile.mkdtemp(prefix="quiz-recovery-"), "sessions.journal")
+        journal = SessionJournal(path, lambda key: 0, snapshot_every=10**9, keep=0)
+        journal.load()
+        live = {cid: Session(team_name=f"Team {cid}", state=None, started_at=time.time()) for cid in range(args.recovery)}
+        journal.append([(cid, "start", s, True) for cid, s in live.items()])
+        t0 = time.perf_counter()
+        journal.snapshot()
+        snap_ms = (time.perf_counter() - t0) * 1000
+        for n in range(tail):
+            cid = n % args.recovery
+            sess = live[cid]
+            sess.index += 1
+            sess.score += n % 2
+            journal.append([(cid, "answer", sess, False)])
+        journal.close()
+        t0 = time.perf_counter()
+        loaded = SessionJournal(path, lambda key: 0).load()
+        ms = (time.perf_counter() - t0) * 1000
+        assert all(loaded[cid].encode() == s.encode() for cid, s in live.items())
+        size = os.path.getsize(path)
+        print(f"  tail {tail:>7} records ({size / 1024:>7.0f} KiB): load {ms:8.1f} ms   (snapshot took {snap_ms:.1f} ms)")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--hunts", type=int, default=300)
+    ap.add_argument("--store", default="journal", help="SESSION_STORE for hunts mode (journal, memory, sqlite)")
+    ap.add_argument("--snapshot-every", type=int, default=5000, help="SESSION_JOURNAL_SNAPSHOT_RECORDS for hunts mode")
+    ap.add_argument("--recovery", type=int, default=0, metavar="N", help="time load() for N sessions instead")
+    ap.add_argument("--tails", default="0,1000,10000,100000", help="tail lengths for --recovery")
+    args = ap.parse_args()
+    return run_recovery(args) if args.recovery else run_hunts(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""Load test: N simulated teams play full hunts against /telegram with a fake Bot API.
+
+    python bench/load_test.py --chats 200 --concurrency 50 --latency-ms 40 --rate-429 0.01
+
+Each chat sends START → team name → READY → Start Timer → (hint) → answer or photo →
+NEXT … → finish, waiting like a real client until each question has been shown.
+Updates go through the Flask test client (no HTTP server in front), so "webhook
+latency" is the time /telegram takes to return. Outbound calls are served by
+bench/fake_bot_api.py with optional latency and 429 injection.
+
+Reports throughput, p50/p90/p99/max webhook latency, outbound calls by method
+(per hunt), and session memory. --json writes the numbers for comparison between
+runs; --max-p99-ms / --max-calls-per-hunt exit non-zero when exceeded.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+
+def percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(pct / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--chats", type=int, default=100, help="simulated teams (one full hunt each)")
+    ap.add_argument("--concurrency", type=int, default=25, help="teams playing at the same time")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="fake Bot API delay per call")
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0, help="fraction of Bot API calls answered with 429")
+    ap.add_argument("--retry-after", type=float, default=0.2, help="retry_after sent with injected 429s")
+    ap.add_argument("--hint-rate", type=float, default=0.2)
+    ap.add_argument("--correct-rate", type=float, default=0.7)
+    ap.add_argument("--think-ms", type=float, default=0.0, help="pause between a team's actions")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--max-p99-ms", type=float, help="fail if webhook p99 exceeds this")
+    ap.add_argument("--max-calls-per-hunt", type=float, help="fail if outbound calls per hunt exceed this")
+    ap.add_argument("env", nargs="*", help="extra KEY=VALUE settings for the app (e.g. SESSION_STORE=sqlite)")
+    args = ap.parse_args()
+
+    fake = FakeBotAPI(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    ).start()
+    tmp = tempfile.mkdtemp(prefix="quiz-load-")
+    os.environ.update(
+        TELEGRAM_BOT_TOKEN="load",
+        TELEGRAM_API_BASE=fake.base_url,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        DATA_DIR=tmp,
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        ADMIN_CHAT_IDS="900001",
+        # The fake API has no limits; pass TG_RATE_LIMIT=1 to include client-side pacing
+        TG_RATE_LIMIT="0",
+    )
+    os.environ.pop("OWNER_CHAT_ID", None)
+    os.environ.update(kv.split("=", 1) for kv in args.env)
+    import app as quiz
+    from session_store import approx_size
+
+    client_lock = threading.Lock()
+    update_ids = iter(range(1, 1 << 62))
+    latencies: List[float] = []
+    lat_lock = threading.Lock()
+    errors: List[str] = []
+
+    def post(update: Dict[str, Any]) -> None:
+        with client_lock:
+            update["update_id"] = next(update_ids)
+        client = quiz.app.test_client()
+        t0 = time.perf_counter()
+        resp = client.post("/telegram", json=update)
+        dt = time.perf_counter() - t0
+        with lat_lock:
+            latencies.append(dt)
+        if resp.status_code != 200:
+            errors.append(f"HTTP {resp.status_code}: {resp.data[:200]!r}")
+
+    def text(chat: int, t: str) -> None:
+        post({"message": {"chat": {"id": chat}, "message_id": 1, "text": t}})
+
+    def photo(chat: int, file_id: str) -> None:
+        post({"message": {"chat": {"id": chat}, "message_id": 1, "photo": [{"file_id": f"{file_id}-s"}, {"file_id": file_id}]}})
+
+    def tap(chat: int, data: str) -> None:
+        post({"callback_query": {"id": f"cb{chat}", "data": data, "message": {"chat": {"id": chat}}}})
+
+    def wait_until(cond: Any, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if cond():
+                return True
+            time.sleep(0.002)
+        return False
+
+    def think(rng: random.Random) -> None:
+        if args.think_ms:
+            time.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    def play(chat: int) -> None:
+        rng = random.Random(args.seed * 1_000_003 + chat)
+        text(chat, "START")
+        text(chat, f"Team {chat}")
+        tap(chat, "READY")
+        tap(chat, "Start Timer")
+        total = quiz.CATALOG.total
+        for pos in range(total):
+            # Wait for the question to be on screen (it is scheduled after the typing pause)
+            if not wait_until(lambda: not quiz.sessions[chat].advancing and quiz.sessions[chat].index == pos):
+                errors.append(f"chat {chat}: question {pos + 1} never shown")
+                return
+            q = quiz.CATALOG.get(pos)
+            think(rng)
+            if q.has_hint and rng.random() < args.hint_rate:
+                tap(chat, quiz.HINT_BUTTON_DATA)
+            if q.expect_photo:
+                photo(chat, f"ph-{chat}-{pos}")
+            else:
+                good = rng.random() < args.correct_rate
+                wrong = [o for o in q.options if o != q.answer]
+                tap(chat, q.answer if good or not wrong else rng.choice(wrong))
+            if pos + 1 < total:
+                think(rng)
+                tap(chat, quiz.NEXT_BUTTON_DATA)
+        if not wait_until(lambda: quiz.leaderboard.rank(chat) is not None, 5):
+            errors.append(f"chat {chat}: did not finish")
+
+    chats = [100_000 + i for i in range(args.chats)]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        list(pool.map(play, chats))
+    handled = time.perf_counter() - t0
+    quiz.scheduler.drain(30)
+    quiz.outbox.drain(60)
+    quiz.admin_notifier.drain(60)
+    wall = time.perf_counter() - t0
+    quiz.flush_sessions()
+
+    lat = sorted(latencies)
+    calls = Counter(m for m, _ in fake.calls)
+    total_calls = sum(calls.values())
+    session_bytes = [approx_size(quiz.sessions.peek(c)) for c in chats if quiz.sessions.peek(c) is not None]
+    result = {
+        "chats": args.chats,
+        "concurrency": args.concurrency,
+        "latency_ms": args.latency_ms,
+        "rate_429": args.rate_429,
+        "updates": len(lat),
+        "handled_secs": round(handled, 3),
+        "wall_secs": round(wall, 3),
+        "updates_per_sec": round(len(lat) / handled, 1) if handled else 0.0,
+        "hunts_per_sec": round(args.chats / wall, 2) if wall else 0.0,
+        "webhook_ms": {
+            "p50": round(percentile(lat, 50) * 1000, 3),
+            "p90": round(percentile(lat, 90) * 1000, 3),
+            "p99": round(percentile(lat, 99) * 1000, 3),
+            "max": round((lat[-1] if lat else 0) * 1000, 3),
+        },
+        "outbound_calls": dict(sorted(calls.items())),
+        "outbound_calls_per_hunt": round(total_calls / max(1, args.chats), 2),
+        "throttled_429": fake.throttled,
+        "upload_mb": round(fake.upload_bytes / 1e6, 2),
+        "session_bytes_avg": round(sum(session_bytes) / max(1, len(session_bytes))),
+        "max_rss_mb_delta": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1),
+        "errors": len(errors),
+    }
+    fake.stop()
+
+    w = result["webhook_ms"]
+    print(f"{args.chats} hunts ({result['updates']} updates), {args.concurrency} concurrent, "
+          f"API latency {args.latency_ms:g} ms, 429 rate {args.rate_429:g}")
+    print(f"  throughput : {result['updates_per_sec']} updates/s, {result['hunts_per_sec']} hunts/s "
+          f"(handled in {result['handled_secs']} s, all sends done in {result['wall_secs']} s)")
+    print(f"  webhook    : p50 {w['p50']} ms  p90 {w['p90']} ms  p99 {w['p99']} ms  max {w['max']} ms")
+    print(f"  outbound   : {total_calls} calls ({result['outbound_calls_per_hunt']}/hunt), "
+          f"{result['throttled_429']} throttled, {result['upload_mb']} MB uploaded")
+    for method, n in result["outbound_calls"].items():
+        print(f"               {method:<20} {n:>7}  ({n / max(1, args.chats):.2f}/hunt)")
+    print(f"  memory     : ~{result['session_bytes_avg']} B per session, max RSS +{result['max_rss_mb_delta']} MB")
+    for e in errors[:10]:
+        print(f"  ERROR {e}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    failed = bool(errors)
+    if args.max_p99_ms is not None and w["p99"] > args.max_p99_ms:
+        print(f"FAIL: p99 {w['p99']} ms > {args.max_p99_ms} ms")
+        failed = True
+    if args.max_calls_per_hunt is not None and result["outbound_calls_per_hunt"] > args.max_calls_per_hunt:
+        print(f"FAIL: {result['outbound_calls_per_hunt']} calls/hunt > {args.max_calls_per_hunt}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
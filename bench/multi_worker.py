@@ -0,0 +1,269 @@
+"""Multi-process check: full hunts against `python server.py` under gunicorn with shared state.
+
+    python bench/multi_worker.py --workers 1 4 --chats 60 --concurrency 20 --dup-rate 0.2
+
+For each worker count, starts the app as a real HTTP server (WEB_WORKERS=N, SQLite
+sessions, SHARED_STATE on unless --no-shared) against bench/fake_bot_api.py and plays hunts over fresh
+connections, so consecutive updates of one chat land on different workers. A
+fraction of updates is delivered twice at once (same update_id, like a Telegram
+retry) and answers are sometimes double-tapped. Afterwards every chat must have
+finished exactly once with the score its answers earned; any lost write, missed
+dedup or double-scoring across workers fails the run.
+
+Progress is read from the shared sessions.db, the way a second worker would see it.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from catalog import HINT_BUTTON_DATA, compile_catalog  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from load_test import percentile  # noqa: E402
+
+NEXT_BUTTON_DATA = "__NEXT__"  # app.NEXT_BUTTON_DATA (importing app would configure it here)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def catalog_plan() -> List[Dict[str, Any]]:
+    """Visible questions as the players see them (answer/options/photo/hint)."""
+    with open(os.path.join(ROOT, "questions.json"), "r", encoding="utf-8") as f:
+        cat = compile_catalog(json.load(f))
+    return [
+        {"answer": q.answer, "options": list(q.options), "photo": q.expect_photo, "hint": q.has_hint}
+        for q in (cat.get(i) for i in range(cat.total))
+    ]
+
+
+def run(workers: int, args: argparse.Namespace, plan: List[Dict[str, Any]]) -> Dict[str, Any]:
+    fake = FakeBotAPI(latency=args.latency_ms / 1000, seed=args.seed).start()
+    tmp = tempfile.mkdtemp(prefix="quiz-mw-")
+    port = free_port()
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="mw",
+        TELEGRAM_API_BASE=fake.base_url,
+        DATA_DIR=tmp,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        PORT=str(port),
+        WEB_SERVER="gunicorn",
+        WEB_WORKERS=str(workers),
+        WEB_THREADS=str(args.threads),
+        SHARED_STATE="0" if args.no_shared else "1",
+        SESSION_STORE="sqlite",
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        IMAGE_VARIANTS="0",
+        ADMIN_CHAT_IDS="900001",
+        TG_RATE_LIMIT="0",  # the fake API has no limits; pacing would only slow the run
+    )
+    env.pop("OWNER_CHAT_ID", None)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "server.py")], env=env, cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            requests.get(base + "/", timeout=1)
+            break
+        except requests.ConnectionError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                server.kill()
+                raise SystemExit(f"server with {workers} workers did not start")
+            time.sleep(0.1)
+
+    db_path = os.path.join(tmp, "sessions.db")
+    local = threading.local()
+    ids_lock = threading.Lock()
+    update_ids = iter(range(1, 1 << 62))
+    latencies: List[float] = []
+    lat_lock = threading.Lock()
+    errors: List[str] = []
+    expected: Dict[int, int] = {}
+
+    def db() -> sqlite3.Connection:
+        conn = getattr(local, "db", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=10)
+            local.db = conn
+        return conn
+
+    def progress(chat: int) -> List[Any] | None:
+        try:
+            row = db().execute("SELECT data FROM sessions WHERE chat_id = ?", (chat,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def deliver(update: Dict[str, Any]) -> None:
+        t0 = time.perf_counter()
+        # No keep-alive: each delivery may be accepted by a different worker
+        resp = requests.post(base + "/telegram", json=update, headers={"Connection": "close"}, timeout=30)
+        dt = time.perf_counter() - t0
+        with lat_lock:
+            latencies.append(dt)
+        if resp.status_code != 200:
+            errors.append(f"HTTP {resp.status_code}")
+
+    def post(update: Dict[str, Any], rng: random.Random) -> None:
+        with ids_lock:
+            update["update_id"] = next(update_ids)
+        if rng.random() < args.dup_rate:
+            # Telegram retry racing the original delivery
+            t = threading.Thread(target=deliver, args=(dict(update),))
+            t.start()
+            deliver(update)
+            t.join()
+        else:
+            deliver(update)
+
+    def play(chat: int) -> None:
+        rng = random.Random(args.seed * 1_000_003 + chat)
+
+        def text(t: str) -> None:
+            post({"message": {"chat": {"id": chat}, "message_id": 1, "text": t}}, rng)
+
+        def tap(data: str) -> None:
+            post({"callback_query": {"id": f"cb{chat}", "data": data, "message": {"chat": {"id": chat}}}}, rng)
+
+        text("START")
+        text(f"Team {chat}")
+        tap("READY")
+        tap("Start Timer")
+        score = 0
+        for pos, q in enumerate(plan):
+            # Session layout: [version, index, question_id, ..., advancing at 12]
+            end = time.monotonic() + 30
+            while True:
+                row = progress(chat)
+                if row and row[1] == pos and not row[12] and (row[6] or pos):
+                    break
+                if time.monotonic() > end:
+                    errors.append(f"chat {chat}: question {pos + 1} never shown")
+                    return
+                time.sleep(0.005)
+            if q["hint"] and rng.random() < 0.2:
+                tap(HINT_BUTTON_DATA)
+            if q["photo"]:
+                text_photo = {"message": {"chat": {"id": chat}, "message_id": 1,
+                                          "photo": [{"file_id": f"ph-{chat}-{pos}"}]}}
+                post(text_photo, rng)
+                score += 1
+            else:
+                wrong = [o for o in q["options"] if o != q["answer"]]
+                good = rng.random() < 0.7 or not wrong
+                choice = q["answer"] if good else rng.choice(wrong)
+                if rng.random() < args.double_tap_rate:
+                    # Two separate taps (distinct update_ids) on the same button
+                    other = threading.Thread(target=tap, args=(choice,))
+                    other.start()
+                    tap(choice)
+                    other.join()
+                else:
+                    tap(choice)
+                score += 1 if good else 0
+            if pos + 1 < len(plan):
+                tap(NEXT_BUTTON_DATA)
+        expected[chat] = score
+
+    chats = [200_000 + i for i in range(args.chats)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        list(pool.map(play, chats))
+    handled = time.perf_counter() - t0
+    time.sleep(1.0)
+    server.terminate()
+    try:
+        server.wait(20)
+    except subprocess.TimeoutExpired:
+        server.kill()
+    fake.stop()
+
+    finishes: Dict[int, List[int]] = {}
+    try:
+        with open(os.path.join(tmp, "leaderboard.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                r = json.loads(line)
+                finishes.setdefault(r["chat_id"], []).append(r["score"])
+    except FileNotFoundError:
+        pass
+    for chat, score in expected.items():
+        got = finishes.get(chat, [])
+        if got != [score]:
+            errors.append(f"chat {chat}: expected one finish with score {score}, got {got}")
+
+    lat = sorted(latencies)
+    return {
+        "workers": workers,
+        "threads": args.threads,
+        "updates": len(lat),
+        "handled_secs": round(handled, 3),
+        "updates_per_sec": round(len(lat) / handled, 1) if handled else 0.0,
+        "webhook_ms": {
+            "p50": round(percentile(lat, 50) * 1000, 3),
+            "p99": round(percentile(lat, 99) * 1000, 3),
+        },
+        "finished": sum(1 for c in expected if finishes.get(c)),
+        "errors": errors,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--chats", type=int, default=40)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--dup-rate", type=float, default=0.2, help="fraction of updates delivered twice at once")
+    ap.add_argument("--double-tap-rate", type=float, default=0.2, help="fraction of answers tapped twice")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--no-shared", action="store_true", help="SHARED_STATE=0, to see what breaks without it")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    plan = catalog_plan()
+    results = []
+    failed = False
+    print(f"{os.cpu_count()} CPUs, {args.chats} hunts, {args.concurrency} concurrent, "
+          f"dup rate {args.dup_rate:g}, double-tap rate {args.double_tap_rate:g}")
+    for n in args.workers:
+        r = run(n, args, plan)
+        results.append(r)
+        w = r["webhook_ms"]
+        print(f"  {n} x {args.threads}: {r['updates_per_sec']} updates/s, p50 {w['p50']} ms, p99 {w['p99']} ms, "
+              f"{r['finished']}/{args.chats} finished, {len(r['errors'])} errors")
+        for e in r["errors"][:10]:
+            print(f"    ERROR {e}")
+        failed = failed or bool(r["errors"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
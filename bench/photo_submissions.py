@@ -0,0 +1,272 @@
+"""Photo submission archive: dedup, disk cap, memory while streaming, and the app wiring.
+
+    python bench/photo_submissions.py --teams 40 --size-kb 2048
+
+Archive: every team submits a photo for each of --questions photo questions
+against the fake Bot API's file server. Some re-send the same file (same
+file_unique_id), some re-upload the same picture under a new file_id, pairs of
+teams send the same picture, and a few files exceed the per-file cap. Reported:
+outcomes against what was expected, bytes downloaded and stored, throughput,
+and the Python heap peak while downloading (tracemalloc), which should stay
+near the chunk size, not the file size. Stored files are re-hashed against the
+index, and paging with --page-size must return every submission once.
+
+Disk cap: the same uploads with PHOTO_ARCHIVE_MAX_MB at a quarter of the data.
+
+Retry: photos whose first getFile fails, or that found the archive full, are
+sent again (same file_unique_id) after the error clears or space is freed;
+each must then be stored.
+
+App: PHOTO_ARCHIVE=1, a few teams upload at a photo question through
+process_update(), then GET /admin/photos is paged. One file is fetched through its
+signed link without the admin header; a tampered link and ?token= must be refused.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Set, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import requests  # noqa: E402
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from photo_archive import PhotoArchive  # noqa: E402
+from tg_client import BotAPIClient  # noqa: E402
+
+
+def uploads(args: argparse.Namespace, fake: FakeBotAPI) -> Tuple[List[Tuple[int, int, str, str]], Counter]:
+    """(chat_id, qid, file_id, file_unique_id) in send order, and the outcomes they should produce."""
+    rng = random.Random(args.seed)
+    size = args.size_kb * 1024
+    out: List[Tuple[int, int, str, str]] = []
+    expected: Counter = Counter()
+    stored: Set[Tuple[int, int, str]] = set()
+    n = 0
+    for q in range(args.questions):
+        for t in range(args.teams):
+            chat = 5_000_000 + t
+            # Every 5th team pairs up with the previous one and sends the same picture
+            content = f"t{t - 1 if t % 5 == 4 else t}-q{q}"
+            n += 1
+            file_id = f"f{n}"
+            if rng.random() < args.oversize:
+                fake.add_file(file_id, args.max_file_mb * 1024 * 1024 + 1, content + "-big")
+                out.append((chat, q, file_id, f"u{n}"))
+                expected["too_large"] += 1
+                continue
+            fake.add_file(file_id, size, content)
+            out.append((chat, q, file_id, f"u{n}"))
+            expected["stored"] += 1
+            stored.add((chat, q, content))
+            if rng.random() < args.resend:
+                # Same message forwarded again: same file_unique_id, skipped before downloading
+                out.append((chat, q, file_id, f"u{n}"))
+                expected["duplicate"] += 1
+            if rng.random() < args.reupload:
+                # Same picture uploaded again: new file ids, caught by the content hash
+                n += 1
+                fake.add_file(f"f{n}", size, content)
+                out.append((chat, q, f"f{n}", f"u{n}"))
+                expected["duplicate"] += 1
+    expected["files"] = len({c for _, _, c in stored})
+    return out, expected
+
+
+def run_archive(args: argparse.Namespace, max_mb: int | None) -> Dict[str, Any]:
+    fake = FakeBotAPI(file_latency=args.chunk_ms / 1000).start()
+    client = BotAPIClient(fake.base_url, "photos", pool_size=args.workers * 2)
+    root = tempfile.mkdtemp(prefix="quiz-photos-")
+    plan, expected = uploads(args, fake)
+    archive = PhotoArchive(
+        root,
+        client.call,
+        client.download,
+        workers=args.workers,
+        max_pending=len(plan),
+        max_file_bytes=args.max_file_mb * 1024 * 1024,
+        max_total_bytes=(max_mb or 10**6) * 1024 * 1024,
+    )
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    for chat, q, file_id, unique in plan:
+        archive.submit(chat, f"Team {chat}", q, q + 1, file_id, unique)
+    archive.drain(600)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    stats = archive.stats()
+    bad = 0
+    seen_ids = []
+    offset: int | None = 0
+    while offset is not None:
+        items, total = archive.page(offset, args.page_size)
+        seen_ids += [s.id for s in items]
+        offset = offset + len(items) if offset + len(items) < total else None
+    for name in {s.sha256 for s in archive.page(0, 10**9)[0]}:
+        with open(archive.path_for(name), "rb") as f:
+            bad += hashlib.file_digest(f, "sha256").hexdigest() != name
+    on_disk = sum(
+        os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files if f.endswith(".jpg")
+    )
+    # A fresh archive over the same directory replays the index
+    reloaded = PhotoArchive(root, client.call, client.download).stats()
+    fake.stop()
+    return {
+        "plan": len(plan),
+        "capped": max_mb is not None,
+        "expected": expected,
+        "stats": stats,
+        "downloaded": fake.download_bytes,
+        "on_disk": on_disk,
+        "elapsed": elapsed,
+        "peak": peak,
+        "bad_hashes": bad,
+        "paged_once": sorted(seen_ids) == list(range(1, stats["submissions"] + 1)),
+        "reloaded": (reloaded["submissions"], reloaded["files"]) == (stats["submissions"], stats["files"]),
+    }
+
+
+def run_retry(args: argparse.Namespace) -> str:
+    fake = FakeBotAPI().start()
+    client = BotAPIClient(fake.base_url, "photos")
+    failed_once: Set[str] = set()
+
+    def flaky_call(method: str, **kwargs: Any) -> requests.Response:
+        file_id = kwargs["json"]["file_id"]
+        if file_id.startswith("err") and file_id not in failed_once:
+            failed_once.add(file_id)
+            raise requests.ConnectionError("injected")
+        return client.call(method, **kwargs)
+
+    archive = PhotoArchive(tempfile.mkdtemp(prefix="quiz-photos-"), flaky_call, client.download, max_total_bytes=1)
+    photos = [(7_000_000 + n, f"{kind}{n}") for n in range(args.retry_photos) for kind in ("err", "full")]
+    for attempt in range(2):
+        for chat, file_id in photos:
+            archive.submit(chat, "Team", 1, 1, file_id, f"u-{file_id}")
+        archive.drain(60)
+        if attempt == 0:
+            first = dict(archive.counts)
+            archive.max_total_bytes = 10**9  # space freed
+    fake.stop()
+    st = archive.stats()
+    return (f"retry: {len(photos)} photos -> first pass failed {first['failed']}, disk_full {first['disk_full']}; "
+            f"re-sent -> stored {st['stored']} of {len(photos)}")
+
+
+def run_app(args: argparse.Namespace) -> str:
+    fake = FakeBotAPI().start()
+    tmp = tempfile.mkdtemp(prefix="quiz-photo-app-")
+    os.environ.update(
+        TELEGRAM_BOT_TOKEN="photos",
+        TELEGRAM_API_BASE=fake.base_url,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        DATA_DIR=tmp,
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        TG_RATE_LIMIT="0",
+        IMAGE_VARIANTS="0",
+        PHOTO_ARCHIVE="1",
+        ADMIN_TOKEN="bench",
+    )
+    os.environ.pop("OWNER_CHAT_ID", None)
+    os.environ.pop("ADMIN_CHAT_IDS", None)
+    import app
+
+    photo_q = next(q for q in app.CATALOG.questions if q.expect_photo)
+    ids = iter(range(1, 10**9))
+
+    def send(update: Dict[str, Any]) -> None:
+        update["update_id"] = next(ids)
+        app.process_update(update)
+        app.scheduler.drain(30)
+        app.outbox.drain(30)
+
+    teams = [6_000_000 + n for n in range(args.app_teams)]
+    for chat in teams:
+        send({"message": {"chat": {"id": chat}, "message_id": 1, "text": "START"}})
+        send({"message": {"chat": {"id": chat}, "message_id": 1, "text": f"Team {chat}"}})
+        send({"callback_query": {"id": "cb", "data": "READY", "message": {"chat": {"id": chat}}}})
+        send({"callback_query": {"id": "cb", "data": "Start Timer", "message": {"chat": {"id": chat}}}})
+        sess = app.sessions.get(chat)
+        sess.index, sess.question_id = photo_q.position, photo_q.qid  # jump straight to the photo question
+        for _ in range(2):  # the second is a re-send of the same photo
+            photo = [{"file_id": f"a{chat}-s", "file_unique_id": f"ua{chat}-s"},
+                     {"file_id": f"a{chat}", "file_unique_id": f"ua{chat}"}]
+            send({"message": {"chat": {"id": chat}, "message_id": 1, "photo": photo}})
+    app.photo_archive.drain(60)
+
+    client = app.app.test_client()
+    headers = {"X-Admin-Token": "bench"}
+    pages = 0
+    got = []
+    offset: int | None = 0
+    while offset is not None:
+        body = client.get(f"/admin/photos?offset={offset}&limit=2", headers=headers).get_json()
+        got += body["items"]
+        offset = body["next_offset"]
+        pages += 1
+    img = client.get(got[0]["url"])  # signed link, no header
+    tampered = client.get(got[0]["url"][:-1] + ("0" if got[0]["url"][-1] != "0" else "1")).status_code
+    denied = client.get("/admin/photos").status_code
+    query_token = client.get("/admin/photos?token=bench").status_code
+    return (f"app: {len(teams)} teams x 2 uploads -> {len(got)} submissions in {pages} pages of 2, "
+            f"first file by signed link {img.status_code} {len(img.data) // 1024} KiB, tampered link {tampered}, "
+            f"without token {denied}, ?token= {query_token}; "
+            f"outcomes {body['stats']['stored']} stored / {body['stats']['duplicate']} duplicate")
+
+
+def report(label: str, r: Dict[str, Any], size_kb: int) -> None:
+    st, exp = r["stats"], r["expected"]
+    outcomes = ", ".join(f"{k} {st[k]}" for k in ("stored", "duplicate", "too_large", "disk_full", "dropped", "failed"))
+    print(f"{label}: {r['plan']} uploads -> {outcomes}")
+    print(f"  expected stored {exp['stored']}, duplicate {exp['duplicate']}, too_large {exp['too_large']}, "
+          f"distinct files {exp['files']} (archive has {st['files']})")
+    mb = r["downloaded"] / 1024 / 1024
+    cap = f"cap {st['max_bytes'] / 1024 / 1024:.0f} MiB" if r["capped"] else "no cap"
+    print(f"  downloaded {mb:.1f} MiB in {r['elapsed']:.2f}s ({mb / r['elapsed']:.0f} MiB/s), "
+          f"{r['on_disk'] / 1024 / 1024:.1f} MiB on disk ({cap})")
+    print(f"  heap peak while downloading {r['peak'] / 1024:.0f} KiB (files are {size_kb} KiB); "
+          f"stored hashes wrong {r['bad_hashes']}; paging complete {r['paged_once']}; reload matches {r['reloaded']}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--teams", type=int, default=40)
+    ap.add_argument("--questions", type=int, default=3)
+    ap.add_argument("--size-kb", type=int, default=2048)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--max-file-mb", type=int, default=20)
+    ap.add_argument("--resend", type=float, default=0.3, help="share of photos sent twice (same file)")
+    ap.add_argument("--reupload", type=float, default=0.2, help="share of photos uploaded again (new file_id)")
+    ap.add_argument("--oversize", type=float, default=0.03, help="share of photos over the per-file cap")
+    ap.add_argument("--chunk-ms", type=float, default=0.0, help="fake file server delay per 16 KiB chunk")
+    ap.add_argument("--page-size", type=int, default=25)
+    ap.add_argument("--retry-photos", type=int, default=5)
+    ap.add_argument("--app-teams", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    full = run_archive(args, None)
+    report("archive", full, args.size_kb)
+    cap_mb = max(1, full["on_disk"] // 4 // (1024 * 1024))
+    capped = run_archive(args, cap_mb)
+    report(f"archive, PHOTO_ARCHIVE_MAX_MB={cap_mb}", capped, args.size_kb)
+    print(run_retry(args))
+    print(run_app(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Polling ingress: ordered delivery, offset persistence, and webhook exclusion.
+
+    python bench/polling_ingress.py --chats 20 --per-chat 15
+
+Order: --chats x --per-chat updates are pushed to the fake Bot API with the
+chats interleaved, and one UpdatePoller (polling.py) handles them with a
+handler that sleeps a little at random. Each update must be handled once and
+each chat's updates in push order, while different chats run concurrently.
+
+Offset: a poller with POLL_BATCH_SIZE 10 handles two batches and is replaced by
+a new one on the same offset file, which must resume after them with no
+replays. A poller that dies partway through a batch must not replay the
+updates of that batch it already handled: the new one skips them and handles
+only the rest.
+
+Server: a webhook is set on the fake API, where getUpdates then answers 409,
+as on Telegram. `python server.py --poll` with WEB_WORKERS=4 must delete the
+webhook, run one process and answer START from every chat. The server is then
+stopped, more updates are pushed while it is down, and it is started again.
+Those updates must be answered once, and the ones before the restart not again.
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from polling import UpdatePoller  # noqa: E402
+from tg_client import BotAPIClient  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def chat_of(update: Dict[str, Any]) -> Any:
+    return update["message"]["chat"]["id"]
+
+
+def message(chat: int, text: str) -> Dict[str, Any]:
+    return {"message": {"chat": {"id": chat}, "message_id": 1, "text": text}}
+
+
+def wait_until(cond: Any, timeout: float = 30.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return cond()
+
+
+def order(args: argparse.Namespace) -> bool:
+    fake = FakeBotAPI().start()
+    tmp = tempfile.mkdtemp(prefix="quiz-poll-")
+    rng = random.Random(args.seed)
+    seen: Dict[int, List[int]] = {}
+    lock = threading.Lock()
+    running = [0, 0]  # now, peak
+
+    def handle(update: Dict[str, Any]) -> None:
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(rng.random() * 0.002)
+        with lock:
+            running[0] -= 1
+            chat = chat_of(update)
+            seen.setdefault(chat, []).append(int(update["message"]["text"]))
+
+    chats = [100_000 + c for c in range(args.chats)]
+    for n in range(args.per_chat):
+        for chat in chats:
+            fake.push_update(message(chat, str(n)))
+    poller = UpdatePoller(
+        BotAPIClient(fake.base_url, "poll"), handle, chat_of, os.path.join(tmp, "offset.json"),
+        poll_timeout=0, workers=8,
+    )
+    t0 = time.perf_counter()
+    batches = 0
+    while poller.poll_once():
+        batches += 1
+    took = time.perf_counter() - t0
+    total = args.chats * args.per_chat
+    ok = all(seen.get(chat) == list(range(args.per_chat)) for chat in chats) and running[1] > 1
+    print(f"order: {total} updates in {batches} batches in {took * 1000:.0f} ms, up to {running[1]} chats at once; "
+          f"each once and in order per chat: {ok}")
+    fake.stop()
+    return ok
+
+
+def offset(args: argparse.Namespace) -> bool:
+    fake = FakeBotAPI().start()
+    path = os.path.join(tempfile.mkdtemp(prefix="quiz-poll-"), "offset.json")
+    client = BotAPIClient(fake.base_url, "poll")
+    handled: Counter = Counter()
+    crash_at: List[int] = []
+
+    class Crash(BaseException):
+        pass
+
+    def handle(update: Dict[str, Any]) -> None:
+        if update["update_id"] in crash_at:
+            crash_at.clear()
+            raise Crash()  # the process dies here, mid-batch
+        handled[update["update_id"]] += 1
+
+    def poller() -> UpdatePoller:
+        return UpdatePoller(client, handle, chat_of, path, batch_size=10, poll_timeout=0, workers=2)
+
+    ids = [fake.push_update(message(100_000 + n % 3, str(n))) for n in range(25)]
+    first = poller()
+    first.poll_once()
+    first.poll_once()
+    saved = first.offset
+    second = poller()
+    resumed = second.offset
+    while second.poll_once():
+        pass
+    ok = resumed == saved == ids[19] + 1 and all(handled[i] == 1 for i in ids)
+
+    more = [fake.push_update(message(100_000 + n % 2, str(n))) for n in range(6)]
+    crash_at.append(more[4])
+    crashing = poller()
+    try:
+        crashing.poll_once()
+    except Crash:
+        crashing._pool.shutdown(wait=True)  # the other chat's updates finish before the "process" is gone
+    before = sum(handled[i] for i in more)
+    third = poller()
+    restarted = third.offset
+    while third.poll_once():
+        pass
+    replayed = sum(1 for i in more if handled[i] > 1)
+    crashed = before == len(more) - 1 and all(handled[i] == 1 for i in more)
+    ok = ok and crashed and replayed == 0 and restarted == more[4] and third.skipped == len(more) - 5 and third.offset == more[-1] + 1
+    print(f"offset: saved {saved} after 2 batches of 10, a new poller resumed at {resumed} and handled the other 5 "
+          f"once: {ok}\n  a crash after {before} of {len(more)} updates in a batch: restarted at {restarted} (the "
+          f"unhandled one), {third.skipped} later one already done skipped, {replayed} replayed")
+    fake.stop()
+    return ok
+
+
+def server_run(args: argparse.Namespace) -> bool:
+    fake = FakeBotAPI().start()
+    client = BotAPIClient(fake.base_url, "poll")
+    client.call("setWebhook", json={"url": "https://quiz.example.org/telegram"}).raise_for_status()
+    conflict = client.call("getUpdates", json={"timeout": 0})
+    tmp = tempfile.mkdtemp(prefix="quiz-poll-")
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="poll",
+        TELEGRAM_API_BASE=fake.base_url,
+        DATA_DIR=tmp,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        PORT=str(free_port()),
+        BOT_MODE="polling",
+        WEB_WORKERS="4",
+        POLL_TIMEOUT_SECS="1",
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        IMAGE_VARIANTS="0",
+        TG_RATE_LIMIT="0",
+    )
+    env.pop("OWNER_CHAT_ID", None)
+    log_path = os.path.join(tmp, "server.log")
+
+    def start() -> Tuple[subprocess.Popen, int]:
+        mark = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+        log = open(log_path, "ab")
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server.py")], env=env, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+        )
+        log.close()
+        if not wait_until(lambda: "[polling] started" in read_log(mark) or proc.poll() is not None):
+            proc.kill()
+            raise SystemExit("polling server did not start")
+        if proc.poll() is not None:
+            raise SystemExit(f"polling server exited:\n{read_log(mark)}")
+        return proc, mark
+
+    def read_log(mark: int = 0) -> str:
+        with open(log_path, "rb") as f:
+            f.seek(mark)
+            return f.read().decode("utf-8", "replace")
+
+    def stop(proc: subprocess.Popen) -> None:
+        proc.terminate()
+        try:
+            proc.wait(20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    def replies(chats: List[int]) -> Counter:
+        return Counter(int(p["chat_id"]) for p in fake.sent("sendMessage") if int(p["chat_id"]) in chats)
+
+    before = [300_000 + c for c in range(args.chats)]
+    after = [400_000 + c for c in range(args.chats)]
+    proc, mark = start()
+    deleted = bool(fake.sent("deleteWebhook")) and fake.webhook_url is None
+    single = "single worker process" in read_log(mark)
+    for chat in before:
+        fake.push_update(message(chat, "START"))
+    answered = wait_until(lambda: len(replies(before)) == len(before))
+    wait_until(lambda: False, 0.5)  # let the offset of the last batch be saved
+    per_start = replies(before)
+    stop(proc)
+
+    for chat in after:
+        fake.push_update(message(chat, "START"))
+    proc, _ = start()
+    caught_up = wait_until(lambda: len(replies(after)) == len(after))
+    wait_until(lambda: False, 2 * float(env["POLL_TIMEOUT_SECS"]))  # room for any replays to show up
+    stop(proc)
+    fake.stop()
+    no_replays = replies(before) == per_start
+    once = len(set(replies(after).values())) == 1 and set(replies(after).values()) == set(per_start.values())
+    ok = conflict.status_code == 409 and deleted and single and answered and caught_up and no_replays and once
+    print(f"server: getUpdates with a webhook set -> {conflict.status_code}; server.py --poll deleted the webhook: "
+          f"{deleted}, one process with WEB_WORKERS=4: {single}\n"
+          f"  {len(before)} STARTs answered before the restart: {answered}; {len(after)} pushed while down answered "
+          f"once after it: {caught_up and once}; none replayed: {no_replays}")
+    return ok
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--chats", type=int, default=20)
+    ap.add_argument("--per-chat", type=int, default=15)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    ok = order(args)
+    ok = offset(args) and ok
+    ok = server_run(args) and ok
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Results export: batching, retry after 5xx, and the cursor across restarts.
+
+    python bench/results_delivery.py --results 95 --batch-size 20
+
+Drives ResultsOutbox (results_export.py) against bench/results_sink.py through
+the real WebhookSink.
+
+Batching: --results finishes are appended, then the flusher starts. Every
+record must arrive once and in order, in batches of at most --batch-size.
+
+Retry: the sink answers the first --fail-first POSTs with 503 while results
+are queued. Delivery must resume after the errors with nothing lost or
+doubled. last_error must be set during the outage and cleared after it.
+
+Restart: part of the log is delivered, the next POST fails, and a partial
+line is left at the end of the log (a crash mid-append). A new ResultsOutbox
+on the same log must deliver only the rest, from the persisted cursor. Once
+everything is delivered the log is compacted; after one more restart only
+new results are sent.
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from results_export import ResultsOutbox, WebhookSink  # noqa: E402
+from results_sink import ResultsSinkServer  # noqa: E402
+
+
+def result(n: int) -> Dict[str, Any]:
+    return {"id": f"{1000 + n}-{n}", "chat_id": 1000 + n, "team": f"Team {n}", "score": n % 11, "total": 10}
+
+
+def wait_until(cond: Any, timeout: float = 30.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return cond()
+
+
+def ids(records: List[Dict[str, Any]]) -> List[str]:
+    return [r["id"] for r in records]
+
+
+def batching(args: argparse.Namespace) -> bool:
+    sink = ResultsSinkServer().start()
+    log = os.path.join(tempfile.mkdtemp(prefix="quiz-results-"), "results.jsonl")
+    outbox = ResultsOutbox(log, WebhookSink(sink.url), batch_size=args.batch_size, interval=0.05)
+    for n in range(args.results):
+        outbox.append(result(n))
+    t0 = time.perf_counter()
+    outbox.start()
+    wait_until(lambda: outbox.pending() == 0)
+    took = time.perf_counter() - t0
+    outbox.stop()
+    sizes = [len(b) for b in sink.batches]
+    want = [result(n)["id"] for n in range(args.results)]
+    ok = ids(sink.records()) == want and max(sizes) <= args.batch_size
+    ok = ok and len(sizes) == math.ceil(args.results / args.batch_size)
+    print(f"batching: {args.results} results in {len(sizes)} POSTs (sizes {sizes}) in {took * 1000:.0f} ms, "
+          f"in order, once each: {ok}")
+    sink.stop()
+    return ok
+
+
+def retry(args: argparse.Namespace) -> bool:
+    sink = ResultsSinkServer().start()
+    sink.fail_next = args.fail_first
+    log = os.path.join(tempfile.mkdtemp(prefix="quiz-results-"), "results.jsonl")
+    outbox = ResultsOutbox(log, WebhookSink(sink.url), batch_size=args.batch_size, interval=0.02, max_backoff=0.2)
+    outbox.start()
+    for n in range(args.results):
+        outbox.append(result(n))
+    saw_error = wait_until(lambda: outbox.last_error is not None, 5)
+    error = outbox.last_error
+    t0 = time.perf_counter()
+    wait_until(lambda: outbox.pending() == 0)
+    took = time.perf_counter() - t0
+    outbox.stop()
+    got = ids(sink.records())
+    want = [result(n)["id"] for n in range(args.results)]
+    ok = saw_error and got == want and outbox.last_error is None and sink.requests == args.fail_first + len(sink.batches)
+    print(f"retry: {args.fail_first} x 503 then {len(sink.batches)} POSTs ({sink.requests} requests), recovered in "
+          f"{took * 1000:.0f} ms, {len(got)}/{len(want)} delivered once each, error cleared: {ok}\n"
+          f"  last_error during the outage: {error}")
+    sink.stop()
+    return ok
+
+
+def restart(args: argparse.Namespace) -> bool:
+    sink = ResultsSinkServer().start()
+    log = os.path.join(tempfile.mkdtemp(prefix="quiz-results-"), "results.jsonl")
+    first = ResultsOutbox(log, WebhookSink(sink.url), batch_size=args.batch_size, compact_bytes=1)
+    for n in range(args.results):
+        first.append(result(n))
+    first.flush_once()
+    first.flush_once()
+    sent_before = len(sink.records())
+    sink.fail_next = 1
+    try:
+        first.flush_once()
+        failed = False
+    except Exception:
+        failed = True
+    cursor = first.cursor
+    with open(log, "ab") as f:
+        f.write(b'{"id":"torn-')  # the process dies mid-append
+    del first
+
+    second = ResultsOutbox(log, WebhookSink(sink.url), batch_size=args.batch_size, compact_bytes=1)
+    resumed_at = second.cursor
+    while second.flush_once():
+        pass
+    want = [result(n)["id"] for n in range(args.results)]
+    got = ids(sink.records())
+    ok = failed and resumed_at == cursor and got == want
+    compacted = os.path.getsize(log) == 0 and second.cursor == 0
+
+    third = ResultsOutbox(log, WebhookSink(sink.url), batch_size=args.batch_size, compact_bytes=1)
+    third.append(result(args.results))
+    while third.flush_once():
+        pass
+    got = ids(sink.records())
+    ok = ok and compacted and got == want + [result(args.results)["id"]]
+    print(f"restart: {sent_before} delivered, then a failed POST and a torn append; the new outbox resumed at "
+          f"byte {resumed_at} (cursor {cursor}) and sent {len(want) - sent_before} more\n"
+          f"  log compacted after delivery: {compacted}; after another restart only the new result was sent; "
+          f"each result once: {ok}")
+    sink.stop()
+    return ok
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--results", type=int, default=95)
+    ap.add_argument("--batch-size", type=int, default=20)
+    ap.add_argument("--fail-first", type=int, default=3)
+    args = ap.parse_args()
+    ok = batching(args)
+    ok = retry(args) and ok
+    ok = restart(args) and ok
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Local stand-in for RESULTS_WEBHOOK_URL: records every POSTed batch of results.
+
+Run standalone:  python bench/results_sink.py --port 8082 [--fail-first 3]
+Then start the bot with RESULTS_WEBHOOK_URL=http://127.0.0.1:8082/results.
+
+Use fail_next / --fail-first to make the next N requests return 503 and exercise
+the exporter's retry/backoff path.
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+
+class ResultsSinkServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.batches: List[List[Dict[str, Any]]] = []
+        self.requests = 0
+        self.fail_next = 0
+        self._lock = threading.Lock()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with sink._lock:
+                    sink.requests += 1
+                    failing = sink.fail_next > 0
+                    if failing:
+                        sink.fail_next -= 1
+                    else:
+                        sink.batches.append(list(json.loads(body or b"{}").get("results") or []))
+                status, out = (503, b'{"ok":false}') if failing else (200, b'{"ok":true}')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/results"
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [r for batch in self.batches for r in batch]
+
+    def start(self) -> "ResultsSinkServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="results-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8082)
+    ap.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with 503")
+    args = ap.parse_args()
+    sink = ResultsSinkServer(args.host, args.port)
+    sink.fail_next = args.fail_first
+    print(f"Results sink listening on {sink.url}", flush=True)
+    try:
+        sink.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
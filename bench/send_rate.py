@@ -0,0 +1,189 @@
+"""READY burst against a fake Bot API that enforces flood limits, with and without client pacing.
+
+    python bench/send_rate.py --teams 60 --admin-msgs 10
+
+Every team is brought to the READY prompt, then all of them tap READY and Start
+Timer at the same moment while admin notifications are fanned out. The fake
+Bot API answers sends beyond --fake-global per second overall or --fake-chat
+per second to one chat with 429 (retry_after 1), like Telegram. Each mode runs
+in its own process (TG_RATE_LIMIT=0 / 1). Reported: 429s returned, player sends
+delivered, when each team had received everything (p50/p99/max seconds after
+the burst) and when the admin messages arrived.
+
+Lanes: --busy-chats chats queue 10 messages each on an 8-worker Outbox paced at
+1 message/s per chat (global tokens plentiful), while --quiet-chats chats send
+one message each, spread over the run. Reported: how long the one-message
+chats waited, with the per-chat check done by a blocked worker (old) and by
+deferring the chat's lane (Outbox delay_of).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from outbox import Outbox  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+
+ADMINS = (900001, 900002, 900003)
+
+
+def pct(vals: List[float], p: float) -> float:
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(len(vals) * p))] if vals else 0.0
+
+
+def child(args: argparse.Namespace) -> Dict[str, Any]:
+    fake = FakeBotAPI(limit_global=args.fake_global, limit_chat=args.fake_chat).start()
+    tmp = tempfile.mkdtemp(prefix="quiz-rate-")
+    os.environ.update(
+        TELEGRAM_BOT_TOKEN="rate",
+        TELEGRAM_API_BASE=fake.base_url,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        DATA_DIR=tmp,
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        IMAGE_VARIANTS="0",
+        METRICS="1",
+        ADMIN_CHAT_IDS=",".join(map(str, ADMINS)),
+        TG_RATE_LIMIT=args.mode,
+        SEND_WORKERS=str(args.send_workers),
+    )
+    os.environ.pop("OWNER_CHAT_ID", None)
+    import app
+
+    ids = iter(range(1, 10**9))
+    lock = threading.Lock()
+
+    def post(chat: int, update: Dict[str, Any]) -> None:
+        with lock:
+            update["update_id"] = next(ids)
+        app.process_update(update)
+
+    def text(chat: int, t: str) -> None:
+        post(chat, {"message": {"chat": {"id": chat}, "message_id": 1, "text": t}})
+
+    def tap(chat: int, data: str) -> None:
+        post(chat, {"callback_query": {"id": "cb", "data": data, "message": {"chat": {"id": chat}}}})
+
+    teams = [2_000_000 + n for n in range(args.teams)]
+    # Warm up: every team at the READY prompt, then let the limits' windows pass
+    for chat in teams:
+        text(chat, "START")
+        text(chat, f"Team {chat}")
+    app.outbox.drain(300)
+    time.sleep(2.5)
+    fake.reset()
+
+    def team(chat: int) -> None:
+        tap(chat, "READY")
+        tap(chat, "Start Timer")
+
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(64, args.teams)) as pool:
+        for n in range(args.admin_msgs):
+            app.notify_admins(f"Team {n} finished")
+        list(pool.map(team, teams))
+    app.outbox.drain(300)
+    app.admin_notifier.drain(300)
+    elapsed = time.monotonic() - t0
+
+    done: Dict[int, float] = {}
+    sends = 0
+    admin_times: List[float] = []
+    for (method, params), ts in zip(fake.calls, fake.call_times):
+        chat = int(params.get("chat_id") or 0)
+        if chat in ADMINS:
+            admin_times.append(ts - t0)
+        elif method.startswith("send") and method != "sendChatAction":
+            sends += 1
+            done[chat] = max(done.get(chat, 0.0), ts - t0)
+    user = list(done.values())
+    waits = app.send_limiter.stats()["lanes"] if app.send_limiter is not None else {}
+    return {
+        "mode": "paced" if args.mode == "1" else "unpaced",
+        "429s": fake.throttled,
+        "user_sends": sends,
+        "teams_served": len(done),
+        "user_p50": statistics.median(user) if user else 0.0,
+        "user_p99": pct(user, 0.99),
+        "user_max": max(user, default=0.0),
+        "admin_delivered": len(admin_times),
+        "admin_p50": statistics.median(admin_times) if admin_times else 0.0,
+        "admin_max": max(admin_times, default=0.0),
+        "elapsed": elapsed,
+        "lanes": waits,
+    }
+
+
+def lanes(args: argparse.Namespace, defer: bool) -> str:
+    limiter = RateLimiter(global_rate=1000, global_burst=100, chat_rate=1, chat_burst=3)
+    outbox = Outbox(workers=8, delay_of=limiter.chat_delay if defer else None)
+    waits: List[float] = []
+
+    def send(chat: int, queued: float | None) -> None:
+        limiter.acquire(chat)
+        time.sleep(0.05)  # the Bot API round trip
+        if queued is not None:
+            waits.append(time.monotonic() - queued)
+
+    for n in range(10):
+        for chat in range(args.busy_chats):
+            outbox.submit(chat, send, chat, None)
+    for chat in range(args.quiet_chats):
+        time.sleep(0.2)
+        outbox.submit(10_000 + chat, send, 10_000 + chat, time.monotonic())
+    outbox.drain()
+    return (f"  {'deferred' if defer else 'blocking':<9} one-message chats sent after p50 {pct(waits, 0.5):.2f}s "
+            f"max {max(waits):.2f}s ({outbox.deferrals} lane deferrals)")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--teams", type=int, default=60)
+    ap.add_argument("--admin-msgs", type=int, default=10, help="notify_admins() calls during the burst (x3 admins)")
+    ap.add_argument("--fake-global", type=int, default=30, help="fake API sends per second overall")
+    ap.add_argument("--fake-chat", type=int, default=4, help="fake API sends per second to one chat")
+    ap.add_argument("--send-workers", type=int, default=8)
+    ap.add_argument("--busy-chats", type=int, default=20)
+    ap.add_argument("--quiet-chats", type=int, default=20)
+    ap.add_argument("--mode", choices=("0", "1"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.mode is not None:
+        print(json.dumps(child(args)))
+        return 0
+
+    rows = []
+    for mode in ("0", "1"):
+        cmd = [sys.executable, os.path.abspath(__file__), "--mode", mode, *sys.argv[1:]]
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        rows.append(json.loads(out.strip().splitlines()[-1]))
+    print(f"{args.teams} teams tap READY + Start Timer together, {args.admin_msgs * len(ADMINS)} admin messages; "
+          f"fake API allows {args.fake_global}/s overall, {args.fake_chat}/s per chat")
+    for r in rows:
+        print(f"  {r['mode']:<9} 429s {r['429s']:>4}  player sends {r['user_sends']:>4} to {r['teams_served']} teams, "
+              f"all received by p50 {r['user_p50']:.2f}s p99 {r['user_p99']:.2f}s max {r['user_max']:.2f}s;  "
+              f"admin {r['admin_delivered']} by p50 {r['admin_p50']:.2f}s max {r['admin_max']:.2f}s")
+        for lane, st in r["lanes"].items():
+            mean = st["wait_secs"] / st["waited"] if st["waited"] else 0.0
+            print(f"            {lane:<6} {st['sends']} sends, {st['waited']} waited (mean {mean:.2f}s, max {st['max_wait_secs']:.2f}s)")
+    print(f"{args.busy_chats} chats x 10 messages on 8 send workers at 1/s per chat, "
+          f"{args.quiet_chats} chats sending one message meanwhile")
+    for defer in (False, True):
+        print(lanes(args, defer))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
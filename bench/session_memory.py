@@ -0,0 +1,135 @@
+"""Memory and access cost of the Session record vs the original dict sessions.
+
+    python bench/session_memory.py --sessions 10000
+
+Builds N mid-hunt sessions (hints used on 2 questions, photo awarded and
+explanations sent on 1) in both layouts and reports tracemalloc bytes per
+session, the cost of the per-update ensure_session path, and serialized size.
+The dict layout and its backfill are reproduced here as they were before the
+Session record replaced them.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from session import Session, set_bit  # noqa: E402
+from session_store import encode_session  # noqa: E402
+
+
+def legacy_session(i: int) -> Dict[str, Any]:
+    return {
+        "index": 5,
+        "question_id": 5.1,
+        "score": 4,
+        "team_name": f"Team {i}",
+        "state": None,
+        "started_at": 1_700_000_000.0 + i,
+        "penalty_secs": 40,
+        "hint_used_indices": [2.0, 4.1],
+        "awaiting_next": False,
+        "advancing": False,
+        "awaiting_photo_for": None,
+        "photo_awarded_for": {4.2},
+        "exp_sent_for": {4.2},
+        "time_accum": 812.5,
+        "time_segment_started": 1_700_000_900.0 + i,
+    }
+
+
+def slotted_session(i: int) -> Session:
+    return Session(
+        index=5,
+        question_id=5.1,
+        score=4,
+        team_name=f"Team {i}",
+        started_at=1_700_000_000.0 + i,
+        penalty_secs=40,
+        hints_used=set_bit(set_bit(0, 1), 3),
+        photos_awarded=set_bit(0, 4),
+        explanations_sent=set_bit(0, 4),
+        time_accum=812.5,
+        time_segment_started=1_700_000_900.0 + i,
+    )
+
+
+def legacy_ensure(store: Dict[int, Dict[str, Any]], chat_id: int) -> Dict[str, Any]:
+    sess = store.get(chat_id)
+    sess.setdefault("question_id", None)
+    sess.setdefault("penalty_secs", 0)
+    sess.setdefault("hint_used_indices", [])
+    sess.setdefault("awaiting_next", False)
+    sess.setdefault("advancing", False)
+    sess.setdefault("awaiting_photo_for", None)
+    sess.setdefault("photo_awarded_for", set())
+    sess.setdefault("exp_sent_for", set())
+    sess.setdefault("time_accum", 0.0)
+    sess.setdefault("time_segment_started", None)
+    return sess
+
+
+def slotted_ensure(store: Dict[int, Session], chat_id: int) -> Session:
+    sess = store.get(chat_id)
+    if sess is None:
+        sess = Session()
+        store[chat_id] = sess
+    return sess
+
+
+def measure(factory: Callable[[int], Any], n: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    held: List[Any] = [factory(i) for i in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # Exclude the holding list itself
+    total = sum(s.size_diff for s in after.compare_to(before, "filename")) - sys.getsizeof(held)
+    del held
+    return total / n
+
+
+def legacy_encode(sess: Dict[str, Any]) -> str:
+    out = dict(sess)
+    for key in ("photo_awarded_for", "exp_sent_for"):
+        out[key] = sorted(out[key])
+    return json.dumps(out, separators=(",", ":"), ensure_ascii=False)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=10000)
+    args = ap.parse_args()
+    n = args.sessions
+
+    dict_bytes = measure(legacy_session, n)
+    slot_bytes = measure(slotted_session, n)
+    print(f"tracemalloc, {n} mid-hunt sessions:")
+    print(f"  dict    : {dict_bytes:7.0f} B/session")
+    print(f"  Session : {slot_bytes:7.0f} B/session  ({100 * (1 - slot_bytes / dict_bytes):.0f}% less)")
+
+    legacy_store = {i: legacy_session(i) for i in range(1000)}
+    slotted_store = {i: slotted_session(i) for i in range(1000)}
+    reps = 200_000
+    t_dict = timeit.timeit(lambda: legacy_ensure(legacy_store, 7)["awaiting_next"], number=reps) / reps
+    t_slot = timeit.timeit(lambda: slotted_ensure(slotted_store, 7).awaiting_next, number=reps) / reps
+    print("ensure_session + one field read:")
+    print(f"  dict    : {t_dict * 1e9:7.0f} ns")
+    print(f"  Session : {t_slot * 1e9:7.0f} ns")
+
+    d, s = legacy_session(1), slotted_session(1)
+    t_enc_d = timeit.timeit(lambda: legacy_encode(d), number=50_000) / 50_000
+    t_enc_s = timeit.timeit(lambda: encode_session(s), number=50_000) / 50_000
+    print("serialized (SQLite row):")
+    print(f"  dict    : {len(legacy_encode(d).encode()):4d} B, {t_enc_d * 1e6:.1f} us to encode")
+    print(f"  Session : {len(encode_session(s).encode()):4d} B, {t_enc_s * 1e6:.1f} us to encode")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
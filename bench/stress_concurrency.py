@@ -0,0 +1,125 @@
+"""Stress test: concurrent duplicate taps and Telegram re-deliveries against /telegram.
+
+    python bench/stress_concurrency.py --chats 20 --taps 8
+
+For each chat, fires `taps` simultaneous copies of the same answer (distinct update_ids),
+then simultaneous Next taps, then the same update_id `taps` times. Exits non-zero if any
+chat double-scored, skipped a question, or processed a duplicate update.
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chats", type=int, default=20)
+    ap.add_argument("--taps", type=int, default=8)
+    args = ap.parse_args()
+
+    fake = FakeBotAPI().start()
+    tmp = tempfile.mkdtemp(prefix="quiz-stress-")
+    os.environ.update(
+        TELEGRAM_BOT_TOKEN="stress",
+        TELEGRAM_API_BASE=fake.base_url,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        DATA_DIR=tmp,
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        TG_RATE_LIMIT="0",  # the fake API has no limits; pacing would only slow the run
+    )
+    os.environ.pop("ADMIN_CHAT_IDS", None)
+    os.environ.pop("OWNER_CHAT_ID", None)
+    import app as quiz
+
+    ids = itertools.count(1)
+    lock = threading.Lock()
+
+    def next_id() -> int:
+        with lock:
+            return next(ids)
+
+    def post(update: dict) -> None:
+        resp = quiz.app.test_client().post("/telegram", json=update)
+        assert resp.status_code == 200, resp.data
+
+    def text(chat: int, t: str, update_id: int | None = None) -> dict:
+        return {"update_id": update_id or next_id(), "message": {"chat": {"id": chat}, "text": t}}
+
+    def tap(chat: int, data: str, update_id: int | None = None) -> dict:
+        uid = update_id or next_id()
+        return {"update_id": uid, "callback_query": {"id": f"cb{uid}", "data": data, "message": {"chat": {"id": chat}}}}
+
+    def burst(updates: list) -> None:
+        barrier = threading.Barrier(len(updates))
+
+        def fire(u: dict) -> None:
+            barrier.wait()
+            post(u)
+
+        threads = [threading.Thread(target=fire, args=(u,)) for u in updates]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def settle() -> None:
+        quiz.scheduler.drain(10)
+        quiz.outbox.drain(10)
+
+    first = quiz.CATALOG.get(0)
+    assert first is not None and not first.expect_photo, "stress test expects an MCQ first question"
+    chats = [10_000 + i for i in range(args.chats)]
+    for chat in chats:
+        for u in (text(chat, "START"), text(chat, f"Team {chat}"), tap(chat, "READY"), tap(chat, "Start Timer")):
+            post(u)
+    settle()
+
+    failures = []
+    # 1) Same answer tapped many times at once, across all chats simultaneously
+    burst([tap(chat, first.answer) for chat in chats for _ in range(args.taps)])
+    settle()
+    for chat in chats:
+        sess = quiz.sessions[chat]
+        feedback = [m for m in fake.sent("sendMessage", chat) if m.get("text") == first.correct_text]
+        if sess.score != 1 or len(feedback) != 1:
+            failures.append(f"chat {chat}: score={sess.score} feedback_msgs={len(feedback)} (double-scored)")
+
+    # 2) Next tapped many times at once must advance exactly one question
+    burst([tap(chat, quiz.NEXT_BUTTON_DATA) for chat in chats for _ in range(args.taps)])
+    settle()
+    for chat in chats:
+        if quiz.sessions[chat].index != 1:
+            failures.append(f"chat {chat}: index={quiz.sessions[chat].index} after Next (skipped a question)")
+
+    # 3) One update delivered `taps` times (Telegram retries) is processed once
+    fake.reset()
+    burst([text(chat, "HINT", update_id=1_000_000 + chat) for chat in chats for _ in range(args.taps)])
+    settle()
+    for chat in chats:
+        hints = [m for m in fake.sent(chat_id=chat) if "Hint" in str(m.get("text") or m.get("caption") or "")]
+        if len(hints) != 1:
+            failures.append(f"chat {chat}: duplicate update handled {len(hints)} times")
+
+    fake.stop()
+    total = args.chats * args.taps
+    if failures:
+        print(f"FAIL ({len(failures)} problems)")
+        for f in failures[:20]:
+            print("  " + f)
+        return 1
+    print(f"OK: {args.chats} chats x {args.taps} concurrent taps ({3 * total} updates), no double-scoring, skips or duplicates")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Typed answers: how often they resolve to an option, match cost, and what a reprompt sends.
+
+    python bench/typed_answers.py --rounds 2000
+
+Matching: for every option in questions.json, typed variants (as sent, other
+case, trailing emoji/punctuation, accents, number words, one or two typos) and
+unrelated text are matched with AnswerIndex.match(); reported per variant kind
+with the old exact-only rule for comparison, plus the mean cost per match.
+
+Reprompt: a team at a question with an image types text that matches no option;
+the Bot API calls and upload bytes that produces are counted on the fake API.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from answers import NUMBER_WORDS  # noqa: E402
+from catalog import compile_catalog, is_visible  # noqa: E402
+
+DIGIT_WORDS = {str(v): k for k, v in NUMBER_WORDS.items()}
+
+
+def typo(rng: random.Random, s: str) -> str:
+    if len(s) < 2:
+        return s
+    i = rng.randrange(len(s))
+    op = rng.choice("drs")
+    if op == "d":
+        return s[:i] + s[i + 1:]
+    if op == "r":
+        return s[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + s[i + 1:]
+    j = min(i + 1, len(s) - 1)
+    return s[:i] + s[j] + s[i] + s[j + 1:] if j > i else s
+
+
+VARIANTS: Dict[str, Callable[[random.Random, str], str]] = {
+    "as sent": lambda rng, s: s,
+    "case": lambda rng, s: s.upper() if rng.random() < 0.5 else s.lower(),
+    "emoji/punct": lambda rng, s: s + rng.choice([" 😀", "!", ".", " 👍🏽", "?!"]),
+    "spacing": lambda rng, s: "  " + s.replace(" ", "  ") + " ",
+    "accents": lambda rng, s: s.replace("a", "á").replace("e", "é"),
+    "number word": lambda rng, s: DIGIT_WORDS.get(s, s).capitalize(),
+    "1 typo": lambda rng, s: typo(rng, s),
+    "2 typos": lambda rng, s: typo(rng, typo(rng, s)),
+    "unrelated": lambda rng, s: rng.choice(["idk", "what?", "hello", "banana", "no idea 🤷"]),
+}
+
+
+def matching(args: argparse.Namespace) -> None:
+    with open(os.path.join(ROOT, "questions.json"), encoding="utf-8") as f:
+        questions = json.load(f)
+    catalog = compile_catalog(questions, max_edits=args.max_edits)
+    rng = random.Random(args.seed)
+    pairs = [(q, opt) for q in catalog.questions for opt in q.options]
+    hits: Dict[str, Counter] = defaultdict(Counter)
+    old_hits: Counter = Counter()
+    wrong = Counter()
+    total = Counter()
+    samples: List[Tuple[object, str]] = []
+    for _ in range(args.rounds):
+        for kind, fn in VARIANTS.items():
+            q, opt = rng.choice(pairs)
+            text = fn(rng, opt)
+            option, how = q.answer_index.match(text)
+            total[kind] += 1
+            hits[kind][how] += 1
+            old_hits[kind] += text in q.options
+            if option is not None and option != opt and kind != "unrelated":
+                wrong[kind] += 1
+            samples.append((q, text))
+    t0 = time.perf_counter()
+    for q, text in samples:
+        q.answer_index.match(text)
+    per = (time.perf_counter() - t0) / len(samples) * 1e6
+    print(f"{sum(1 for q in questions if is_visible(q))} questions, {len(pairs)} options, "
+          f"ANSWER_MAX_EDITS={args.max_edits}; share resolved to an option (old exact-only rule)")
+    for kind in VARIANTS:
+        n = total[kind]
+        resolved = n - hits[kind]["none"]
+        how = ", ".join(f"{k} {v}" for k, v in sorted(hits[kind].items()) if k != "none")
+        print(f"  {kind:<12} {resolved / n:6.1%}  (old {old_hits[kind] / n:6.1%})  {how or '-'}"
+              + (f"  WRONG OPTION {wrong[kind]}" if wrong[kind] else ""))
+    print(f"  match(): {per:.2f} µs mean over {len(samples)} inputs")
+
+
+def reprompt(args: argparse.Namespace) -> None:
+    from fake_bot_api import FakeBotAPI
+
+    fake = FakeBotAPI().start()
+    tmp = tempfile.mkdtemp(prefix="quiz-typed-")
+    os.environ.update(
+        TELEGRAM_BOT_TOKEN="typed",
+        TELEGRAM_API_BASE=fake.base_url,
+        FILE_ID_CACHE_PATH=os.path.join(tmp, "file_ids.json"),
+        DATA_DIR=tmp,
+        NEXT_DELAY_MS="0",
+        QUESTIONS_WATCH_SECS="0",
+        TG_RATE_LIMIT="0",
+        IMAGE_VARIANTS="0",
+    )
+    os.environ.pop("OWNER_CHAT_ID", None)
+    os.environ.pop("ADMIN_CHAT_IDS", None)
+    import app
+
+    chat = 3_000_001
+    ids = iter(range(1, 10**9))
+
+    def send(update: Dict[str, object]) -> None:
+        update["update_id"] = next(ids)
+        app.process_update(update)
+        app.outbox.drain(30)
+
+    def text(t: str) -> None:
+        send({"message": {"chat": {"id": chat}, "message_id": 1, "text": t}})
+
+    for step in ("START", "Team typed"):
+        text(step)
+    send({"callback_query": {"id": "cb", "data": "READY", "message": {"chat": {"id": chat}}}})
+    send({"callback_query": {"id": "cb", "data": "Start Timer", "message": {"chat": {"id": chat}}}})
+    q = app.current_question(app.sessions.get(chat))
+    fake.reset()
+    for _ in range(args.reprompts):
+        text("no idea 🤷")
+    calls = Counter(m for m, _ in fake.calls)
+    per = ", ".join(f"{m} {n / args.reprompts:.1f}" for m, n in sorted(calls.items()))
+    print(f"reprompt at Q{q.position + 1} (image: {bool(q.image)}): {per} per unmatched text, "
+          f"{fake.upload_bytes / args.reprompts / 1024:.0f} KiB uploaded per reprompt")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rounds", type=int, default=2000, help="inputs per variant kind")
+    ap.add_argument("--max-edits", type=int, default=2)
+    ap.add_argument("--reprompts", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    matching(args)
+    reprompt(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+from answers import AnswerIndex, build_answer_index
+from explanations import DeliveryCall, naive_call_count, plan_explanation
+
+
+HINT_BUTTON_DATA = "__HINT__"
+HINT_BUTTON_LABEL = "💡 Hint"
+PHOTO_BUTTON_DATA = "__PHOTO__"
+PHOTO_BUTTON_LABEL = "📷 Upload Photo"
+
+
+def is_visible(q: Mapping[str, Any]) -> bool:
+    """Visible if is_visible is True, else fallback to legacy display_question, default True."""
+    return bool(q.get("is_visible", q.get("display_question", True)))
+
+
+def has_hint(q: Mapping[str, Any]) -> bool:
+    """Return True if question has a non-empty hint or hint_image."""
+    ht = q.get("hint")
+    hi = q.get("hint_image")
+    ht_ok = isinstance(ht, str) and ht.strip() != ""
+    hi_ok = isinstance(hi, str) and hi.strip() != ""
+    return ht_ok or hi_ok
+
+
+def to_list(value: Any) -> List[str]:
+    """Normalize a value into a list of non-empty strings.
+    Accepts list[str] or str; returns [] for None/empty.
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value if str(v).strip()]
+    if isinstance(value, str):
+        v = value.strip()
+        return [v] if v else []
+    return []
+
+
+def build_inline_keyboard(options: List[str], include_hint: bool = False) -> Dict[str, Any]:
+    # One button per row for readability
+    keyboard = [[{"text": opt, "callback_data": opt}] for opt in options]
+    if include_hint:
+        # Add a dedicated hint button on its own row
+        keyboard.append([{"text": HINT_BUTTON_LABEL, "callback_data": HINT_BUTTON_DATA}])
+    return {"inline_keyboard": keyboard}
+
+
+def build_photo_keyboard(include_hint: bool = False) -> Dict[str, Any]:
+    keyboard = [[{"text": PHOTO_BUTTON_LABEL, "callback_data": PHOTO_BUTTON_DATA}]]
+    if include_hint:
+        keyboard.append([{"text": HINT_BUTTON_LABEL, "callback_data": HINT_BUTTON_DATA}])
+    return {"inline_keyboard": keyboard}
+
+
+def render_body(q: Mapping[str, Any], position: int, total: int) -> str:
+    """Header + optional italic intro + bold question, as shown to players."""
+    bold_q = f"<b>{q['question']}</b>"
+    header = f"<b>Question {position + 1}/{total}</b>"
+    intro = q.get("intro")
+    if intro:
+        lines = str(intro).splitlines()
+        if q.get("intro_blue"):
+            lines = [f"🔷 {ln}" if ln.strip() else "" for ln in lines]
+        intro_block = "<i>" + "\n".join(lines) + "</i>"
+        return f"{header}\n\n{intro_block}\n\n{bold_q}"
+    return f"{header}\n\n{bold_q}"
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledQuestion:
+    """A visible question with everything needed to present/answer it pre-rendered.
+    Shared across all sessions: treat reply_markup and the tuples as read-only.
+    """
+    position: int  # 0-based among visible questions
+    slot: int  # stable bit position for per-question session flags (see QuestionSlots)
+    qid: Any  # the `id` field from questions.json (None if absent)
+    raw: Mapping[str, Any]
+    image: str | None  # question_image / legacy image_url
+    body: str
+    reply_markup: Dict[str, Any]
+    expect_photo: bool
+    options: Tuple[str, ...]
+    answer_index: AnswerIndex  # typed text -> option (normalized, typo-tolerant)
+    answer: str | None
+    correct_text: str  # feedback line for a correct answer
+    wrong_text: str  # feedback line for a wrong answer (reveals the answer)
+    has_hint: bool
+    hint_text: str
+    hint_image: str
+    # Multi-step explanations, in send order: (image or None, "ℹ️ text" or None)
+    explanation_steps: Tuple[Tuple[str | None, str | None], ...]
+    # Text-only explanations (photo questions send these once after the first upload)
+    explanation_messages: Tuple[str, ...]
+    # explanation_steps coalesced into captions / media groups / merged messages
+    explanation_plan: Tuple[DeliveryCall, ...]
+    explanation_calls_saved: int
+
+    @property
+    def key(self) -> Any:
+        """Stable identity for per-question session flags: the `id`, else the position."""
+        return self.qid if self.qid is not None else self.position
+
+    def is_correct(self, selected: str) -> bool:
+        return selected == self.answer
+
+
+@dataclass(frozen=True, slots=True)
+class Catalog:
+    questions: Tuple[CompiledQuestion, ...]
+    by_id: Mapping[Any, CompiledQuestion]
+    version: int = 0
+
+    @property
+    def total(self) -> int:
+        return len(self.questions)
+
+    def get(self, position: int) -> CompiledQuestion | None:
+        if 0 <= position < len(self.questions):
+            return self.questions[position]
+        return None
+
+    def resolve(self, qid: Any) -> CompiledQuestion | None:
+        """Question for a pinned id; if it was hidden/removed, the first later visible one."""
+        q = self.by_id.get(qid)
+        if q is not None:
+            return q
+        for cand in self.questions:
+            try:
+                if cand.qid is not None and cand.qid > qid:
+                    return cand
+            except TypeError:
+                continue
+        return None
+
+
+def compile_question(
+    q: Mapping[str, Any], position: int, total: int, slot: int = 0, max_edits: int = 2
+) -> CompiledQuestion:
+    expect_photo = bool(q.get("expect_photo"))
+    hint = has_hint(q)
+    options: Tuple[str, ...] = tuple(q.get("options") or ()) if not expect_photo else ()
+    if expect_photo:
+        reply_markup = build_photo_keyboard(include_hint=hint)
+    else:
+        reply_markup = build_inline_keyboard(list(options), include_hint=hint)
+    answer = q.get("answer") if not expect_photo else None
+
+    img_list = to_list(q.get("explanation_images") or q.get("explanation_image"))
+    txt_list = to_list(q.get("explanations") or q.get("explanation"))
+    messages = tuple(f"ℹ️ {t}" for t in txt_list)
+    steps = tuple(
+        (img_list[i] if i < len(img_list) else None, messages[i] if i < len(messages) else None)
+        for i in range(max(len(img_list), len(txt_list)))
+    )
+    plan = plan_explanation(steps)
+    return CompiledQuestion(
+        position=position,
+        slot=slot,
+        qid=q.get("id"),
+        raw=q,
+        image=(q.get("question_image") or q.get("image_url")) or None,
+        body=render_body(q, position, total),
+        reply_markup=reply_markup,
+        expect_photo=expect_photo,
+        options=options,
+        answer_index=build_answer_index(options, max_edits),
+        answer=answer,
+        correct_text="✅ Correct!",
+        wrong_text=f"❌ Not quite. The correct answer is: <b>{answer}</b>",
+        has_hint=hint,
+        hint_text=(q.get("hint") or "").strip(),
+        hint_image=(q.get("hint_image") or "").strip(),
+        explanation_steps=steps,
+        explanation_messages=messages,
+        explanation_plan=plan,
+        explanation_calls_saved=naive_call_count(steps) - len(plan),
+    )
+
+
+# Stable bit positions for question keys (CompiledQuestion.key), used by the
+# session bitsets. Slots are only ever appended, so reordering, hiding or adding
+# questions on a hot reload never re-points an existing session's flags; the
+# table is persisted next to the session data so it also survives restarts.
+class QuestionSlots:
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        if path:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    self._slots = {str(k): int(v) for k, v in data.items()}
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[catalog] ignoring unreadable slot table {path}: {e}", flush=True)
+
+    def slot(self, key: Any) -> int:
+        name = json.dumps(key)
+        with self._lock:
+            slot = self._slots.get(name)
+            if slot is None:
+                slot = max(self._slots.values(), default=-1) + 1
+                self._slots[name] = slot
+                self._save()
+            return slot
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._slots, f, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def compile_catalog(
+    questions: List[Dict[str, Any]], version: int = 0, slots: QuestionSlots | None = None, max_edits: int = 2
+) -> Catalog:
+    """Build the immutable catalog of visible questions (validated by load_questions first).
+    max_edits caps the typos tolerated in typed answers (0 = normalized matches only)."""
+    slots = slots or QuestionSlots()
+    active = [q for q in questions if is_visible(q)]
+    compiled = tuple(
+        compile_question(q, i, len(active), slots.slot(q.get("id") if q.get("id") is not None else i), max_edits)
+        for i, q in enumerate(active)
+    )
+    by_id = {c.qid: c for c in compiled if c.qid is not None}
+    return Catalog(questions=compiled, by_id=by_id, version=version)
+
+
+# Polls questions.json for changes (mtime/size) and calls on_change from a
+# background thread. Polling keeps this dependency-free and works on Render's disk.
+class CatalogWatcher:
+    def __init__(self, path: str, on_change: Callable[[], None], interval: float = 5.0) -> None:
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._sig = self._signature()
+        self._thread: threading.Thread | None = None
+
+    def _signature(self) -> Tuple[int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._loop, name="catalog-watcher", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            sig = self._signature()
+            if sig is None or sig == self._sig:
+                continue
+            self._sig = sig
+            try:
+                self.on_change()
+            except Exception as e:
+                # Keep serving the previous catalog; editors can fix and save again
+                print(f"[catalog-watcher] reload rejected: {e}", flush=True)
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterator, List
+
+
+# Per-key (per-chat) locks: updates for one chat are serialized while unrelated
+# chats proceed in parallel. Entries are reference-counted and dropped when no
+# thread holds or waits on them, so the table doesn't grow with every chat seen.
+# on_acquire/on_release(key) run inside the lock at the outermost hold only.
+class KeyedLocks:
+    def __init__(
+        self,
+        on_acquire: Callable[[Hashable], None] | None = None,
+        on_release: Callable[[Hashable], None] | None = None,
+    ) -> None:
+        self._guard = threading.Lock()
+        self._locks: Dict[Hashable, List] = {}  # key -> [RLock, refcount, hold depth]
+        self._on_acquire = on_acquire
+        self._on_release = on_release
+
+    @contextmanager
+    def hold(self, key: Hashable) -> Iterator[None]:
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = [threading.RLock(), 0, 0]
+                self._locks[key] = entry
+            entry[1] += 1
+        lock = entry[0]
+        lock.acquire()
+        entry[2] += 1
+        try:
+            if entry[2] == 1 and self._on_acquire is not None:
+                self._on_acquire(key)
+            yield
+        finally:
+            entry[2] -= 1
+            try:
+                if entry[2] == 0 and self._on_release is not None:
+                    self._on_release(key)
+            finally:
+                lock.release()
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def __len__(self) -> int:
+        with self._guard:
+            return len(self._locks)
+
+
+# Bounded, time-limited set of recently seen ids (Telegram update_ids); the
+# oldest entries are evicted first once max_size or ttl_secs is exceeded.
+# Telegram re-delivers an update when the webhook is slow or errors; the first
+# delivery wins and later copies are dropped before touching any session.
+class RecentIds:
+    def __init__(self, max_size: int = 10000, ttl_secs: float = 3600.0) -> None:
+        self.max_size = max(1, max_size)
+        self.ttl_secs = ttl_secs
+        self._lock = threading.Lock()
+        self._seen: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def check_and_add(self, key: Hashable) -> bool:
+        """Record key; returns True if it was already seen (i.e. a duplicate)."""
+        now = time.monotonic()
+        with self._lock:
+            # Expire from the oldest end; entries are kept in insertion order
+            while self._seen:
+                oldest_key, ts = next(iter(self._seen.items()))
+                if now - ts <= self.ttl_secs:
+                    break
+                del self._seen[oldest_key]
+            if key in self._seen:
+                return True
+            self._seen[key] = now
+            if len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seen)
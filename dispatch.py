@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple
+
+ANY = "*"  # wildcard state/payload in Router rules
+
+# Typed commands and the payload token each normalizes to (compared upper-cased)
+TEXT_COMMANDS: Dict[str, str] = {
+    "/START": "start",
+    "START": "start",
+    "LEADERBOARD": "leaderboard",
+    "/LEADERBOARD": "leaderboard",
+    "READY": "ready",
+    "HINT": "hint",
+    "NEXT": "next",
+    "NEXT QUESTION": "next",
+    "NEXT_QUESTION": "next",
+    "START TIMER": "start_timer",
+    "START_TIMER": "start_timer",
+}
+# Keyboard labels sent back as callback data (compared upper-cased)
+CALLBACK_COMMANDS: Dict[str, str] = {
+    "READY": "ready",
+    "START TIMER": "start_timer",
+    "START_TIMER": "start_timer",
+}
+MESSAGE_PAYLOADS = ("photo", "empty", "text", *sorted(set(TEXT_COMMANDS.values())))
+CALLBACK_PAYLOADS = ("none", "answer", "next", "hint", "photo_button", *sorted(set(CALLBACK_COMMANDS.values())))
+
+
+# One incoming update, parsed once. Treat as read-only (not frozen=True only
+# because a frozen dataclass __init__ costs several times more per update).
+@dataclass(slots=True)
+class Update:
+    kind: str  # 'message' | 'callback_query' | 'other'
+    payload: str  # routing token: a command ('start', 'next', ...), 'photo', 'answer', 'text' or 'empty'
+    chat_id: int | None
+    text: str = ""  # stripped message text or raw callback data
+    callback_id: Any = None
+    file_id: str | None = None  # largest size of an attached photo
+    file_unique_id: str | None = None  # same for re-sends of that file
+
+
+def _chat_id(chat: Any) -> int | None:
+    try:
+        return int(chat["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def parse_update(update: Mapping[str, Any], buttons: Mapping[str, str]) -> Update:
+    """Read a raw Telegram update once. buttons maps exact callback data (e.g. the
+    Next/Hint/Upload Photo buttons) to payload tokens; other data is an answer."""
+    cq = update.get("callback_query")
+    if cq is not None:
+        data = cq.get("data")
+        chat_id = _chat_id((cq.get("message") or {}).get("chat"))
+        if not data or chat_id is None:
+            return Update("callback_query", "none", chat_id, callback_id=cq.get("id"))
+        data = str(data)
+        payload = buttons.get(data) or CALLBACK_COMMANDS.get(data.upper(), "answer")
+        return Update("callback_query", payload, chat_id, data, callback_id=cq.get("id"))
+    msg = update.get("message")
+    if msg is None:
+        return Update("other", "none", None)
+    chat_id = _chat_id(msg.get("chat"))
+    photos = msg.get("photo")
+    if photos:
+        return Update(
+            "message", "photo", chat_id, file_id=photos[-1].get("file_id"), file_unique_id=photos[-1].get("file_unique_id")
+        )
+    text = (msg.get("text") or "").strip()
+    if not text:
+        return Update("message", "empty", chat_id)
+    return Update("message", TEXT_COMMANDS.get(text.upper(), "text"), chat_id, text)
+
+
+Handler = Callable[..., None]
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    handler: Handler
+    session: bool  # handler takes the chat's session (created if missing)
+
+
+# Update router keyed on (session state, update kind, payload). Rules are
+# registered in priority order, first match wins (like an if/elif chain), and
+# are expanded up front into one dict over every known state x payload, so
+# resolving an update is a single lookup. States outside `states` only match
+# rules registered for ANY state.
+class Router:
+    def __init__(self, states: Iterable[Any], payloads: Mapping[str, Iterable[str]]) -> None:
+        self.states = tuple(states)
+        self.payloads = {kind: tuple(p) for kind, p in payloads.items()}
+        self._rules: List[Tuple[str, frozenset | None, frozenset | None, Route]] = []
+        self._table: Dict[Tuple[Any, str, str], Route] = {}
+
+    def on(self, kind: str, payloads: Any = ANY, states: Any = ANY, session: bool = True) -> Callable[[Handler], Handler]:
+        """Decorator registering a handler for update kind; payloads/states are a value, a tuple, or ANY."""
+        known = self.payloads[kind]
+        pset = None if payloads == ANY else frozenset((payloads,) if isinstance(payloads, str) else payloads)
+        sset = None if states == ANY else frozenset(states if isinstance(states, (tuple, list, set, frozenset)) else (states,))
+        if pset is not None and not pset <= set(known):
+            raise ValueError(f"unknown {kind} payloads: {sorted(pset - set(known))}")
+        if sset is not None and not sset <= set(self.states):
+            raise ValueError(f"unknown states: {sorted(map(str, sset - set(self.states)))}")
+
+        def register(handler: Handler) -> Handler:
+            self._rules.append((kind, pset, sset, Route(handler, session)))
+            self._compile()
+            return handler
+
+        return register
+
+    def _compile(self) -> None:
+        table: Dict[Tuple[Any, str, str], Route] = {}
+        for kind, known in self.payloads.items():
+            for state in (*self.states, ANY):
+                for payload in known:
+                    for rkind, pset, sset, route in self._rules:
+                        if rkind != kind or (pset is not None and payload not in pset):
+                            continue
+                        if sset is not None and state not in sset:
+                            continue
+                        table[(state, kind, payload)] = route
+                        break
+        self._table = table
+
+    def resolve(self, state: Any, kind: str, payload: str) -> Route | None:
+        route = self._table.get((state, kind, payload))
+        if route is None and state not in self.states:
+            route = self._table.get((ANY, kind, payload))
+        return route
+
+    def table(self) -> Dict[str, str]:
+        """Flattened routes for inspection: 'state/kind/payload' -> handler name."""
+        return {f"{s}/{k}/{p}": r.handler.__name__ for (s, k, p), r in self._table.items()}
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+
+# Telegram limits (characters)
+CAPTION_LIMIT = 1024
+MESSAGE_LIMIT = 4096
+MEDIA_GROUP_MAX = 10
+
+
+@dataclass(frozen=True, slots=True)
+class DeliveryCall:
+    """One Bot API call in an explanation delivery plan.
+    kind: "photo" (sendPhoto, optional caption), "album" (sendMediaGroup) or "text" (sendMessage).
+    """
+    kind: str
+    photos: Tuple[Tuple[str, str | None], ...] = ()  # (image, caption) in display order
+    text: str = ""
+
+
+def naive_call_count(steps: Sequence[Tuple[str | None, str | None]]) -> int:
+    """Calls needed to send every image and text separately (the original behaviour)."""
+    return sum((1 if img else 0) + (1 if txt else 0) for img, txt in steps)
+
+
+def plan_explanation(
+    steps: Sequence[Tuple[str | None, str | None]],
+    use_albums: bool = True,
+    caption_limit: int = CAPTION_LIMIT,
+    message_limit: int = MESSAGE_LIMIT,
+) -> Tuple[DeliveryCall, ...]:
+    """Coalesce image→text explanation steps into as few Bot API calls as possible.
+
+    - A text that directly follows its image becomes that image's caption when it fits.
+    - Consecutive photos (captioned or not) go out as one media group (2-10 items).
+    - Consecutive texts are merged into one message within the message limit.
+    The on-screen order stays image[0] → text[0] → image[1] → text[1] → …
+    """
+    # 1) Flatten into photo/text items, attaching captions where they fit
+    items: List[Tuple[str, str, str | None]] = []  # ("photo", img, caption) | ("text", txt, None)
+    for img, txt in steps:
+        if img and txt and len(txt) <= caption_limit:
+            items.append(("photo", img, txt))
+        else:
+            if img:
+                items.append(("photo", img, None))
+            if txt:
+                items.append(("text", txt, None))
+
+    # 2) Group runs of photos into albums and runs of texts into merged messages
+    calls: List[DeliveryCall] = []
+    for kind, value, caption in items:
+        last = calls[-1] if calls else None
+        if kind == "photo":
+            if (
+                use_albums
+                and last is not None
+                and last.kind in ("photo", "album")
+                and len(last.photos) < MEDIA_GROUP_MAX
+            ):
+                calls[-1] = DeliveryCall("album", last.photos + ((value, caption),))
+            else:
+                calls.append(DeliveryCall("photo", ((value, caption),)))
+        else:
+            if last is not None and last.kind == "text" and len(last.text) + 2 + len(value) <= message_limit:
+                calls[-1] = DeliveryCall("text", text=f"{last.text}\n\n{value}")
+            else:
+                calls.append(DeliveryCall("text", text=value))
+    return tuple(calls)
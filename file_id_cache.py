@@ -0,0 +1,73 @@
+import os
+import json
+import threading
+from typing import Dict, Any
+
+
+# Persistent cache of Telegram file_ids for local images.
+# Telegram returns a file_id after the first multipart upload; re-sending that id
+# avoids re-uploading multi-MB files for every team. Entries are keyed by the
+# project-relative path plus a content hash ("path#sha256", see assets.Asset.cache_key),
+# so editing an image invalidates it.
+class FileIdCache:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._entries = {str(k): str(v) for k, v in data.items() if v}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # A corrupt cache only costs re-uploads; start fresh
+            print(f"[file_id_cache] ignoring unreadable cache {self.path}: {e}", flush=True)
+
+    def _save(self) -> None:
+        # Write-then-rename so a crash never leaves a half-written cache
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=0, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, file_id: str) -> None:
+        rel = key.split("#", 1)[0]
+        with self._lock:
+            # Drop ids for older contents of the same path
+            for k in [k for k in self._entries if k.split("#", 1)[0] == rel and k != key]:
+                del self._entries[k]
+            self._entries[key] = file_id
+            try:
+                self._save()
+            except Exception as e:
+                print(f"[file_id_cache] save failed: {e}", flush=True)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return
+            try:
+                self._save()
+            except Exception as e:
+                print(f"[file_id_cache] save failed: {e}", flush=True)
+
+
+def largest_photo_file_id(resp_json: Dict[str, Any]) -> str | None:
+    """Extract the file_id of the largest PhotoSize from a sendPhoto response."""
+    result = resp_json.get("result") if isinstance(resp_json, dict) else None
+    photos = (result or {}).get("photo") or []
+    if not photos:
+        return None
+    return photos[-1].get("file_id")
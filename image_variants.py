@@ -0,0 +1,205 @@
+"""Telegram-optimized derivatives of the images in static/images.
+
+Telegram recompresses photos to ~1280px JPEG anyway, so uploading 1-4 MB originals
+only costs bandwidth and latency. This module writes size-capped JPEG variants to
+static/_tg/ with a manifest keyed by source path (content hash + stat signature),
+and resolves a source path to its variant at send time. Content authors keep
+editing the originals; stale or missing variants fall back to the original.
+
+Build ahead of time (e.g. in the Render build command):
+    python image_variants.py
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Set
+
+
+def _pillow() -> Any:
+    """(Image, ImageOps), imported on first build so startup doesn't pay for Pillow; None if missing."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # Pillow is optional; without it originals are sent as-is
+        return None
+    return Image, ImageOps
+
+
+MAX_SIDE = 1280
+JPEG_QUALITY = 85
+
+
+def collect_image_refs(questions: Iterable[Mapping[str, Any]], extra: Iterable[str] = ()) -> List[str]:
+    """Local image paths referenced by questions (any visibility) plus hard-coded ones."""
+    refs: Set[str] = set()
+
+    def add(val: Any) -> None:
+        if isinstance(val, str) and val.strip() and not val.startswith(("http://", "https://")):
+            refs.add(val.strip().lstrip("/"))
+        elif isinstance(val, list):
+            for v in val:
+                add(v)
+
+    for q in questions:
+        for key in ("question_image", "image_url", "hint_image", "explanation_images", "explanation_image"):
+            add(q.get(key))
+    for e in extra:
+        add(e)
+    return sorted(refs)
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ImageVariants:
+    def __init__(self, root: str, out_dir: str = "static/_tg", max_side: int = MAX_SIDE, quality: int = JPEG_QUALITY) -> None:
+        self.root = root
+        self.out_rel = out_dir.strip("/")
+        self.out_dir = os.path.join(root, self.out_rel)
+        self.manifest_path = os.path.join(self.out_dir, "manifest.json")
+        self.max_side = max_side
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.manifest: Dict[str, Dict[str, Any]] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[image_variants] ignoring unreadable manifest: {e}", flush=True)
+            return {}
+
+    def _save_manifest(self) -> None:
+        os.makedirs(self.out_dir, exist_ok=True)
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> List[int]:
+        return [st.st_mtime_ns, st.st_size]
+
+    def resolve(self, rel_path: str) -> str:
+        """Path to send for a source image: its variant if current, else the original."""
+        rel = rel_path.lstrip("/")
+        with self._lock:
+            entry = self.manifest.get(rel)
+        if not entry:
+            return rel
+        try:
+            if self._signature(os.stat(os.path.join(self.root, rel))) != entry.get("src_sig"):
+                return rel  # edited since the variant was built
+        except OSError:
+            return rel
+        return entry.get("variant") or rel
+
+    def build(self, refs: Iterable[str]) -> Dict[str, int]:
+        """Create/refresh variants for refs. Returns counts (built, fresh, skipped)."""
+        stats = {"built": 0, "fresh": 0, "skipped": 0}
+        pil = _pillow()
+        if pil is None:
+            print("[image_variants] Pillow not installed; sending original images", flush=True)
+            return stats
+        with self._build_lock:
+            changed = False
+            for rel in refs:
+                src = os.path.join(self.root, rel)
+                try:
+                    st = os.stat(src)
+                except OSError:
+                    stats["skipped"] += 1
+                    continue
+                with self._lock:
+                    entry = self.manifest.get(rel)
+                if entry and entry.get("src_sig") == self._signature(st) and os.path.exists(
+                    os.path.join(self.root, entry.get("variant") or rel)
+                ):
+                    stats["fresh"] += 1
+                    continue
+                try:
+                    new_entry = self._make_variant(rel, src, st, pil)
+                except Exception as e:
+                    print(f"[image_variants] {rel}: {e}", flush=True)
+                    stats["skipped"] += 1
+                    continue
+                with self._lock:
+                    old = self.manifest.get(rel)
+                    self.manifest[rel] = new_entry
+                if old and old.get("variant") not in (None, rel, new_entry["variant"]):
+                    try:
+                        os.remove(os.path.join(self.root, old["variant"]))
+                    except OSError:
+                        pass
+                stats["built"] += 1
+                changed = True
+            if changed:
+                with self._lock:
+                    self._save_manifest()
+        return stats
+
+    def _make_variant(self, rel: str, src: str, st: os.stat_result, pil: Any) -> Dict[str, Any]:
+        Image, ImageOps = pil
+        digest = _sha256(src)
+        stem = os.path.splitext(os.path.basename(rel))[0].replace(" ", "_")
+        out_rel = f"{self.out_rel}/{stem}.{digest[:12]}.jpg"
+        out_abs = os.path.join(self.root, out_rel)
+        os.makedirs(self.out_dir, exist_ok=True)
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white; JPEG has no alpha
+                im = im.convert("RGBA")
+                bg = Image.new("RGB", im.size, (255, 255, 255))
+                bg.paste(im, mask=im.split()[-1])
+                im = bg
+            elif im.mode != "RGB":
+                im = im.convert("RGB")
+            im.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            tmp = f"{out_abs}.tmp"
+            im.save(tmp, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            os.replace(tmp, out_abs)
+        out_bytes = os.path.getsize(out_abs)
+        variant = out_rel
+        if out_bytes >= st.st_size:
+            # Already small; keep sending the original
+            os.remove(out_abs)
+            variant, out_bytes = rel, st.st_size
+        return {
+            "sha256": digest,
+            "src_sig": self._signature(st),
+            "variant": variant,
+            "bytes": out_bytes,
+            "orig_bytes": st.st_size,
+        }
+
+    def build_async(self, refs: Iterable[str]) -> threading.Thread:
+        refs = list(refs)
+
+        def run() -> None:
+            stats = self.build(refs)
+            if stats["built"]:
+                print(f"[image_variants] {stats}", flush=True)
+
+        t = threading.Thread(target=run, name="image-variants", daemon=True)
+        t.start()
+        return t
+
+
+if __name__ == "__main__":
+    import app
+
+    variants = app.image_variants
+    result = variants.build(app.image_refs())
+    saved = sum(e["orig_bytes"] - e["bytes"] for e in variants.manifest.values())
+    print(f"{result}; {len(variants.manifest)} images in manifest, {saved / 1e6:.1f} MB smaller than originals")
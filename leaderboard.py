@@ -0,0 +1,163 @@
+import bisect
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Tuple
+
+RANK_POLICIES = ("first", "best")
+
+
+@dataclass(frozen=True, slots=True)
+class Result:
+    chat_id: int
+    team: str
+    score: int
+    total: int
+    active_secs: int  # timer_elapsed (paused while waiting on Next)
+    penalty_secs: int
+    total_secs: int  # active + penalties; the tie-breaker after score
+    hints: int
+    finished_at: float
+
+    @property
+    def sort_key(self) -> Tuple[Any, ...]:
+        # Higher score first, then faster total time, then whoever finished first
+        return (-self.score, self.total_secs, self.finished_at, self.chat_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# Rankings kept sorted as results arrive: one result per chat (team), held in a
+# list ordered by sort_key. With ranks="first" (the default) that is the chat's
+# first completed run: wrong answers reveal the correct one, so a replay would
+# otherwise always beat an honest first run. Replays are still recorded in the
+# file, just not ranked. ranks="best" keeps each chat's best run instead. A finish is one bisect + list insert; rank
+# lookups are a dict hit + bisect, and top-N is a slice — nothing re-sorts the
+# whole board per request. Finishes are appended to a JSONL file and replayed
+# on startup, so a restart keeps the board. With follow=True (several worker
+# processes sharing the file) reads first pick up lines other workers appended;
+# re-reading our own appends is harmless since an equal result never re-ranks.
+class Leaderboard:
+    def __init__(self, path: str | None = None, follow: bool = False, ranks: str = "first") -> None:
+        if ranks not in RANK_POLICIES:
+            raise ValueError(f"ranks must be one of {RANK_POLICIES}, got {ranks!r}")
+        self.path = path
+        self.ranks = ranks
+        self.follow = bool(path) and follow
+        self._offset = 0  # bytes of the file already ranked
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[Any, ...]] = []  # sorted sort_keys
+        self._results: List[Result] = []  # parallel to _keys
+        self._best: Dict[int, Result] = {}  # chat_id -> its ranked result
+        if path:
+            self._load()
+
+    def _load(self) -> None:
+        """Rank lines appended to the file since the last read. Caller holds the lock (or is __init__)."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # another process is mid-append; read it next time
+                    self._offset += len(line)
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._insert(Result(**json.loads(line)))
+                    except Exception as e:
+                        print(f"[leaderboard] skipping bad line: {e}", flush=True)
+        except FileNotFoundError:
+            pass
+
+    def _follow(self) -> None:
+        # Pick up finishes recorded by other worker processes (cheap stat when nothing changed)
+        if not self.follow:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size > self._offset:
+            self._load()
+
+    def _append(self, result: Result) -> None:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+
+    def _insert(self, result: Result) -> bool:
+        """Rank result if it is the chat's first (or, with ranks="best", better than its previous best).
+        Caller holds the lock (or is __init__)."""
+        prev = self._best.get(result.chat_id)
+        if prev is not None:
+            if self.ranks == "first" or prev.sort_key <= result.sort_key:
+                return False
+            i = bisect.bisect_left(self._keys, prev.sort_key)
+            del self._keys[i]
+            del self._results[i]
+        i = bisect.bisect_left(self._keys, result.sort_key)
+        self._keys.insert(i, result.sort_key)
+        self._results.insert(i, result)
+        self._best[result.chat_id] = result
+        return True
+
+    def record(
+        self,
+        chat_id: int,
+        team: str,
+        score: int,
+        total: int,
+        active_secs: float,
+        penalty_secs: int,
+        hints: int = 0,
+        finished_at: float | None = None,
+    ) -> Result:
+        """Store a finished run. Returns the result (ranked only if the policy picks it, see ranks)."""
+        active = int(max(0, active_secs))
+        result = Result(
+            chat_id=int(chat_id),
+            team=team,
+            score=int(score),
+            total=int(total),
+            active_secs=active,
+            penalty_secs=int(penalty_secs),
+            total_secs=active + int(penalty_secs),
+            hints=int(hints),
+            finished_at=finished_at if finished_at is not None else time.time(),
+        )
+        with self._lock:
+            self._follow()
+            self._insert(result)
+            if self.path:
+                try:
+                    self._append(result)
+                except OSError as e:
+                    print(f"[leaderboard] could not persist result for {chat_id}: {e}", flush=True)
+        return result
+
+    def top(self, n: int = 10) -> List[Tuple[int, Result]]:
+        """[(rank, result)] for the first n places (rank is 1-based)."""
+        with self._lock:
+            self._follow()
+            return list(enumerate(self._results[: max(0, n)], start=1))
+
+    def rank(self, chat_id: int) -> Tuple[int, Result] | None:
+        """(rank, ranked result) for a chat, or None if it hasn't finished."""
+        with self._lock:
+            self._follow()
+            result = self._best.get(chat_id)
+            if result is None:
+                return None
+            return bisect.bisect_left(self._keys, result.sort_key) + 1, result
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._follow()
+            return len(self._results)
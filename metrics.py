@@ -0,0 +1,154 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+# Minimal Prometheus-style registry (text exposition format 0.0.4), no dependency.
+# Counters and histograms are label-keyed dicts updated under one lock; gauges are
+# callbacks read at scrape time (session count, queue depths), so they cost
+# nothing between scrapes. With enabled=False every update is a single attribute
+# check, and callers can skip their timing code entirely via `registry.enabled`.
+
+# Seconds; covers fast in-process handling up to slow uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Counter:
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        if not self.registry.enabled:
+            return
+        with self.registry._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for lv, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.label_names, lv)} {_fmt_value(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (non-cumulative, last = +Inf), sum, count]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not self.registry.enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self.registry._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = s
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for lv, (counts, total, n) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="' + _fmt_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, lv, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.label_names, lv)} {total!r}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.label_names, lv)} {n}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time: a number, or {label_values: number}."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], object], labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label_names = tuple(labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            return lines + [f"# {self.name} unavailable: {_escape(str(e))}"]
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for lv, v in items:
+            lv = lv if isinstance(lv, tuple) else (lv,)
+            lines.append(f"{self.name}{_fmt_labels(self.label_names, lv)} {_fmt_value(v)}")
+        return lines
+
+
+class Registry:
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._metrics: List[object] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        m = Counter(self, name, help, labels)
+        self._metrics.append(m)
+        return m
+
+    def histogram(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        m = Histogram(self, name, help, labels, buckets)
+        self._metrics.append(m)
+        return m
+
+    def gauge(self, name: str, help: str, fn: Callable[[], object], labels: Sequence[str] = ()) -> Gauge:
+        m = Gauge(name, help, fn, labels)
+        self._metrics.append(m)
+        return m
+
+    def render(self) -> str:
+        """All metrics in Prometheus text format."""
+        lines: List[str] = []
+        # Gauge callbacks may take other locks; only hold ours while copying counters/histograms
+        for m in self._metrics:
+            if isinstance(m, Gauge):
+                lines.extend(m.render())
+            else:
+                with self._lock:
+                    lines.extend(m.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Tuple
+
+
+Job = Tuple[Callable[..., Any], tuple, dict]
+
+
+# Background send pipeline for Bot API calls.
+# Jobs are grouped into lanes (one per chat); a lane is processed by at most one
+# worker at a time so messages to a chat keep their order, while different
+# chats are served in parallel by the worker pool.
+# `delay_of(key)` (e.g. the rate limiter's per-chat check) is asked before a
+# lane's next job is taken: a lane that must wait is set aside until then, so
+# the worker moves on to another chat instead of blocking on that chat's pacing.
+class Outbox:
+    def __init__(
+        self, workers: int = 8, name: str = "outbox", delay_of: Callable[[Hashable], float] | None = None
+    ) -> None:
+        self.workers = max(0, int(workers))
+        self.name = name
+        self.delay_of = delay_of
+        self._lock = threading.Lock()
+        # Separate conditions so a drain() waiter never swallows a worker wakeup
+        self._cond = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._lanes: Dict[Hashable, Deque[Job]] = {}
+        self._ready: Deque[Hashable] = deque()
+        self._deferred: List[Tuple[float, int, Hashable]] = []  # heap of (due, seq, lane key)
+        self._seq = itertools.count()
+        self.deferrals = 0
+        self._pending = 0
+        self._threads: list[threading.Thread] = []
+        self._anon = 0
+
+    def _ensure_started(self) -> None:
+        # Threads start lazily so importing the app (or forking workers) stays cheap
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, key: Hashable | None, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """Queue fn(*args, **kwargs) on lane `key` (None = no ordering constraint)."""
+        if self.workers == 0:
+            # Synchronous mode (SEND_WORKERS=0): run inline, e.g. for debugging
+            self._run(fn, args, kwargs)
+            return
+        with self._cond:
+            if key is None:
+                self._anon += 1
+                key = ("_anon", self._anon)
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = deque()
+                self._lanes[key] = lane
+                self._ready.append(key)
+            lane.append((fn, args, kwargs))
+            self._pending += 1
+            self._ensure_started()
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """Block until every queued job has run. Returns False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def _run(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            name = getattr(fn, "__name__", repr(fn))
+            print(f"[{self.name}] {name} failed: {e}", flush=True)
+            traceback.print_exc()
+
+    def _next_lane(self) -> Hashable:
+        """Pop a lane whose next job may run now, waiting for one. Caller holds the lock."""
+        while True:
+            now = time.monotonic()
+            while self._deferred and self._deferred[0][0] <= now:
+                self._ready.append(heapq.heappop(self._deferred)[2])
+            while self._ready:
+                key = self._ready.popleft()
+                delay = 0.0
+                if self.delay_of is not None and not (isinstance(key, tuple) and key[:1] == ("_anon",)):
+                    try:
+                        delay = self.delay_of(key)
+                    except Exception as e:
+                        print(f"[{self.name}] delay check for {key} failed: {e}", flush=True)
+                if delay <= 0:
+                    if self._ready:
+                        self._cond.notify()  # more runnable lanes for the other workers
+                    return key
+                heapq.heappush(self._deferred, (now + delay, next(self._seq), key))
+                self.deferrals += 1
+            self._cond.wait(self._deferred[0][0] - now if self._deferred else None)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                key = self._next_lane()
+                fn, args, kwargs = self._lanes[key].popleft()
+            self._run(fn, args, kwargs)
+            with self._cond:
+                self._pending -= 1
+                if self._lanes[key]:
+                    # Requeue at the tail so one busy chat can't starve the others
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._lanes[key]
+                if self._pending == 0:
+                    self._idle.notify_all()
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+import requests
+
+from outbox import Outbox
+
+CHUNK_BYTES = 64 * 1024
+OUTCOMES = ("stored", "duplicate", "too_large", "disk_full", "dropped", "failed")
+
+
+class TooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class Submission:
+    id: int  # line number in index.jsonl (not stored), so ids agree across processes
+    chat_id: int
+    team: str
+    qid: Any  # question key (CompiledQuestion.key)
+    question: int  # 1-based position when submitted, for display
+    sha256: str
+    bytes: int
+    file_id: str
+    submitted_at: float
+
+    @property
+    def name(self) -> str:
+        """Stored file name: content-addressed, so identical photos share one file."""
+        return f"{self.sha256}.jpg"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# Local archive of photo-question uploads, so submissions outlive the event.
+# submit() only queues; a small worker pool (its own Outbox) resolves getFile,
+# streams the file to disk in CHUNK_BYTES pieces while hashing it, and appends a
+# Submission to index.jsonl. Files are stored once per content hash under
+# <root>/<sha[:2]>/, and a (chat, question, hash) seen before is not indexed
+# again, so re-uploads and re-forwards cost at most one download. Work is
+# bounded: at most `workers` downloads at a time, `max_pending` queued (extra
+# submissions are dropped and counted), `max_file_bytes` per file and
+# `max_total_bytes` on disk (space is reserved before a download starts). The
+# index is replayed on startup and followed like the leaderboard, so worker
+# processes sharing DATA_DIR see each other's submissions.
+class PhotoArchive:
+    def __init__(
+        self,
+        root: str,
+        call: Callable[..., requests.Response],
+        download: Callable[[str], requests.Response],
+        workers: int = 2,
+        max_pending: int = 200,
+        max_file_bytes: int = 20 * 1024 * 1024,
+        max_total_bytes: int = 2 * 1024 ** 3,
+    ) -> None:
+        self.root = root
+        self.index_path = os.path.join(root, "index.jsonl")
+        self.call = call
+        self.download = download
+        self.max_pending = max_pending
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.outbox = Outbox(workers=workers, name="photos")
+        self._lock = threading.Lock()
+        self._items: List[Submission] = []
+        self._seen: Set[Tuple[int, str, str]] = set()  # (chat_id, str(qid), sha256)
+        self._sizes: Dict[str, int] = {}  # sha256 -> bytes on disk
+        self._seen_files: Set[str] = set()  # "chat:qid:file_unique_id" queued or archived
+        self._offset = 0
+        self._used = 0  # bytes stored + reserved by running downloads
+        self.counts: Dict[str, int] = {k: 0 for k in OUTCOMES}
+        os.makedirs(root, exist_ok=True)
+        with self._lock:
+            self._follow()
+
+    def _follow(self) -> None:
+        """Index lines appended since the last read (by this or another process)."""
+        try:
+            size = os.path.getsize(self.index_path)
+        except OSError:
+            return
+        if size <= self._offset:
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial append in progress
+                self._offset += len(line)
+                try:
+                    sub = Submission(id=len(self._items) + 1, **json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                self._add(sub)
+
+    def _add(self, sub: Submission) -> None:
+        self._items.append(sub)
+        self._seen.add((sub.chat_id, str(sub.qid), sub.sha256))
+        if sub.sha256 not in self._sizes:
+            self._sizes[sub.sha256] = sub.bytes
+            self._used += sub.bytes
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.jpg")
+
+    def submit(
+        self, chat_id: int, team: str, qid: Any, question: int, file_id: str, file_unique_id: str | None = None
+    ) -> bool:
+        """Queue a photo for archiving; False if it was skipped (already handled or queue full)."""
+        key = f"{chat_id}:{qid}:{file_unique_id}" if file_unique_id else None
+        with self._lock:
+            if key is not None:
+                if key in self._seen_files:
+                    self.counts["duplicate"] += 1
+                    return False
+                self._seen_files.add(key)
+            if self.outbox.pending() >= self.max_pending:
+                self.counts["dropped"] += 1
+                if key is not None:
+                    self._seen_files.discard(key)
+                print(f"[photos] queue full, not archiving a photo from {chat_id}", flush=True)
+                return False
+        self.outbox.submit(None, self._archive, key, chat_id, team, qid, question, file_id)
+        return True
+
+    def _reserve(self, size: int) -> bool:
+        with self._lock:
+            if self._used + size > self.max_total_bytes:
+                return False
+            self._used += size
+            return True
+
+    def _release(self, size: int) -> None:
+        with self._lock:
+            self._used -= size
+
+    def _archive(self, key: str | None, chat_id: int, team: str, qid: Any, question: int, file_id: str) -> None:
+        outcome = "failed"
+        try:
+            outcome = self._fetch(chat_id, team, qid, question, file_id)
+        except Exception as e:
+            print(f"[photos] archiving {file_id} from {chat_id} failed: {e}", flush=True)
+        with self._lock:
+            self.counts[outcome] += 1
+            if key is not None and outcome not in ("stored", "duplicate"):
+                # Not archived (error, no space, ...): a re-send of this file gets another try
+                self._seen_files.discard(key)
+
+    def _fetch(self, chat_id: int, team: str, qid: Any, question: int, file_id: str) -> str:
+        resp = self.call("getFile", json={"file_id": file_id}, timeout=15)
+        resp.raise_for_status()
+        info = resp.json().get("result") or {}
+        file_path = info.get("file_path")
+        if not file_path:
+            raise RuntimeError("getFile returned no file_path")
+        declared = int(info.get("file_size") or 0)
+        if declared > self.max_file_bytes:
+            return "too_large"
+        # Reserve the declared size (or the per-file cap when unknown) before writing
+        reserved = declared or self.max_file_bytes
+        if not self._reserve(reserved):
+            if not self.counts["disk_full"]:
+                print(f"[photos] archive full ({self.max_total_bytes} bytes), not storing more photos", flush=True)
+            return "disk_full"
+        tmp = os.path.join(self.root, f".{file_id[-32:]}.{threading.get_ident()}.part")
+        size = 0
+        try:
+            digest = hashlib.sha256()
+            with self.download(file_path) as body, open(tmp, "wb") as out:
+                body.raise_for_status()
+                for chunk in body.iter_content(CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > reserved:
+                        raise TooLarge()
+                    digest.update(chunk)
+                    out.write(chunk)
+            sha = digest.hexdigest()
+            with self._lock:
+                self._follow()
+                if (chat_id, str(qid), sha) in self._seen:
+                    return "duplicate"
+                dest = self.path_for(sha)
+                if sha not in self._sizes:
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    os.replace(tmp, dest)
+                record = {
+                    "chat_id": chat_id,
+                    "team": team,
+                    "qid": qid,
+                    "question": question,
+                    "sha256": sha,
+                    "bytes": size,
+                    "file_id": file_id,
+                    "submitted_at": round(time.time(), 3),
+                }
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line)  # one O_APPEND write: lines from several processes never interleave
+                finally:
+                    os.close(fd)
+                self._follow()
+            return "stored"
+        except TooLarge:
+            return "too_large"
+        finally:
+            self._release(reserved)  # _follow() counted the stored file's real size
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def page(
+        self, offset: int = 0, limit: int = 50, chat_id: int | None = None, qid: Any = None
+    ) -> Tuple[List[Submission], int]:
+        """Submissions oldest first, optionally for one chat and/or question: (page, total matching)."""
+        with self._lock:
+            self._follow()
+            items = self._items
+            if chat_id is not None or qid is not None:
+                items = [
+                    s for s in items
+                    if (chat_id is None or s.chat_id == chat_id) and (qid is None or str(s.qid) == str(qid))
+                ]
+            return items[offset : offset + limit], len(items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._follow()
+            return {
+                "submissions": len(self._items),
+                "files": len(self._sizes),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_total_bytes,
+                "pending": self.outbox.pending(),
+                **self.counts,
+            }
+
+    def drain(self, timeout: float | None = None) -> bool:
+        return self.outbox.drain(timeout)
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from tg_client import BotAPIClient
+
+
+# Long-polling ingress (getUpdates) as an alternative to the /telegram webhook.
+# Each batch is grouped by chat: chats are handled concurrently on a thread pool,
+# updates within a chat strictly in order. Progress is persisted after every
+# handled update: the offset of the first update in the batch not yet handled,
+# plus the ids after it that are done (chats finish out of order). A restart after
+# a crash mid-batch therefore skips what was handled instead of replaying it.
+class UpdatePoller:
+    def __init__(
+        self,
+        client: BotAPIClient,
+        handle: Callable[[Dict[str, Any]], None],
+        chat_of: Callable[[Dict[str, Any]], Any],
+        offset_path: str,
+        batch_size: int = 100,
+        poll_timeout: int = 30,
+        workers: int = 8,
+        allowed_updates: List[str] | None = None,
+    ) -> None:
+        self.client = client
+        self.handle = handle
+        self.chat_of = chat_of
+        self.offset_path = offset_path
+        self.batch_size = max(1, min(100, batch_size))  # Telegram caps limit at 100
+        self.poll_timeout = poll_timeout
+        self.allowed_updates = allowed_updates or ["message", "callback_query"]
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="poll")
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._batch: List[int] = []  # update_ids of the batch being handled, ascending
+        self.skipped = 0  # re-fetched updates already handled before a restart
+        self.offset, self._done = self._load_offset()
+
+    def _load_offset(self) -> Tuple[int | None, Set[int]]:
+        try:
+            with open(self.offset_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data["offset"]), {int(i) for i in data.get("done") or ()}
+        except FileNotFoundError:
+            return None, set()
+        except Exception as e:
+            print(f"[polling] ignoring unreadable offset file {self.offset_path}: {e}", flush=True)
+            return None, set()
+
+    def _save_offset(self, sync: bool = True) -> None:
+        folder = os.path.dirname(self.offset_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = f"{self.offset_path}.tmp.{threading.get_ident()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            done = sorted(i for i in self._done if self.offset is None or i > self.offset)
+            json.dump({"offset": self.offset, "done": done}, f)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.offset_path)
+
+    def _handled(self, update_id: int) -> None:
+        # Per update: no fsync (a process crash keeps the page cache; the batch end syncs)
+        with self._lock:
+            self._done.add(update_id)
+            pending = [i for i in self._batch if i not in self._done]
+            if pending:
+                self.offset = pending[0]
+            self._save_offset(sync=False)
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        payload: Dict[str, Any] = {
+            "limit": self.batch_size,
+            "timeout": self.poll_timeout,
+            "allowed_updates": self.allowed_updates,
+        }
+        if self.offset is not None:
+            payload["offset"] = self.offset
+        # Read timeout must outlast the server-side long poll
+        resp = self.client.call("getUpdates", json=payload, timeout=self.poll_timeout + 10)
+        resp.raise_for_status()
+        return list(resp.json().get("result") or [])
+
+    def dispatch(self, updates: List[Dict[str, Any]]) -> None:
+        """Handle a batch: chats in parallel, each chat's updates sequentially."""
+        with self._lock:
+            fresh = [u for u in updates if int(u["update_id"]) not in self._done]
+            self.skipped += len(updates) - len(fresh)
+            self._batch = sorted(int(u["update_id"]) for u in updates)
+        by_chat: Dict[Any, List[Dict[str, Any]]] = {}
+        for u in sorted(fresh, key=lambda u: u.get("update_id", 0)):
+            by_chat.setdefault(self.chat_of(u), []).append(u)
+        futures = [self._pool.submit(self._run_chat, group) for group in by_chat.values()]
+        for fut in futures:
+            fut.result()
+
+    def _run_chat(self, group: List[Dict[str, Any]]) -> None:
+        for u in group:
+            try:
+                self.handle(u)
+            except Exception as e:
+                # One bad update must not block the offset (it would be re-fetched forever)
+                print(f"[polling] update {u.get('update_id')} failed: {e}", flush=True)
+            self._handled(int(u["update_id"]))
+
+    def poll_once(self) -> int:
+        updates = self.fetch()
+        if not updates:
+            return 0
+        self.dispatch(updates)
+        with self._lock:
+            self.offset = max(int(u["update_id"]) for u in updates) + 1
+            self._done.clear()
+            self._batch = []
+            self._save_offset()
+        return len(updates)
+
+    def run_forever(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                backoff = 1.0
+            except Exception as e:
+                print(f"[polling] getUpdates failed: {e}; retrying in {backoff:.0f}s", flush=True)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def start(self) -> threading.Thread:
+        t = threading.Thread(target=self.run_forever, name="poller", daemon=True)
+        t.start()
+        return t
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+
+# Priority order of send lanes: a lower lane only takes a global token when no
+# higher lane is waiting for one
+LANES = ("user", "admin")
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`. Not thread-safe (RateLimiter locks)."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp", "blocked_until")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.stamp = now
+        self.blocked_until = 0.0  # set by a 429: no tokens before this time
+
+    def wait(self, now: float, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available (0 = now)."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float = 1.0) -> None:
+        self.tokens -= cost
+
+
+# Client-side pacing for Bot API sends, so bursts (every team tapping READY at
+# once) queue briefly here instead of coming back as 429s. A send needs a token
+# from its chat's bucket and from the global bucket; callers block in acquire()
+# until both have one. A bucket lets through at most burst + rate messages in any
+# second, so the global defaults stay under Telegram's ~30/s. Private chats and
+# groups have separate per-chat rates (Telegram allows about 1 message/s per chat
+# and 20/min per group). Lanes set who gets global tokens first, so admin fan-out
+# never delays players. Chat buckets are kept in an LRU capped at max_chats; a
+# dropped bucket comes back full.
+class RateLimiter:
+    def __init__(
+        self,
+        global_rate: float = 25.0,
+        global_burst: float = 5.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        group_burst: float = 3.0,
+        max_chats: int = 10000,
+        lanes: Iterable[str] = LANES,
+        on_wait: Callable[[str, float], None] | None = None,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_chats = max_chats
+        self.lanes = tuple(lanes)
+        self.on_wait = on_wait
+        self._cond = threading.Condition(threading.Lock())
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._chats: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._queued: Dict[str, int] = {lane: 0 for lane in self.lanes}  # threads inside acquire()
+        self._starved: Dict[str, int] = {lane: 0 for lane in self.lanes}  # ... with a chat token, waiting on global
+        self._stats: Dict[str, Dict[str, float]] = {
+            lane: {"sends": 0, "waited": 0, "wait_secs": 0.0, "max_wait_secs": 0.0} for lane in self.lanes
+        }
+        self._penalties = 0
+
+    def _chat(self, chat_id: Hashable, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            group = isinstance(chat_id, int) and chat_id < 0
+            bucket = TokenBucket(
+                self.group_rate if group else self.chat_rate,
+                self.group_burst if group else self.chat_burst,
+                now,
+            )
+            self._chats[chat_id] = bucket
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _outranked(self, lane: str) -> bool:
+        for other in self.lanes:
+            if other == lane:
+                return False
+            if self._starved[other]:
+                return True
+        return False
+
+    def acquire(self, chat_id: Hashable | None, lane: str = "user", cost: float = 1.0) -> float:
+        """Block until chat_id (None = global only) may send `cost` messages; returns seconds waited."""
+        t0 = time.monotonic()
+        starved = False
+        with self._cond:
+            self._queued[lane] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    chat = self._chat(chat_id, now) if chat_id is not None else None
+                    delay = chat.wait(now, min(cost, chat.burst)) if chat is not None else 0.0
+                    if delay <= 0:
+                        delay = self._global.wait(now, min(cost, self._global.burst))
+                        if delay <= 0 and not self._outranked(lane):
+                            if chat is not None:
+                                chat.take(min(cost, chat.burst))
+                            self._global.take(min(cost, self._global.burst))
+                            break
+                        if not starved:
+                            starved = True
+                            self._starved[lane] += 1
+                        # Outranked with tokens available: recheck when the higher lane is served
+                        delay = delay or 1 / self._global.rate
+                    self._cond.wait(delay)
+            finally:
+                if starved:
+                    self._starved[lane] -= 1
+                self._queued[lane] -= 1
+                self._cond.notify_all()
+            waited = time.monotonic() - t0
+            st = self._stats[lane]
+            st["sends"] += 1
+            if waited > 0.001:
+                st["waited"] += 1
+                st["wait_secs"] += waited
+                st["max_wait_secs"] = max(st["max_wait_secs"], waited)
+        if self.on_wait is not None:
+            self.on_wait(lane, waited)
+        return waited
+
+    def chat_delay(self, chat_id: Hashable, cost: float = 1.0) -> float:
+        """Seconds until chat_id's own bucket has `cost` tokens (0 = now). Takes nothing;
+        lets the outbox hold a chat's lane back instead of a worker blocking in acquire()."""
+        with self._cond:
+            now = time.monotonic()
+            chat = self._chat(chat_id, now)
+            return chat.wait(now, min(cost, chat.burst))
+
+    def penalize(self, chat_id: Hashable | None, secs: float) -> None:
+        """Telegram answered 429 with retry_after=secs: hold back that chat (or everything)."""
+        with self._cond:
+            now = time.monotonic()
+            bucket = self._chat(chat_id, now) if chat_id is not None else self._global
+            bucket.blocked_until = max(bucket.blocked_until, now + secs)
+            bucket.tokens = 0.0
+            self._penalties += 1
+
+    def depth(self) -> Dict[str, int]:
+        """Threads currently waiting for tokens, per lane."""
+        with self._cond:
+            return dict(self._queued)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            lanes = {lane: {**st, "queued": self._queued[lane]} for lane, st in self._stats.items()}
+            return {
+                "lanes": lanes,
+                "chats_tracked": len(self._chats),
+                "penalties_429": self._penalties,
+                "global_tokens": round(self._global.tokens, 2),
+            }
+
+
+def send_target(method: str, kwargs: Dict[str, Any]) -> Tuple[Any, int] | None:
+    """(chat_id, message count) for a Bot API call that posts to a chat, else None
+    (answerCallbackQuery, sendChatAction, getFile, webhook calls ... are not paced)."""
+    if not method.startswith(("send", "edit", "forward", "copy")) or method == "sendChatAction":
+        return None
+    payload = kwargs.get("json") or kwargs.get("data") or {}
+    chat_id = payload.get("chat_id")
+    try:
+        chat_id = int(chat_id)
+    except (TypeError, ValueError):
+        pass
+    cost = 1
+    if method == "sendMediaGroup":
+        media = payload.get("media")
+        if isinstance(media, str):
+            # Each album item counts as a message; the JSON is a list of objects
+            cost = max(1, media.count('"type"'))
+        elif isinstance(media, list):
+            cost = max(1, len(media))
+    return chat_id, cost
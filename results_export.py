@@ -0,0 +1,271 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterator, List, Protocol, Tuple
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None  # type: ignore[assignment]
+
+
+# Durable outbox for finish results. finalize_quiz only appends a JSON line to a
+# local log (fast, no network); a background thread reads from a persisted byte
+# cursor and delivers batches to the configured sink, retrying with exponential
+# backoff. The cursor advances only after the sink accepts a batch, so results
+# survive restarts and outages (delivery is at-least-once; each record carries
+# a stable "id" for de-duplication on the receiving side).
+# Several worker processes may share one log: appends, tail repair and
+# compaction take an flock on the file, and `leader` (a lease check) picks the
+# single process that delivers; a new leader re-reads the persisted cursor.
+
+
+@contextmanager
+def _locked(f: IO[Any]) -> Iterator[None]:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ResultsSink(Protocol):
+    name: str
+
+    def deliver(self, records: List[Dict[str, Any]]) -> None:
+        """Deliver a batch or raise; raising leaves the batch queued for retry."""
+
+
+class WebhookSink:
+    """POST {"results": [...]} as JSON (Zapier/Make/Apps Script web app/any HTTPS endpoint)."""
+
+    def __init__(self, url: str, timeout: float = 15.0) -> None:
+        self.url = url
+        self.name = "webhook"
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def deliver(self, records: List[Dict[str, Any]]) -> None:
+        resp = self._session.post(self.url, json={"results": records}, timeout=self.timeout)
+        resp.raise_for_status()
+
+
+class AirtableSink:
+    """Append rows via the Airtable REST API (max 10 records per request)."""
+
+    API_BASE = "https://api.airtable.com/v0"
+
+    def __init__(self, api_key: str, base_id: str, table: str, timeout: float = 15.0) -> None:
+        self.url = f"{self.API_BASE}/{base_id}/{requests.utils.quote(table, safe='')}"
+        self.name = "airtable"
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def deliver(self, records: List[Dict[str, Any]]) -> None:
+        # Not atomic across chunks: a retry after a partial failure may re-add rows
+        for i in range(0, len(records), 10):
+            chunk = [{"fields": r} for r in records[i : i + 10]]
+            resp = self._session.post(self.url, json={"records": chunk, "typecast": True}, timeout=self.timeout)
+            resp.raise_for_status()
+
+
+class ResultsOutbox:
+    def __init__(
+        self,
+        log_path: str,
+        sink: ResultsSink,
+        batch_size: int = 20,
+        interval: float = 2.0,
+        max_backoff: float = 300.0,
+        compact_bytes: int = 1 << 20,
+        leader: Callable[[], bool] | None = None,
+    ) -> None:
+        self.log_path = log_path
+        self.cursor_path = f"{log_path}.cursor"
+        self.sink = sink
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.compact_bytes = compact_bytes
+        self.leader = leader
+        self.leading = leader is None
+        self.last_error: str | None = None
+        self.delivered = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        folder = os.path.dirname(log_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._repair_tail()
+        self.cursor = self._load_cursor()
+
+    def _repair_tail(self) -> None:
+        # A crash mid-append can leave a partial last line; drop it so the next append starts clean
+        try:
+            with open(self.log_path, "rb+") as f, _locked(f):
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+                    print(f"[results] dropped a partial record at the end of {self.log_path}", flush=True)
+        except FileNotFoundError:
+            pass
+
+    def _load_cursor(self) -> int:
+        try:
+            with open(self.cursor_path, "r", encoding="utf-8") as f:
+                cursor = int(json.load(f)["offset"])
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"[results] unreadable cursor {self.cursor_path}, resending from start: {e}", flush=True)
+            return 0
+        try:
+            size = os.path.getsize(self.log_path)
+        except OSError:
+            size = 0
+        return cursor if 0 <= cursor <= size else 0
+
+    def _save_cursor(self, offset: int) -> None:
+        tmp = f"{self.cursor_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.cursor_path)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Durably queue one record (fsynced before returning) and wake the flusher."""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.log_path, "a", encoding="utf-8") as f, _locked(f):
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        self._wake.set()
+
+    def _read_batch(self) -> Tuple[List[Dict[str, Any]], int]:
+        """Up to batch_size complete records after the cursor, and the offset just past them."""
+        records: List[Dict[str, Any]] = []
+        with self._lock:
+            try:
+                f = open(self.log_path, "rb")
+            except FileNotFoundError:
+                return records, self.cursor
+            with f:
+                f.seek(self.cursor)
+                offset = self.cursor
+                while len(records) < self.batch_size:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break  # EOF (or a line still being written)
+                    offset += len(line)
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError as e:
+                        print(f"[results] skipping corrupt record at byte {offset - len(line)}: {e}", flush=True)
+        return records, offset
+
+    def _compact(self) -> None:
+        # Everything is delivered and the log is large: start a fresh one
+        with self._lock:
+            if self.cursor < self.compact_bytes:
+                return
+            with open(self.log_path, "rb+") as f, _locked(f):
+                if os.fstat(f.fileno()).st_size != self.cursor:
+                    return
+                f.truncate(0)
+                self.cursor = 0
+                self._save_cursor(0)
+
+    def flush_once(self) -> int:
+        """Deliver one batch. Returns records delivered (0 if idle); raises on sink failure."""
+        records, offset = self._read_batch()
+        if offset == self.cursor:
+            return 0
+        if records:
+            self.sink.deliver(records)
+        with self._lock:
+            self.cursor = offset
+            self._save_cursor(offset)
+        self.delivered += len(records)
+        self._compact()
+        return len(records)
+
+    def pending(self) -> int:
+        """Records appended but not yet delivered (reads the log tail)."""
+        with self._lock:
+            try:
+                with open(self.log_path, "rb") as f:
+                    f.seek(self.cursor)
+                    return sum(1 for line in f if line.endswith(b"\n"))
+            except FileNotFoundError:
+                return 0
+
+    def run_forever(self) -> None:
+        backoff = self.interval
+        while not self._stop.is_set():
+            if self.leader is not None:
+                if not self.leader():
+                    self.leading = False
+                    self._stop.wait(self.interval)
+                    continue
+                if not self.leading:
+                    # Taking over from another process: continue from its cursor
+                    with self._lock:
+                        self.cursor = self._load_cursor()
+                    self.leading = True
+            try:
+                sent = self.flush_once()
+                if sent:
+                    self.last_error = None
+                    backoff = self.interval
+                    continue  # keep draining while there is a backlog
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[results] {self.sink.name} delivery failed: {e}; retrying in {backoff:.0f}s", flush=True)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self) -> threading.Thread:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name="results-export", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sink": self.sink.name,
+            "pending": self.pending(),
+            "delivered": self.delivered,
+            "leading": self.leading,
+            "last_error": self.last_error,
+        }
+
+
+def make_results_sink(
+    webhook_url: str | None,
+    airtable_api_key: str | None = None,
+    airtable_base_id: str | None = None,
+    airtable_table: str | None = None,
+) -> ResultsSink | None:
+    """RESULTS_WEBHOOK_URL wins; otherwise Airtable if fully configured; else no export."""
+    if webhook_url:
+        return WebhookSink(webhook_url)
+    if airtable_api_key and airtable_base_id and airtable_table:
+        return AirtableSink(airtable_api_key, airtable_base_id, airtable_table)
+    return None
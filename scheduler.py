@@ -0,0 +1,73 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from typing import Any, Callable, List, Tuple
+
+from outbox import Outbox
+
+
+# Timer facility for paced/sequenced work ("typing…, then the next question in 1s").
+# A single background thread sleeps until the earliest due callback; no request
+# or send worker is held while waiting. Due callbacks run on a small pool of
+# `workers` threads, so one that waits on a chat lock (or a slow write) doesn't
+# hold up the others; workers=0 runs them on the timer thread itself.
+class Scheduler:
+    def __init__(self, name: str = "scheduler", workers: int = 0) -> None:
+        self.name = name
+        self._pool = Outbox(workers=workers, name=f"{name}-run")
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._heap: List[Tuple[float, int, Callable[..., Any], tuple, dict]] = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._thread: threading.Thread | None = None
+
+    def call_later(self, delay: float, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """Run fn(*args, **kwargs) after `delay` seconds (on the pool, or the timer thread)."""
+        due = time.monotonic() + max(0.0, float(delay))
+        with self._lock:
+            heapq.heappush(self._heap, (due, next(self._seq), fn, args, kwargs))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._heap) + self._running
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """Block until every scheduled callback has run. Returns False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._heap and not self._running, timeout=timeout)
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                _, _, fn, args, kwargs = heapq.heappop(self._heap)
+                self._running += 1
+            self._pool.submit(None, self._run, fn, args, kwargs)
+
+    def _run(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            name = getattr(fn, "__name__", repr(fn))
+            print(f"[{self.name}] {name} failed: {e}", flush=True)
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self._running -= 1
+                if not self._heap and not self._running:
+                    self._idle.notify_all()
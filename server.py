@@ -0,0 +1,93 @@
+"""Process entry point: `python server.py` (the Render start command).
+
+Kept import-light on purpose. Under gunicorn the master process never imports the
+app: it binds the port and forks WEB_WORKERS workers, and each worker imports
+`app` (from its precompiled .pyc) after the fork, so pools, threads and database
+connections are its own. `python app.py` still works, but Python compiles a
+script run as __main__ from source and the master initialises a copy of the app
+it never uses, which the first webhook after a cold start waits for.
+"""
+import importlib
+import os
+import sys
+from types import ModuleType
+from typing import Any
+
+# WEB_WORKERS processes x WEB_THREADS threads under gunicorn
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "1"))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "8"))
+
+
+def polling_requested() -> bool:
+    """BOT_MODE=polling or --poll: ingress via getUpdates, in a single process."""
+    return "--poll" in sys.argv[1:] or os.environ.get("BOT_MODE", "webhook").lower() == "polling"
+
+
+def worker_processes() -> int:
+    """Processes that will serve the bot: WEB_WORKERS, or 1 when polling (see serve)."""
+    return 1 if polling_requested() else max(1, WEB_WORKERS)
+
+
+def serve(port: int, polling: bool = False, quiz: ModuleType | None = None) -> None:
+    """Run the HTTP server. With gunicorn installed (WEB_SERVER=auto|gunicorn) that is
+    WEB_WORKERS processes x WEB_THREADS threads; otherwise Flask's threaded dev server.
+    quiz is the already-imported app module when started as `python app.py`.
+    """
+    server = os.environ.get("WEB_SERVER", "auto").strip().lower()
+    workers = WEB_WORKERS
+    if polling and workers > 1:
+        # getUpdates allows one consumer per bot; keep ingress in this process
+        print("[server] polling mode runs a single worker process", flush=True)
+        workers = 1
+    if server != "dev" and not polling:
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            if server == "gunicorn":
+                raise
+            BaseApplication = None
+        if BaseApplication is not None:
+            options = {
+                "bind": f"0.0.0.0:{port}",
+                "workers": max(1, workers),
+                "threads": max(1, WEB_THREADS),
+                "worker_class": "gthread" if WEB_THREADS > 1 else "sync",
+                "timeout": int(os.environ.get("WEB_TIMEOUT_SECS", "30")),
+                "graceful_timeout": 10,
+                "accesslog": None,
+            }
+            if options["workers"] > 1:
+                # Import the heavy libraries once in the master; forked workers share them
+                import flask  # noqa: F401
+                import requests  # noqa: F401
+
+            class QuizServer(BaseApplication):  # type: ignore[misc, valid-type]
+                def load_config(self) -> None:
+                    for key, value in options.items():
+                        self.cfg.set(key, value)
+
+                def load(self) -> Any:
+                    # Each worker imports the app itself (after fork)
+                    return importlib.import_module("app").app
+
+            print(f"[server] gunicorn: {options['workers']} workers x {options['threads']} threads", flush=True)
+            QuizServer().run()
+            return
+        if server == "auto":
+            print("[server] gunicorn not installed; using the Flask dev server", flush=True)
+    quiz = quiz or importlib.import_module("app")
+    if polling:
+        quiz.start_polling()
+    quiz.app.run(host="0.0.0.0", port=port, threaded=True)
+
+
+def main(quiz: ModuleType | None = None) -> int:
+    port = int(os.environ.get("PORT", 3000))
+    # BOT_MODE=polling (or --poll) reads updates via getUpdates; the HTTP server still
+    # runs for health checks and admin endpoints
+    serve(port, polling=polling_requested(), quiz=quiz)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, List
+
+
+# Serialized layout version. Version 1 was the original free-form dict (sets and
+# lists of question keys); version 2 is the positional list written by
+# Session.encode(). Bump it when fields change and extend Session.decode().
+SCHEMA_VERSION = 2
+
+
+def has_bit(mask: int, slot: int) -> bool:
+    return (mask >> slot) & 1 == 1
+
+
+def set_bit(mask: int, slot: int) -> int:
+    return mask | (1 << slot)
+
+
+# One team's hunt state. Per-question flags are int bitsets indexed by the
+# question's stable slot (CompiledQuestion.slot), so a session is a handful of
+# scalars: no per-session sets/lists, no per-access backfilling, and encode()
+# is a flat JSON array.
+@dataclass(slots=True)
+class Session:
+    index: int = 0  # position of the current question in the catalog
+    question_id: Any = None  # `id` of the current question; survives catalog reloads
+    score: int = 0
+    team_name: str | None = None
+    state: str | None = None  # 'awaiting_team_name' | 'awaiting_ready' | 'awaiting_timer' | None
+    started_at: float | None = None  # UNIX timestamp when the timer was started
+    penalty_secs: int = 0
+    hints_used: int = 0  # bitset of question slots where a hint was used (penalized once)
+    photos_awarded: int = 0  # bitset of question slots awarded for a photo
+    explanations_sent: int = 0  # bitset of question slots whose explanations were sent
+    awaiting_next: bool = False  # require Next before moving on
+    advancing: bool = False  # Next accepted; next question scheduled but not yet shown
+    awaiting_photo_for: Any = None  # question key the Upload Photo button was tapped for
+    # Active timer bookkeeping
+    time_accum: float = 0.0
+    time_segment_started: float | None = None
+
+    @property
+    def hint_count(self) -> int:
+        return self.hints_used.bit_count()
+
+    def reset_progress(self) -> None:
+        """Back to a fresh hunt for the same team (after finishing)."""
+        team, state = self.team_name, self.state
+        for f in fields(self):
+            setattr(self, f.name, f.default)
+        self.team_name, self.state = team, state
+
+    def encode(self) -> List[Any]:
+        # Plain getattr: astuple() deep-copies every field and is ~10x slower
+        return [SCHEMA_VERSION, *[getattr(self, name) for name in _FIELD_NAMES]]
+
+    @classmethod
+    def decode(cls, data: Any, slot_of: Callable[[Any], int]) -> "Session":
+        """Build from encode() output, upgrading older layouts.
+        slot_of maps a question key to its bitset slot (needed for version 1 sets).
+        """
+        if isinstance(data, list) and data and data[0] == SCHEMA_VERSION:
+            return cls(*data[1:])
+        if isinstance(data, dict):
+            return cls.from_v1(data, slot_of)
+        raise ValueError(f"unsupported session layout: {str(data)[:80]}")
+
+    @classmethod
+    def from_v1(cls, d: Dict[str, Any], slot_of: Callable[[Any], int]) -> "Session":
+        """Upgrade a version-1 dict session (missing keys take their defaults)."""
+
+        def bits(keys: Any) -> int:
+            mask = 0
+            for key in keys or ():
+                mask = set_bit(mask, slot_of(key))
+            return mask
+
+        return cls(
+            index=int(d.get("index", 0)),
+            question_id=d.get("question_id"),
+            score=int(d.get("score", 0)),
+            team_name=d.get("team_name"),
+            state=d.get("state"),
+            started_at=d.get("started_at"),
+            penalty_secs=int(d.get("penalty_secs", 0)),
+            hints_used=bits(d.get("hint_used_indices")),
+            photos_awarded=bits(d.get("photo_awarded_for")),
+            explanations_sent=bits(d.get("exp_sent_for")),
+            awaiting_next=bool(d.get("awaiting_next", False)),
+            advancing=bool(d.get("advancing", False)),
+            awaiting_photo_for=d.get("awaiting_photo_for"),
+            time_accum=float(d.get("time_accum", 0.0)),
+            time_segment_started=d.get("time_segment_started"),
+        )
+
+
+_FIELD_NAMES = tuple(f.name for f in fields(Session))
@@ -0,0 +1,358 @@
+"""Append-only session journal: crash recovery without a database, and offline replay.
+
+Replay a journal (e.g. to settle a disputed result):
+    python session_journal.py .data/sessions.journal --chat 123456
+    python session_journal.py .data/sessions.journal --chat 123456 --until "2026-10-16 14:05"
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from session import Session
+
+FIELDS = tuple(f.name for f in fields(Session))
+_FIELD_SET = frozenset(FIELDS)
+
+# (chat_id, cause, session or None when deleted, whether it replaced a previous session)
+Change = Tuple[int, str, Session | None, bool]
+
+
+_dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def read_records(path: str, repair: bool = False) -> Iterator[List[Any]]:
+    """Journal records in file order. A torn last line (crash mid-append) ends the
+    file; with repair=True it is truncated away once the file has been read."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    good = 0
+    with f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                break
+            good += len(line)
+            yield rec
+        size = f.seek(0, os.SEEK_END)
+    if repair and good < size:
+        with open(path, "rb+") as f:
+            f.truncate(good)
+        print(f"[journal] dropped {size - good} bytes of partial record at the end of {path}", flush=True)
+
+
+def apply_record(sessions: Dict[int, Session], rec: List[Any], slot_of: Callable[[Any], int]) -> None:
+    """Apply one record: 'set' (new/replaced session), 'upd' (changed fields) or 'del'."""
+    _, _, chat_id, _, op, body = rec
+    if op == "del":
+        sessions.pop(chat_id, None)
+    elif op == "set":
+        sessions[chat_id] = Session.decode(body, slot_of)
+    else:
+        sess = sessions.get(chat_id)
+        if sess is None:
+            return  # its base was compacted away (replay from archives only)
+        for name, value in body.items():
+            if name in _FIELD_SET:
+                setattr(sess, name, value)
+
+
+# Every flushed session change is appended as one JSON line:
+#   [seq, ts, chat_id, cause, "set", Session.encode()]   new or replaced session
+#   [seq, ts, chat_id, cause, "upd", {field: value}]     only the fields that changed
+#   [seq, ts, chat_id, cause, "del", null]               session removed
+# `cause` names what triggered it (the routed payload, e.g. "answer" or "hint",
+# or the scheduled step). After snapshot_every records the journal is rotated and
+# a snapshot of every session at that seq is written beside it (in a background
+# thread), then the rotated segment is archived (the newest `keep` are kept for
+# replay) or deleted. Startup loads the snapshot and applies only the records
+# after it, so recovery time follows the tail, not the event's whole history.
+class SessionJournal:
+    def __init__(
+        self,
+        path: str,
+        slot_of: Callable[[Any], int],
+        snapshot_every: int = 20000,
+        keep: int = 3,
+        fsync: bool = False,
+    ) -> None:
+        self.path = path
+        self.snapshot_path = f"{path}.snapshot"
+        self.rotated_path = f"{path}.1"  # segment being folded into a snapshot
+        self.slot_of = slot_of
+        self.snapshot_every = max(1, snapshot_every)
+        self.keep = max(0, keep)
+        self.fsync = fsync
+        self.seq = 0
+        self.since_snapshot = 0
+        self.snapshots = 0
+        self.last_load: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        # chat_id -> Session.encode() as last journaled; 'upd' records are diffs against it.
+        # Rows are replaced, never mutated, so a snapshot can copy the dict shallowly.
+        self._rows: Dict[int, List[Any]] = {}
+        self._file: Any = None
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def _open(self) -> Any:
+        # Unbuffered: each append is one write() straight to the OS, which survives
+        # a process crash (fsync=True also survives losing the machine)
+        return open(self.path, "ab", buffering=0)
+
+    def load(self) -> Dict[int, Session]:
+        """Rebuild every session from the latest snapshot plus the records after it."""
+        t0 = time.perf_counter()
+        sessions: Dict[int, Session] = {}
+        snap_seq = 0
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            snap_seq = int(snap["seq"])
+            for chat_id, row in snap["sessions"]:
+                sessions[chat_id] = Session.decode(row, self.slot_of)
+        except FileNotFoundError:
+            pass
+        tail = 0
+        seq = snap_seq
+        pending = os.path.exists(self.rotated_path)  # a snapshot was interrupted
+        for path in (self.rotated_path, self.path):
+            for rec in read_records(path, repair=True):
+                if rec[0] <= snap_seq:
+                    continue
+                apply_record(sessions, rec, self.slot_of)
+                seq = max(seq, rec[0])
+                tail += 1
+        with self._lock:
+            self.seq = seq
+            self.since_snapshot = tail
+            self._rows = {cid: s.encode() for cid, s in sessions.items()}
+            self._file = self._open()
+        self.last_load = {
+            "sessions": len(sessions),
+            "snapshot_seq": snap_seq,
+            "tail_records": tail,
+            "ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+        if pending:
+            self._fold_pending()
+        return sessions
+
+    def append(self, changes: List[Change]) -> int:
+        """Journal the given session states; returns the number of records written."""
+        now = round(time.time(), 3)
+        lines: List[str] = []
+        with self._lock:
+            rows: Dict[int, List[Any] | None] = {}
+            seq = self.seq
+            for chat_id, cause, sess, replaced in changes:
+                prev = rows[chat_id] if chat_id in rows else self._rows.get(chat_id)
+                if sess is None:
+                    if prev is None:
+                        continue
+                    op, body, row = "del", None, None
+                else:
+                    row = sess.encode()
+                    if prev is None or replaced or prev[0] != row[0]:
+                        op, body = "set", row
+                    else:
+                        body = {FIELDS[i]: new for i, (old, new) in enumerate(zip(prev[1:], row[1:])) if old != new}
+                        if not body:
+                            continue
+                        op = "upd"
+                seq += 1
+                rows[chat_id] = row
+                lines.append(_dumps([seq, now, chat_id, cause, op, body]))
+            if not lines:
+                return 0
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            pos = self._file.tell()
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[self._file.write(view):]
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError:
+                # Never leave half a record in the middle of the journal
+                try:
+                    self._file.truncate(pos)
+                except OSError:
+                    pass
+                raise
+            # Only now that the records are written do they become the base for diffs
+            self.seq = seq
+            for chat_id, row in rows.items():
+                if row is None:
+                    self._rows.pop(chat_id, None)
+                else:
+                    self._rows[chat_id] = row
+            self.since_snapshot += len(lines)
+            due = self.since_snapshot >= self.snapshot_every
+        if due and not self._snapshot_lock.locked():
+            threading.Thread(target=self.snapshot, name="journal-snapshot", daemon=True).start()
+        return len(lines)
+
+    def snapshot(self) -> Dict[str, Any] | None:
+        """Rotate the journal and write a snapshot covering everything before it."""
+        if not self._snapshot_lock.acquire(blocking=False):
+            return None
+        try:
+            t0 = time.perf_counter()
+            with self._lock:
+                rows = list(self._rows.items())
+                seq = self.seq
+                # A segment left by a failed snapshot stays put until the next load folds it in
+                rotate = not os.path.exists(self.rotated_path)
+                if rotate:
+                    self._file.close()
+                    os.replace(self.path, self.rotated_path)
+                    self._file = self._open()
+                self.since_snapshot = 0
+            self._write_snapshot(rows, seq)
+            if rotate:
+                self._archive(seq)
+            self.snapshots += 1
+            return {"seq": seq, "sessions": len(rows), "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        except OSError as e:
+            print(f"[journal] snapshot failed: {e}", flush=True)
+            return None
+        finally:
+            self._snapshot_lock.release()
+
+    def _write_snapshot(self, rows: List[Tuple[int, List[Any]]], seq: int) -> None:
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_dumps({"seq": seq, "ts": round(time.time(), 3), "sessions": rows}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+    def _fold_pending(self) -> None:
+        # Startup after an interrupted snapshot: everything loaded so far goes into a
+        # fresh snapshot, and the leftover segment plus the live journal are archived
+        with self._lock:
+            self._write_snapshot(list(self._rows.items()), self.seq)
+            self._file.close()
+            with open(self.rotated_path, "ab") as dst, open(self.path, "rb") as src:
+                dst.write(src.read())
+            open(self.path, "wb").close()
+            self._file = self._open()
+            self.since_snapshot = 0
+        self._archive(self.seq)
+
+    def _archive(self, seq: int) -> None:
+        if self.keep == 0:
+            os.remove(self.rotated_path)
+            return
+        os.replace(self.rotated_path, f"{self.path}.{seq:012d}")
+        for old in self.archives()[: -self.keep]:
+            os.remove(old)
+
+    def archives(self) -> List[str]:
+        """Compacted segments kept for replay, oldest first."""
+        folder = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        names = sorted(n for n in os.listdir(folder) if n.startswith(prefix) and n[len(prefix):].isdigit())
+        return [os.path.join(folder, n) for n in names]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._file.tell() if self._file is not None else 0
+            return {
+                "journal_seq": self.seq,
+                "journal_bytes": size,
+                "records_since_snapshot": self.since_snapshot,
+                "snapshots": self.snapshots,
+                "last_load": self.last_load,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def replay(
+    path: str, slot_of: Callable[[Any], int] = lambda key: 0, until: float | None = None
+) -> Iterator[Tuple[List[Any], Dict[int, Session], Session | None]]:
+    """Every retained record in seq order (up to time `until`) as (record, sessions
+    after it, session before it). Starts from the oldest archived segment (not the
+    snapshot), so hunts that began before it only show their changed fields. Journal
+    rows are never the legacy dict layout, so slot_of is not consulted."""
+    journal = SessionJournal(path, slot_of)
+    sessions: Dict[int, Session] = {}
+    last = 0
+    for seg in (*journal.archives(), journal.rotated_path, path):
+        for rec in read_records(seg):
+            if rec[0] <= last:
+                continue
+            if until is not None and rec[1] > until:
+                return
+            last = rec[0]
+            before = sessions.get(rec[2])
+            before = Session(*before.encode()[1:]) if before is not None else None
+            apply_record(sessions, rec, slot_of)
+            yield rec, sessions, before
+
+
+def _fmt_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def _parse_until(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Replay a session journal (archived segments + live journal).")
+    ap.add_argument("path", help="journal file, e.g. .data/sessions.journal")
+    ap.add_argument("--chat", type=int, action="append", help="only this chat (repeatable)")
+    ap.add_argument("--until", help="stop at this time (epoch seconds or ISO date/time)")
+    args = ap.parse_args()
+    chats = set(args.chat or ())
+    until = _parse_until(args.until) if args.until else None
+
+    sessions: Dict[int, Session] = {}
+    for rec, sessions, before in replay(args.path, until=until):
+        seq, ts, chat_id, cause, op, body = rec
+        if chats and chat_id not in chats:
+            continue
+        if op == "upd":
+            if before is None:
+                change = ", ".join(f"{k}={v!r}" for k, v in body.items())
+            else:
+                change = ", ".join(f"{k} {getattr(before, k)!r}→{v!r}" for k, v in body.items())
+        elif op == "set":
+            sess = sessions[chat_id]
+            change = f"new session (state={sess.state!r}, team={sess.team_name!r})"
+        else:
+            change = "removed"
+        print(f"{_fmt_ts(ts)}  #{seq:<7} chat {chat_id}  [{cause or '-'}] {change}")
+    print()
+    for chat_id, sess in sorted(sessions.items()):
+        if chats and chat_id not in chats:
+            continue
+        print(f"chat {chat_id}: team={sess.team_name!r} state={sess.state!r} question={sess.index} score={sess.score} "
+              f"hints={bin(sess.hints_used).count('1')} penalty={sess.penalty_secs}s active={sess.time_accum:.1f}s started_at={sess.started_at}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
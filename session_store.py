@@ -0,0 +1,608 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple
+
+from session import Session
+from session_journal import Change, SessionJournal
+
+
+def encode_session(sess: Session) -> str:
+    """Compact JSON array for a session (see Session.encode)."""
+    return json.dumps(sess.encode(), separators=(",", ":"), ensure_ascii=False)
+
+
+def decode_session(data: str, slot_of: Callable[[Any], int]) -> Session:
+    """Parse a stored session, upgrading older layouts (slot_of maps question keys to bit slots)."""
+    return Session.decode(json.loads(data), slot_of)
+
+
+def approx_size(obj: Any, _seen: Set[int] | None = None) -> int:
+    """Approximate bytes retained by an object graph (containers, slotted objects, strings, numbers)."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, seen) for v in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_size(getattr(obj, a), seen) for a in obj.__slots__ if hasattr(obj, a))
+    return size
+
+
+# Storage behind ensure_session. Stores behave like a dict keyed by chat_id;
+# handlers mutate the returned session dicts in place, and flush() persists
+# every session touched since the last flush in one batch (called once per
+# webhook / scheduled callback rather than once per field mutation).
+# get() counts as activity: resident sessions are kept in least-recently-used
+# order with a last-seen time, which SessionSweeper uses for TTL/LRU eviction.
+class SessionStore:
+    persistent = False  # True if sessions survive being dropped from memory
+    # True if a chat's changes must be written by flush_chat() when its lock is
+    # released (wire refresh/flush_chat to the chat lock), not by a global flush()
+    flush_per_chat = False
+
+    def get(self, chat_id: int) -> Session | None:
+        raise NotImplementedError
+
+    def peek(self, chat_id: int) -> Session | None:
+        """Like get() but does not count as activity."""
+        raise NotImplementedError
+
+    def last_seen(self, chat_id: int) -> float | None:
+        raise NotImplementedError
+
+    def idle_ids(self, cutoff: float) -> List[int]:
+        """Chats with no activity since `cutoff` (UNIX time)."""
+        raise NotImplementedError
+
+    def lru_ids(self, count: int) -> List[int]:
+        """Up to `count` least recently used sessions held in memory, oldest first."""
+        raise NotImplementedError
+
+    def resident(self) -> int:
+        """Sessions currently held in memory."""
+        raise NotImplementedError
+
+    def unload(self, chat_id: int) -> None:
+        """Drop a session from memory (persistent stores keep it on disk)."""
+        self.pop(chat_id)
+
+    def refresh(self, chat_id: int) -> None:
+        """Forget any cached copy so the next get() sees writes from other processes, and
+        hold the chat's changes back from flush() until flush_chat(). Called when a
+        worker takes the chat's lock or cross-process lease (flush_per_chat stores).
+        """
+
+    def flush_chat(self, chat_id: int) -> None:
+        """Persist one chat's pending changes (before its lease is released)."""
+        self.flush()
+
+    def note(self, chat_id: int, cause: str) -> None:
+        """Label what is changing the chat's session (recorded by the journal store)."""
+
+    def stats(self) -> Dict[str, Any]:
+        resident = self._resident_sessions()
+        return {
+            "store": type(self).__name__,
+            "stored": len(self),
+            "resident": len(resident),
+            "approx_bytes": sum(approx_size(s) for s in resident),
+        }
+
+    def _resident_sessions(self) -> List[Session]:
+        raise NotImplementedError
+
+    def __setitem__(self, chat_id: int, sess: Session) -> None:
+        raise NotImplementedError
+
+    def pop(self, chat_id: int, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def mark_dirty(self, chat_id: int) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[int, Session]]:
+        raise NotImplementedError
+
+    def __getitem__(self, chat_id: int) -> Session:
+        sess = self.get(chat_id)
+        if sess is None:
+            raise KeyError(chat_id)
+        return sess
+
+    def __contains__(self, chat_id: object) -> bool:
+        return self.get(chat_id) is not None  # type: ignore[arg-type]
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local dict; state is lost on restart (the original behaviour)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[int, Session]" = OrderedDict()  # LRU order, oldest first
+        self._seen: Dict[int, float] = {}
+
+    def get(self, chat_id: int) -> Session | None:
+        with self._lock:
+            sess = self._data.get(chat_id)
+            if sess is not None:
+                self._data.move_to_end(chat_id)
+                self._seen[chat_id] = time.time()
+            return sess
+
+    def peek(self, chat_id: int) -> Session | None:
+        with self._lock:
+            return self._data.get(chat_id)
+
+    def __setitem__(self, chat_id: int, sess: Session) -> None:
+        with self._lock:
+            self._data[chat_id] = sess
+            self._data.move_to_end(chat_id)
+            self._seen[chat_id] = time.time()
+
+    def pop(self, chat_id: int, default: Any = None) -> Any:
+        with self._lock:
+            self._seen.pop(chat_id, None)
+            return self._data.pop(chat_id, default)
+
+    def last_seen(self, chat_id: int) -> float | None:
+        with self._lock:
+            return self._seen.get(chat_id)
+
+    def idle_ids(self, cutoff: float) -> List[int]:
+        with self._lock:
+            out = []
+            for cid in self._data:  # oldest first, so stop at the first recent one
+                if self._seen.get(cid, 0.0) >= cutoff:
+                    break
+                out.append(cid)
+            return out
+
+    def lru_ids(self, count: int) -> List[int]:
+        with self._lock:
+            out = []
+            for cid in self._data:
+                if len(out) >= count:
+                    break
+                out.append(cid)
+            return out
+
+    def resident(self) -> int:
+        return len(self)
+
+    def _resident_sessions(self) -> List[Session]:
+        with self._lock:
+            return list(self._data.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def items(self) -> Iterator[Tuple[int, Session]]:
+        with self._lock:
+            return iter(list(self._data.items()))
+
+
+class JournalSessionStore(MemorySessionStore):
+    """Memory store whose changes are appended to a local journal (session_journal.py)
+    and rebuilt from it on startup, so a crash or restart keeps every hunt without a
+    database. Each chat is journaled when its lock is released (flush_per_chat), so
+    a half-handled session is never written by another thread's flush.
+    """
+
+    flush_per_chat = True
+
+    def __init__(self, journal: SessionJournal) -> None:
+        super().__init__()
+        self.journal = journal
+        now = time.time()
+        for chat_id, sess in journal.load().items():
+            # Its scheduled question died with the previous process; accept input again
+            sess.advancing = False
+            self._data[chat_id] = sess
+            self._seen[chat_id] = now
+        self._dirty: Set[int] = set()
+        self._replaced: Set[int] = set()
+        self._deleted: Set[int] = set()
+        self._pinned: Set[int] = set()
+        self._causes: Dict[int, str] = {}
+        load = journal.last_load
+        print(
+            f"[sessions] journal: {load['sessions']} sessions (snapshot seq {load['snapshot_seq']} "
+            f"+ {load['tail_records']} records) in {load['ms']} ms",
+            flush=True,
+        )
+
+    def __setitem__(self, chat_id: int, sess: Session) -> None:
+        super().__setitem__(chat_id, sess)
+        with self._lock:
+            self._dirty.add(chat_id)
+            self._replaced.add(chat_id)
+            self._deleted.discard(chat_id)
+
+    def mark_dirty(self, chat_id: int) -> None:
+        with self._lock:
+            if chat_id in self._data:
+                self._dirty.add(chat_id)
+
+    def note(self, chat_id: int, cause: str) -> None:
+        with self._lock:
+            prev = self._causes.get(chat_id)
+            if prev != cause:
+                self._causes[chat_id] = f"{prev},{cause}" if prev else cause
+
+    def pop(self, chat_id: int, default: Any = None) -> Any:
+        sess = super().pop(chat_id, None)
+        if sess is None:
+            return default
+        with self._lock:
+            self._dirty.discard(chat_id)
+            self._replaced.discard(chat_id)
+            self._deleted.add(chat_id)
+        return sess
+
+    def refresh(self, chat_id: int) -> None:
+        # Nothing is cached from elsewhere; just hold the chat back from flush()
+        with self._lock:
+            self._pinned.add(chat_id)
+
+    def flush(self) -> None:
+        self._write(None)
+
+    def flush_chat(self, chat_id: int) -> None:
+        try:
+            self._write(chat_id)
+        finally:
+            with self._lock:
+                self._pinned.discard(chat_id)
+
+    def _write(self, only: int | None) -> None:
+        with self._lock:
+            if only is None:
+                ids = (self._dirty | self._deleted) - self._pinned
+            else:
+                ids = (self._dirty | self._deleted) & {only}
+                if not ids:
+                    self._causes.pop(only, None)  # e.g. a leaderboard request changed nothing
+            if not ids:
+                return
+            changes: List[Change] = [
+                (cid, self._causes.pop(cid, ""), self._data.get(cid), cid in self._replaced) for cid in ids
+            ]
+            self._dirty -= ids
+            self._deleted -= ids
+            self._replaced -= ids
+        try:
+            self.journal.append(changes)
+        except Exception:
+            with self._lock:
+                # Retry on the next flush
+                for cid, cause, sess, replaced in changes:
+                    (self._dirty if sess is not None else self._deleted).add(cid)
+                    if replaced:
+                        self._replaced.add(cid)
+                    if cause:
+                        self._causes.setdefault(cid, cause)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), **self.journal.stats()}
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite (WAL) backed store with a write-back cache.
+    Reads are served from the in-process cache after the first load; writes are
+    coalesced into one transaction per flush(). Evicting a session from memory
+    (unload) keeps its row, so it is reloaded on the chat's next update.
+    A chat is written when its lock is released (flush_per_chat), so another
+    request's flush never saves a half-updated session and marks it clean.
+    With `shared` (several processes) taking the lock also drops the cached copy.
+    """
+
+    persistent = True
+    flush_per_chat = True
+
+    def __init__(self, path: str, slot_of: Callable[[Any], int], shared: bool = False) -> None:
+        self.path = path
+        self.slot_of = slot_of
+        self.shared = shared
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[int, Session]" = OrderedDict()  # LRU order, oldest first
+        self._seen: Dict[int, float] = {}
+        self._dirty: Set[int] = set()
+        self._deleted: Set[int] = set()
+        # Chats leased by a handler in this process: flush() leaves them to flush_chat(),
+        # so a half-updated session is never written and marked clean by another thread
+        self._pinned: Set[int] = set()
+        self._started = time.time()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " chat_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while a flush writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, chat_id: int) -> Session | None:
+        sess = self._load(chat_id)
+        if sess is not None:
+            with self._lock:
+                if chat_id in self._cache:
+                    self._cache.move_to_end(chat_id)
+                    self._seen[chat_id] = time.time()
+        return sess
+
+    def peek(self, chat_id: int) -> Session | None:
+        return self._load(chat_id)
+
+    def _load(self, chat_id: int) -> Session | None:
+        with self._lock:
+            sess = self._cache.get(chat_id)
+            if sess is not None or chat_id in self._deleted:
+                return sess
+        row = self._conn().execute("SELECT data, updated_at FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+        if row is None:
+            return None
+        loaded = decode_session(row[0], self.slot_of)
+        if loaded.advancing and row[1] < self._started:
+            # Written before this process started: the scheduled question is gone with it
+            loaded.advancing = False
+        with self._lock:
+            # Another thread may have loaded it meanwhile; keep a single shared dict
+            return self._cache.setdefault(chat_id, loaded)
+
+    def __setitem__(self, chat_id: int, sess: Session) -> None:
+        with self._lock:
+            self._cache[chat_id] = sess
+            self._cache.move_to_end(chat_id)
+            self._seen[chat_id] = time.time()
+            self._deleted.discard(chat_id)
+            self._dirty.add(chat_id)
+
+    def mark_dirty(self, chat_id: int) -> None:
+        with self._lock:
+            if chat_id in self._cache:
+                self._dirty.add(chat_id)
+
+    def pop(self, chat_id: int, default: Any = None) -> Any:
+        sess = self.get(chat_id)
+        with self._lock:
+            self._cache.pop(chat_id, None)
+            self._seen.pop(chat_id, None)
+            self._dirty.discard(chat_id)
+            self._deleted.add(chat_id)
+        return default if sess is None else sess
+
+    def unload(self, chat_id: int) -> None:
+        # Called with the chat's lock held, so its pinned changes are written here
+        with self._lock:
+            dirty = chat_id in self._dirty
+        if dirty:
+            self._write(chat_id)
+        with self._lock:
+            if chat_id not in self._dirty:  # re-dirtied meanwhile: keep it
+                self._cache.pop(chat_id, None)
+                self._seen.pop(chat_id, None)
+
+    def refresh(self, chat_id: int) -> None:
+        # Called with the chat's lock (or cross-process lease) held; unflushed local changes win
+        with self._lock:
+            self._pinned.add(chat_id)
+            if self.shared and chat_id not in self._dirty and chat_id not in self._deleted:
+                self._cache.pop(chat_id, None)
+                self._seen.pop(chat_id, None)
+
+    def last_seen(self, chat_id: int) -> float | None:
+        with self._lock:
+            ts = self._seen.get(chat_id)
+        if ts is not None:
+            return ts
+        row = self._conn().execute("SELECT updated_at FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+        return float(row[0]) if row else None
+
+    def idle_ids(self, cutoff: float) -> List[int]:
+        # updated_at is refreshed on every flush of a touched session, i.e. on activity
+        self.flush()
+        with self._lock:
+            recent = {cid for cid, ts in self._seen.items() if ts >= cutoff}
+        rows = self._conn().execute("SELECT chat_id FROM sessions WHERE updated_at < ?", (cutoff,))
+        return [cid for (cid,) in rows if cid not in recent]
+
+    def lru_ids(self, count: int) -> List[int]:
+        with self._lock:
+            out = []
+            for cid in self._cache:
+                if len(out) >= count:
+                    break
+                out.append(cid)
+            return out
+
+    def resident(self) -> int:
+        with self._lock:
+            return len(self._cache)
+
+    def _resident_sessions(self) -> List[Session]:
+        with self._lock:
+            return list(self._cache.values())
+
+    def flush(self) -> None:
+        self._write(None)
+
+    def flush_chat(self, chat_id: int) -> None:
+        try:
+            self._write(chat_id)
+        finally:
+            with self._lock:
+                self._pinned.discard(chat_id)
+
+    def _write(self, only: int | None) -> None:
+        with self._lock:
+            if only is None:
+                dirty = self._dirty - self._pinned
+                gone = self._deleted - self._pinned
+            else:
+                dirty = self._dirty & {only}
+                gone = self._deleted & {only}
+            if not dirty and not gone:
+                return
+            now = time.time()
+            rows = [(cid, encode_session(self._cache[cid]), now) for cid in dirty if cid in self._cache]
+            deleted = [(cid,) for cid in gone]
+            self._dirty -= dirty
+            self._deleted -= gone
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            if rows:
+                conn.executemany(
+                    "INSERT INTO sessions (chat_id, data, updated_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    rows,
+                )
+            if deleted:
+                conn.executemany("DELETE FROM sessions WHERE chat_id = ?", deleted)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            with self._lock:
+                # Retry on the next flush
+                self._dirty.update(cid for cid, _, _ in rows)
+                self._deleted.update(cid for (cid,) in deleted)
+            raise
+
+    def __len__(self) -> int:
+        # Read-only (a /metrics scrape must not write): stored rows, plus new sessions
+        # not written yet, minus deletions not written yet
+        with self._lock:
+            pending = [cid for cid in self._dirty if cid in self._cache and cid not in self._deleted]
+            deleted = list(self._deleted)
+        conn = self._conn()
+        count = int(conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0])
+        if pending or deleted:
+            stored: Set[int] = set()
+            ids = pending + deleted
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT chat_id FROM sessions WHERE chat_id IN ({marks})", chunk)
+                stored.update(r[0] for r in rows)
+            count += sum(1 for cid in pending if cid not in stored) - sum(1 for cid in deleted if cid in stored)
+        return count
+
+    def items(self) -> Iterator[Tuple[int, Session]]:
+        self.flush()
+        ids = [r[0] for r in self._conn().execute("SELECT chat_id FROM sessions")]
+        for cid in ids:
+            sess = self.get(cid)
+            if sess is not None:
+                yield cid, sess
+
+
+# Background eviction: every `interval` seconds, sessions idle for longer than
+# idle_ttl are evicted, then the least recently used ones while more than
+# max_sessions are held in memory. `evict(chat_id, reason, cutoff)` does the
+# app-level work (locking the chat, re-checking last_seen against cutoff for
+# "idle", archiving an unfinished hunt, removing it) and returns True if the
+# session was evicted; reason is "idle" or "capacity".
+class SessionSweeper:
+    def __init__(
+        self,
+        store: SessionStore,
+        evict: Callable[[int, str, float], bool],
+        idle_ttl: float = 6 * 3600,
+        max_sessions: int = 5000,
+        interval: float = 60.0,
+    ) -> None:
+        self.store = store
+        self.evict = evict
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.interval = interval
+        self.evicted: Dict[str, int] = {"idle": 0, "capacity": 0}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def sweep_once(self, now: float | None = None) -> Dict[str, int]:
+        now = time.time() if now is None else now
+        counts = {"idle": 0, "capacity": 0}
+        cutoff = now - self.idle_ttl
+        if self.idle_ttl > 0:
+            for cid in self.store.idle_ids(cutoff):
+                if self.evict(cid, "idle", cutoff):
+                    counts["idle"] += 1
+        if self.max_sessions > 0:
+            over = self.store.resident() - self.max_sessions
+            if over > 0:
+                for cid in self.store.lru_ids(over):
+                    if self.evict(cid, "capacity", cutoff):
+                        counts["capacity"] += 1
+        for k, v in counts.items():
+            self.evicted[k] += v
+        return counts
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                counts = self.sweep_once()
+                if any(counts.values()):
+                    print(f"[sessions] evicted {counts}", flush=True)
+            except Exception as e:
+                print(f"[sessions] sweep failed: {e}", flush=True)
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def make_session_store(
+    kind: str,
+    path: str,
+    slot_of: Callable[[Any], int],
+    journal_path: str | None = None,
+    shared: bool = False,
+    **journal_options: Any,
+) -> SessionStore:
+    """kind is 'memory', 'sqlite' (at path; `shared` between processes) or 'journal'
+    (at journal_path; options go to SessionJournal)."""
+    kind = (kind or "memory").strip().lower()
+    if kind == "sqlite":
+        return SQLiteSessionStore(path, slot_of, shared=shared)
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "journal":
+        return JournalSessionStore(SessionJournal(journal_path or f"{path}.journal", slot_of, **journal_options))
+    raise ValueError(f"Unknown SESSION_STORE {kind!r} (expected 'memory', 'sqlite' or 'journal')")
@@ -0,0 +1,289 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Set
+
+from catalog import QuestionSlots
+from concurrency import KeyedLocks
+from file_id_cache import FileIdCache
+
+
+# State shared by every worker process (and instances on the same host/volume)
+# in one SQLite file (WAL): seen update_ids, Telegram file_ids, question slots
+# and leases. Each
+# operation is a single short autocommit statement, so workers never hold the
+# database lock across a handler. No external service needed; point
+# SHARED_STATE_PATH at a local disk (SQLite locking is unreliable over NFS).
+class SharedState:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # Lease owner id: unique per process, stable for its lifetime
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._local = threading.local()
+        conn = self.conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_updates (id TEXT PRIMARY KEY, seen_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS seen_updates_at ON seen_updates (seen_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids (key TEXT PRIMARY KEY, path TEXT NOT NULL, file_id TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS question_slots (key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID"
+        )
+
+    def conn(self) -> sqlite3.Connection:
+        # One autocommit connection per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def try_lease(self, name: str, ttl: float) -> bool:
+        """Take or renew lease `name` for ttl seconds. False if another live owner holds it."""
+        now = time.time()
+        cur = self.conn().execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+            " WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+            (name, self.owner, now + ttl, now),
+        )
+        return cur.rowcount == 1
+
+    def release_lease(self, name: str) -> None:
+        self.conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self.conn()
+        return {
+            "path": self.path,
+            "owner": self.owner,
+            "seen_updates": conn.execute("SELECT COUNT(*) FROM seen_updates").fetchone()[0],
+            "file_ids": conn.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0],
+            "question_slots": conn.execute("SELECT COUNT(*) FROM question_slots").fetchone()[0],
+            "leases": conn.execute("SELECT COUNT(*) FROM leases WHERE expires_at >= ?", (time.time(),)).fetchone()[0],
+        }
+
+
+# Cross-process version of concurrency.KeyedLocks: a thread first takes the
+# in-process lock for the chat, then the chat's lease in SharedState, waiting
+# with a short backoff while another worker holds it. Leases expire after `ttl`
+# so a crashed worker can't wedge a chat. Re-entrant like KeyedLocks: nested
+# hold() calls from the holding thread don't touch the database.
+# on_acquire(key) runs after the lease is taken (drop cached state another
+# worker may have changed); on_release(key) runs before it is given up
+# (persist this worker's changes), so the next holder always sees them.
+class ChatLeases:
+    def __init__(
+        self,
+        state: SharedState,
+        ttl: float = 30.0,
+        on_acquire: Callable[[Hashable], None] | None = None,
+        on_release: Callable[[Hashable], None] | None = None,
+    ) -> None:
+        self.state = state
+        self.ttl = ttl
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self.contended = 0  # acquisitions that had to wait for another worker
+        self._local = KeyedLocks()
+        self._held: Set[Hashable] = set()  # keys whose lease this process holds
+
+    def _acquire(self, name: str) -> None:
+        delay = 0.001
+        waited = False
+        while not self.state.try_lease(name, self.ttl):
+            waited = True
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        if waited:
+            self.contended += 1
+
+    @contextmanager
+    def hold(self, key: Hashable) -> Iterator[None]:
+        with self._local.hold(key):
+            if key in self._held:
+                # Nested hold by the thread that already owns the lease
+                yield
+                return
+            name = f"chat:{key}"
+            self._acquire(name)
+            self._held.add(key)
+            try:
+                if self.on_acquire is not None:
+                    self.on_acquire(key)
+                yield
+            finally:
+                self._held.discard(key)
+                try:
+                    if self.on_release is not None:
+                        self.on_release(key)
+                finally:
+                    self.state.release_lease(name)
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+
+# Cross-process version of concurrency.RecentIds. The insert is the check: a row
+# younger than ttl_secs means some worker already took the update. Expired and
+# excess rows are pruned every `prune_every` inserts rather than on each call.
+class SharedRecentIds:
+    def __init__(self, state: SharedState, max_size: int = 10000, ttl_secs: float = 3600.0) -> None:
+        self.state = state
+        self.max_size = max(1, max_size)
+        self.ttl_secs = ttl_secs
+        self.prune_every = max(100, self.max_size // 10)
+        self._inserts = 0
+        self._lock = threading.Lock()
+
+    def check_and_add(self, key: Hashable) -> bool:
+        """Record key; returns True if it was already seen (i.e. a duplicate)."""
+        now = time.time()
+        cur = self.state.conn().execute(
+            "INSERT INTO seen_updates (id, seen_at) VALUES (?, ?)"
+            " ON CONFLICT(id) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_updates.seen_at < ?",
+            (str(key), now, now - self.ttl_secs),
+        )
+        duplicate = cur.rowcount == 0
+        if not duplicate:
+            with self._lock:
+                self._inserts += 1
+                prune = self._inserts >= self.prune_every
+                if prune:
+                    self._inserts = 0
+            if prune:
+                self.prune(now)
+        return duplicate
+
+    def prune(self, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        conn = self.state.conn()
+        conn.execute("DELETE FROM seen_updates WHERE seen_at < ?", (now - self.ttl_secs,))
+        conn.execute(
+            "DELETE FROM seen_updates WHERE id IN"
+            " (SELECT id FROM seen_updates ORDER BY seen_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+    def __len__(self) -> int:
+        return int(self.state.conn().execute("SELECT COUNT(*) FROM seen_updates").fetchone()[0])
+
+
+# FileIdCache backed by the shared table, so an image uploaded by one worker is
+# re-sent by id from every other. Content hashing stays per process. Entries
+# from an existing JSON cache at `seed_path` are imported once, so switching
+# to shared mode doesn't re-upload everything.
+class SharedFileIdCache(FileIdCache):
+    def __init__(self, state: SharedState, seed_path: str | None = None) -> None:
+        self.state = state
+        super().__init__(seed_path or "")
+
+    def _load(self) -> None:
+        if self.path:
+            super()._load()
+        if self._entries:
+            self.state.conn().executemany(
+                "INSERT OR IGNORE INTO file_ids (key, path, file_id) VALUES (?, ?, ?)",
+                [(k, k.split("#", 1)[0], v) for k, v in self._entries.items()],
+            )
+            self._entries = {}
+
+    def get(self, key: str) -> str | None:
+        row = self.state.conn().execute("SELECT file_id FROM file_ids WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, file_id: str) -> None:
+        rel = key.split("#", 1)[0]
+        conn = self.state.conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Drop ids for older contents of the same path
+            conn.execute("DELETE FROM file_ids WHERE path = ? AND key != ?", (rel, key))
+            conn.execute("INSERT OR REPLACE INTO file_ids (key, path, file_id) VALUES (?, ?, ?)", (key, rel, file_id))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"[file_id_cache] save failed: {e}", flush=True)
+
+    def invalidate(self, key: str) -> None:
+        try:
+            self.state.conn().execute("DELETE FROM file_ids WHERE key = ?", (key,))
+        except Exception as e:
+            print(f"[file_id_cache] save failed: {e}", flush=True)
+
+
+# QuestionSlots backed by the shared table, so every worker maps a question key
+# to the same bit (per-process JSON tables let two workers hand the same slot to
+# different keys after a reload, last writer wins). A new key is claimed in one
+# IMMEDIATE transaction; known keys are cached, since a slot never changes once
+# taken. An existing JSON table at `seed_path` is imported into an empty table.
+class SharedQuestionSlots(QuestionSlots):
+    def __init__(self, state: SharedState, seed_path: str | None = None) -> None:
+        self.state = state
+        super().__init__(seed_path)
+        conn = self.state.conn()
+        if self._slots:
+            with self._transaction() as conn:
+                if conn.execute("SELECT COUNT(*) FROM question_slots").fetchone()[0] == 0:
+                    conn.executemany(
+                        "INSERT INTO question_slots (key, slot) VALUES (?, ?)", sorted(self._slots.items())
+                    )
+        self._slots = {k: int(v) for k, v in conn.execute("SELECT key, slot FROM question_slots")}
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.state.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def slot(self, key: Any) -> int:
+        name = json.dumps(key)
+        with self._lock:
+            slot = self._slots.get(name)
+            if slot is None:
+                with self._transaction() as conn:
+                    row = conn.execute("SELECT slot FROM question_slots WHERE key = ?", (name,)).fetchone()
+                    if row is None:
+                        # Another worker may have claimed it (or later slots) since our cache was filled
+                        row = conn.execute("SELECT COALESCE(MAX(slot), -1) + 1 FROM question_slots").fetchone()
+                        conn.execute("INSERT INTO question_slots (key, slot) VALUES (?, ?)", (name, row[0]))
+                slot = self._slots[name] = int(row[0])
+            return slot
+
+
+def lease_leader(state: SharedState, name: str, ttl: float) -> Callable[[], bool]:
+    """Callable that takes/renews lease `name` and says whether this process holds it
+    (for singleton background jobs such as the results exporter)."""
+
+    def is_leader() -> bool:
+        try:
+            return state.try_lease(name, ttl)
+        except Exception as e:
+            print(f"[shared] lease {name} check failed: {e}", flush=True)
+            return False
+
+    return is_leader
+
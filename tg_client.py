@@ -0,0 +1,132 @@
+import time
+import threading
+from typing import Any, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import RateLimiter, send_target
+
+
+# Retry these statuses; other 4xx are caller errors and are returned as-is
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# Pooled, keep-alive HTTP client for the Telegram Bot API.
+# One requests.Session is shared by all threads so TCP+TLS connections to
+# api.telegram.org are reused instead of re-established on every call.
+# With a RateLimiter, every send (and every retry of one) first waits for a
+# token, and a 429's retry_after holds back that chat's bucket.
+class BotAPIClient:
+    def __init__(
+        self,
+        base_url: str,
+        token: str | None,
+        pool_size: int = 16,
+        connect_timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff_secs: float = 0.5,
+        max_retry_after: float = 30.0,
+        limiter: RateLimiter | None = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_secs = backoff_secs
+        self.max_retry_after = max_retry_after
+        self.limiter = limiter
+        self._session: requests.Session | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        # Created lazily so forked server workers each get their own pool
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    s = requests.Session()
+                    # Retries are handled in call() so 429 retry_after can be honoured
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=0)
+                    s.mount("https://", adapter)
+                    s.mount("http://", adapter)
+                    self._session = s
+        return self._session
+
+    def url(self, method: str) -> str:
+        if not self.token:
+            raise RuntimeError("Missing TELEGRAM_BOT_TOKEN env var")
+        return f"{self.base_url}/bot{self.token}/{method}"
+
+    def file_url(self, file_path: str) -> str:
+        if not self.token:
+            raise RuntimeError("Missing TELEGRAM_BOT_TOKEN env var")
+        return f"{self.base_url}/file/bot{self.token}/{file_path}"
+
+    def download(self, file_path: str, timeout: float = 30) -> requests.Response:
+        """Streaming GET of a file resolved with getFile; read it with iter_content()
+        inside a `with` block so the connection goes back to the pool."""
+        return self.session.get(self.file_url(file_path), timeout=(self.connect_timeout, timeout), stream=True)
+
+    def call(self, method: str, timeout: float = 10, lane: str = "user", **kwargs: Any) -> requests.Response:
+        """POST to a Bot API method, retrying connection errors, 5xx and 429.
+        kwargs are passed to requests (json=, data=, files=). The last response is
+        returned even if it is an error so callers can raise_for_status().
+        lane is the limiter priority ("user" before "admin").
+        """
+        url = self.url(method)
+        target = send_target(method, kwargs) if self.limiter is not None else None
+        attempt = 0
+        while True:
+            if target is not None:
+                self.limiter.acquire(target[0], lane, target[1])
+            files = kwargs.get("files")
+            if files and attempt:
+                # Rewind uploads before re-sending them
+                for f in files.values():
+                    if hasattr(f, "seek"):
+                        f.seek(0)
+            try:
+                resp = self.session.post(url, timeout=(self.connect_timeout, timeout), **kwargs)
+            except requests.ConnectionError:
+                # ReadTimeout is not retried: the message may already have been delivered
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self.backoff_secs * (2 ** attempt))
+                attempt += 1
+                continue
+            if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                return resp
+            delay = self.retry_delay(resp, attempt)
+            if delay is None:
+                return resp
+            print(f"[tg_client] {method} -> {resp.status_code}, retrying in {delay:.1f}s", flush=True)
+            if target is not None and resp.status_code == 429:
+                # The next acquire() waits it out, and other sends to the chat queue behind it
+                self.limiter.penalize(target[0], delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    def retry_delay(self, resp: requests.Response, attempt: int) -> float | None:
+        """Seconds to wait before retrying; honours Telegram's retry_after on 429."""
+        if resp.status_code == 429:
+            retry_after: Any = None
+            try:
+                body: Dict[str, Any] = resp.json()
+                retry_after = (body.get("parameters") or {}).get("retry_after")
+            except ValueError:
+                pass
+            if retry_after is None:
+                retry_after = resp.headers.get("Retry-After")
+            try:
+                secs = float(retry_after)
+            except (TypeError, ValueError):
+                secs = self.backoff_secs * (2 ** attempt)
+            if secs > self.max_retry_after:
+                # Too long to hold a worker; surface the 429 instead
+                return None
+            return secs
+        return self.backoff_secs * (2 ** attempt)
+